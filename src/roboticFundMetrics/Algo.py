@@ -14,6 +14,9 @@ class Algo:
     event: map
     metrics: RoboticFundMetrics
     latest_tick: pandas.DataFrame
+    # Indicator columns the strategy reads, materialised up front when metrics is lazy.
+    # Subclasses assign their own tuple, e.g. required_indicators = ('RSI', 'SMA_25')
+    required_indicators: tuple = ()
 
     def __init__(self, algo_params, event, metrics):
         self.algo_name = algo_params['algo_name']
@@ -24,6 +27,7 @@ class Algo:
         self.set_one_pip()
         self.event = event
         self.metrics = metrics
+        self.metrics.require(*self.required_indicators)
 
     def set_one_pip(self):
         if self.instrument == 'AUDUSD':
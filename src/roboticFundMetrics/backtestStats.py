@@ -0,0 +1,61 @@
+from dataclasses import dataclass
+import pandas as pd
+
+
+@dataclass
+class BacktestStats:
+    '''
+    Summary of a back test as returned by RoboticFundMetrics.compute_stats(). Values are
+    unrounded, print_stats() does the formatting, except the win rates which are scored
+    to 0.1%.
+    '''
+    # Trading setup
+    instrument: str
+    notional_value: float
+    position_size: float
+
+    # Trades
+    number_of_trades: int
+    total_profit: float
+    average_profit: float
+    win_rate: float
+    long_profit: float
+    short_profit: float
+    biggest_loss: float
+    biggest_loss_date: object
+    biggest_profit: float
+    biggest_profit_date: object
+    exit_reason_counts: pd.Series
+
+    # Hold times in hours
+    mean_hold_hours: float
+    max_hold_hours: float
+    max_hold_date: object
+
+    # Risk
+    max_long_positions: int
+    max_short_positions: int
+    max_drawdown: float
+    max_profit_streak: float
+    account_balance_needed: float
+    stop_violations: int
+    limit_violations: int
+
+    # Returns
+    annualised_return: float
+    risk_free_return: float
+    std_profit: float
+    sharpe_ratio: float
+
+    # Yearly breakdown, one row per year
+    yearly: pd.DataFrame
+
+    # Scoring model
+    average_gain_weighted_to_1: float
+    profit_drawdown_ratio: float
+    win_rate_per_month: float
+    win_rate_score: int
+    drawdown_score: float
+    average_gain_score: int
+    win_rate_per_month_score: int
+    final_score: float
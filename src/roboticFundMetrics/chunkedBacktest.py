@@ -0,0 +1,234 @@
+from dataclasses import dataclass
+import numpy as np
+import pandas as pd
+from .roboticFundMetrics import RoboticFundMetrics
+from .utils.first_hit import next_true
+from .utils.trade_simulation import resolve_intraday_exits
+
+# Columns a strategy sets that the simulation and the stats read
+STRATEGY_COLUMNS = ['entry_long', 'entry_short', 'exit_long', 'exit_short',
+                    'long_stop', 'short_stop', 'long_profit_take', 'short_profit_take']
+
+
+@dataclass
+class ChunkedBacktestResult:
+    '''
+    Result of run_chunked_backtest(): the trade ledger with positions into the full history,
+    metrics over the bars the stats need (entry and exit bars plus month markers) with the
+    same ledger mapped onto them, ready for compute_stats() / print_stats(), and the number
+    of bars streamed
+    '''
+    trades: pd.DataFrame
+    metrics: RoboticFundMetrics
+    bars: int
+
+
+def csv_chunks(path: str, chunk_bars: int = 500000, **read_csv_kwargs):
+    '''
+    Description: Streams market data from a csv file in chunks
+
+    Args:
+        path (str): csv file with snapshotTimeUTC and OHLC prices sorted oldest first
+        chunk_bars (int): rows per chunk
+        read_csv_kwargs: passed to pd.read_csv
+
+    Returns:
+        iterator of pd.DataFrame
+    '''
+    yield from pd.read_csv(path, chunksize=chunk_bars, **read_csv_kwargs)
+
+
+def db_chunks(instrument: str, resolution: str, from_date: str = '2000-01-01', to_date: str = '2050-01-01',
+              chunk_bars: int = 500000):
+    '''
+    Description: Streams market data from the database in chunks, oldest first, see
+    MarketData.iterate_market_data_from_db
+
+    Args:
+        instrument (str): instrument, e.g. 'AUDUSD'
+        resolution (str): resolution, e.g. 'MINUTE_1'
+        from_date (str): '2000-01-01'
+        to_date (str): '2050-01-01'
+        chunk_bars (int): rows per chunk
+
+    Returns:
+        iterator of pd.DataFrame
+    '''
+    # Only needed when the database is used
+    from .marketData import MarketData
+    yield from MarketData().iterate_market_data_from_db(instrument, resolution, from_date, to_date, chunk_bars)
+
+
+class _PendingTrades:
+    # Trades of one direction whose exit has not been found yet, in entry order
+
+    def __init__(self):
+        self.entry_idx = np.empty(0, dtype=np.int64)
+        self.stops = np.empty(0)
+        self.profit_takes = np.empty(0)
+
+    def add(self, entry_idx, stops, profit_takes) -> None:
+        self.entry_idx = np.concatenate([self.entry_idx, entry_idx])
+        self.stops = np.concatenate([self.stops, stops])
+        self.profit_takes = np.concatenate([self.profit_takes, profit_takes])
+
+    def keep(self, mask) -> None:
+        self.entry_idx = self.entry_idx[mask]
+        self.stops = self.stops[mask]
+        self.profit_takes = self.profit_takes[mask]
+
+
+def run_chunked_backtest(chunks, strategy, strategy_kwargs: dict = None, warmup_bars: int = 500,
+                         max_hold_bars: int = None, memory_mode: str = 'default') -> ChunkedBacktestResult:
+    '''
+    Description: simulate_trades_intraday over a history streamed in chunks, for data that
+    does not fit in memory. Each chunk is prefixed with the last warmup_bars bars of the
+    previous one so indicators and signals near the chunk start see the same history as
+    in one frame, then only the chunk's own bars can enter trades. Trades not closed by the
+    end of a chunk are carried into the next and searched with the same first-hit queries,
+    so the ledger and the stats match the in-memory path as long as the strategy looks
+    back no more than warmup_bars (exponential indicators need enough warm-up to converge).
+    Only the bars the stats need are kept, memory is bounded by the chunk size plus the
+    number of trades.
+
+    Args:
+        chunks (iterable): pd.DataFrames of market data in ascending time order, e.g.
+            csv_chunks(path) or db_chunks(instrument, resolution)
+        strategy (callable): strategy(metrics, **strategy_kwargs) that sets the entry/exit
+            columns, stops and limits, see gridRunner.run_grid
+        strategy_kwargs (dict): keyword arguments for strategy
+        warmup_bars (int): bars of the previous chunk every chunk is prefixed with
+        max_hold_bars (int): see simulate_trades_intraday
+        memory_mode (str): 'default' or 'low', memory mode of the chunk metrics
+
+    Returns:
+        ChunkedBacktestResult
+    '''
+    if strategy_kwargs is None:
+        strategy_kwargs = {}
+    pending = {'LONG': _PendingTrades(), 'SHORT': _PendingTrades()}
+    closed = {'LONG': [], 'SHORT': []}
+    kept = []
+    months_seen = set()
+    months_with_idle_bar = set()
+    halo = None
+    offset = 0
+    last_time = None
+
+    for chunk in chunks:
+        if len(chunk) == 0:
+            continue
+        times = pd.to_datetime(chunk['snapshotTimeUTC']).to_numpy()
+        if (np.diff(times) < np.timedelta64(0)).any() or (last_time is not None and times[0] < last_time):
+            raise Exception(
+                'Chunked back tests need market data sorted by snapshotTimeUTC, oldest first')
+        last_time = times[-1]
+        frame = chunk if halo is None else pd.concat(
+            [halo, chunk], ignore_index=True)
+        halo_bars = len(frame) - len(chunk)
+        start = offset - halo_bars
+        metrics = RoboticFundMetrics(
+            frame.reset_index(drop=True), lazy=True, memory_mode=memory_mode)
+        strategy(metrics, **strategy_kwargs)
+        df = metrics.df
+        n = len(df)
+        close_prices = df['closePrice'].to_numpy(dtype=np.float64)
+        low_index = metrics.first_hit_index('lowPrice', use_max=False)
+        high_index = metrics.first_hit_index('highPrice', use_max=True)
+        keep = []
+
+        for direction in ['LONG', 'SHORT']:
+            prefix = direction.lower()
+            open_trades = pending[direction]
+            entries = np.flatnonzero(
+                df[f'entry_{prefix}'].to_numpy() == True)
+            entries = entries[entries >= halo_bars]
+            keep.append(entries)
+            open_trades.add(start + entries, df[f'{prefix}_stop'].to_numpy(dtype=np.float64)[entries],
+                       df[f'{prefix}_profit_take'].to_numpy(dtype=np.float64)[entries])
+            # Trades carried over continue on the first bar of this chunk
+            start_positions = np.maximum(
+                open_trades.entry_idx + 1 - start, halo_bars)
+            exit_mask = df[f'exit_{prefix}'].to_numpy() == True
+            exit_mask[:halo_bars] = False
+            exit_positions, sell_prices, reasons = resolve_intraday_exits(
+                direction, start_positions, open_trades.stops, open_trades.profit_takes, low_index, high_index,
+                next_true(exit_mask), close_prices)
+            is_open = exit_positions < 0
+            if max_hold_bars is not None:
+                # As in simulate_trades_intraday, the window's last bar stops the trade out,
+                # also when a limit or rule exit falls on that bar
+                deadline = open_trades.entry_idx + max_hold_bars - start
+                forced = (deadline < n) & (is_open | (exit_positions > deadline) | (
+                    (exit_positions == deadline) & (reasons != 'STOP')))
+                exit_positions[forced] = deadline[forced]
+                sell_prices[forced] = open_trades.stops[forced]
+                reasons[forced] = 'STOP'
+                is_open = is_open & ~forced
+            done = ~is_open
+            closed[direction].append(pd.DataFrame({
+                'entry_idx': open_trades.entry_idx[done], 'exit_idx': start + exit_positions[done],
+                'exit_price': sell_prices[done], 'reason': reasons[done], 'stop': open_trades.stops[done]}))
+            keep.append(exit_positions[done])
+            open_trades.keep(is_open)
+
+        # The first bar and the first bar without an entry of every month keep the yearly and
+        # monthly tables, open positions carried into a period and drawdown lows identical,
+        # the last bar is where trades still open at the end may be stopped out
+        new_times = pd.DatetimeIndex(times)
+        months = new_times.year * 12 + new_times.month
+        idle = ~((df['entry_long'].to_numpy() == True) | (df['entry_short'].to_numpy() == True))[halo_bars:]
+        for month, position in zip(*np.unique(months, return_index=True)):
+            if month not in months_seen:
+                months_seen.add(month)
+                keep.append([halo_bars + position])
+        keep.append([n - 1])
+        idle_positions = np.flatnonzero(idle)
+        for month, position in zip(*np.unique(months[idle_positions], return_index=True)):
+            if month not in months_with_idle_bar:
+                months_with_idle_bar.add(month)
+                keep.append([halo_bars + idle_positions[position]])
+        rows = np.unique(np.concatenate(keep).astype(np.int64))
+        kept.append((start + rows, frame.iloc[rows].assign(
+            **{column: df[column].to_numpy()[rows] for column in STRATEGY_COLUMNS})))
+
+        halo = frame.iloc[max(len(frame) - warmup_bars, 0):]
+        offset += len(chunk)
+        del metrics, df, low_index, high_index
+
+    if offset == 0:
+        raise Exception('No market data to back test')
+    positions = np.concatenate([rows for rows, _ in kept])
+    bars = pd.concat([rows for _, rows in kept], ignore_index=True)
+    positions, first = np.unique(positions, return_index=True)
+    bars = bars.iloc[first].reset_index(drop=True)
+
+    entries = []
+    for direction in ['LONG', 'SHORT']:
+        open_trades = pending[direction]
+        closed[direction].append(pd.DataFrame({
+            'entry_idx': open_trades.entry_idx, 'exit_idx': -1, 'exit_price': np.nan, 'reason': '',
+            'stop': open_trades.stops}))
+        ledger = pd.concat(closed[direction], ignore_index=True).sort_values(
+            'entry_idx', kind='stable')
+        if max_hold_bars is not None:
+            # Windows running past the data end on its last bar, which stops out every trade
+            # still open or exiting there, as in simulate_trades_intraday
+            last = offset - 1
+            forced = ((ledger['entry_idx'] + max_hold_bars > last) & (ledger['entry_idx'] < last) &
+                      ((ledger['exit_idx'] < 0) | ((ledger['exit_idx'] == last) & (ledger['reason'] != 'STOP'))))
+            ledger.loc[forced, 'exit_idx'] = last
+            ledger.loc[forced, 'exit_price'] = ledger.loc[forced, 'stop']
+            ledger.loc[forced, 'reason'] = 'STOP'
+        exit_idx = ledger['exit_idx'].to_numpy(dtype=np.int64)
+        entries.append((direction, np.searchsorted(positions, ledger['entry_idx'].to_numpy(dtype=np.int64)),
+                        np.where(exit_idx < 0, -1, np.searchsorted(positions, exit_idx)),
+                        ledger['exit_price'].to_numpy(dtype=np.float64), ledger['reason'].to_numpy(dtype=object)))
+
+    metrics = RoboticFundMetrics(bars, lazy=True, memory_mode=memory_mode)
+    metrics.record_trades(entries)
+    trades = metrics.trades.copy()
+    trades['entry_idx'] = positions[trades['entry_idx'].to_numpy()]
+    trades['exit_idx'] = np.where(trades['exit_idx'] < 0, -1,
+                                  positions[trades['exit_idx'].to_numpy()])
+    return ChunkedBacktestResult(trades=trades, metrics=metrics, bars=offset)
@@ -0,0 +1,205 @@
+import numpy as np
+import pandas as pd
+
+FINE_BAR_COLUMNS = ['snapshotTimeUTC', 'openPrice',
+                    'highPrice', 'lowPrice', 'closePrice']
+
+
+class FineBarSource:
+    '''
+    Finer resolution bars for the drill-down of ambiguous bars, looked up per bar in a local
+    DataFrame cache and, where the cache has nothing, loaded lazily from the database with
+    MarketData.return_market_data_from_db. Loaded bars are added to the cache and a bar is
+    never queried twice, so the cost grows with the number of ambiguous bars rather than
+    with the length of the history.
+    '''
+
+    def __init__(self, instrument: str, resolution: str, cache: pd.DataFrame = None, use_db: bool = True,
+                 merge_gap: pd.Timedelta = pd.Timedelta(hours=6)):
+        '''
+        Description: Sets up the source
+
+        Args:
+            instrument (str): instrument, e.g. 'AUDUSD'
+            resolution (str): resolution of the finer bars, e.g. 'MINUTE_1'
+            cache (pd.DataFrame): optional finer bars already at hand, with snapshotTimeUTC
+                and OHLC prices, e.g. from an earlier run's 'bars'
+            use_db (bool): False to only use the cache
+            merge_gap (pd.Timedelta): ambiguous bars closer than this are loaded with one query
+        '''
+        self.instrument = instrument
+        self.resolution = resolution
+        self.use_db = use_db
+        self.merge_gap = merge_gap
+        self.bars = self.normalise(cache if cache is not None else pd.DataFrame(
+            columns=FINE_BAR_COLUMNS))
+        self.requested = set()
+        self.queries = 0
+
+    def normalise(self, bars: pd.DataFrame) -> pd.DataFrame:
+        '''
+        Description: Keeps the price columns of bars, sorted by time without duplicates
+
+        Args:
+            bars (pd.DataFrame): market data with snapshotTimeUTC and OHLC prices
+
+        Returns:
+            pd.DataFrame with a datetime64 snapshotTimeUTC and float prices
+        '''
+        bars = bars[FINE_BAR_COLUMNS].copy()
+        bars['snapshotTimeUTC'] = pd.to_datetime(
+            bars['snapshotTimeUTC']).astype('datetime64[ns]')
+        for column in FINE_BAR_COLUMNS[1:]:
+            bars[column] = bars[column].astype(np.float64)
+        return bars.drop_duplicates('snapshotTimeUTC').sort_values('snapshotTimeUTC', ignore_index=True)
+
+    def get_bars(self, starts, length: pd.Timedelta) -> pd.DataFrame:
+        '''
+        Description: Finer bars inside the coarse bars [start, start + length)
+
+        Args:
+            starts (np.ndarray): start times of the coarse bars
+            length (pd.Timedelta): length of a coarse bar
+
+        Returns:
+            pd.DataFrame of finer bars sorted by time
+        '''
+        starts = np.unique(np.asarray(starts, dtype='datetime64[ns]'))
+        ends = starts + np.timedelta64(length)
+        if self.use_db:
+            first, last = self.bar_ranges(starts, ends)
+            missing = [(start, end) for start, end, found in zip(starts, ends, last > first)
+                       if not found and (start, end) not in self.requested]
+            if missing:
+                self.load_from_db(missing)
+        first, last = self.bar_ranges(starts, ends)
+        counts = last - first
+        positions = np.repeat(first - np.cumsum(counts) + counts, counts) + \
+            np.arange(counts.sum())
+        return self.bars.iloc[positions]
+
+    def bar_ranges(self, starts, ends) -> tuple:
+        times = self.bars['snapshotTimeUTC'].to_numpy()
+        return np.searchsorted(times, starts), np.searchsorted(times, ends)
+
+    def load_from_db(self, ranges: list) -> None:
+        '''
+        Description: Loads the finer bars of the given time ranges from the database into
+        'bars', ranges closer than merge_gap share one query
+
+        Args:
+            ranges (list): sorted (start, end) tuples
+
+        Returns:
+            extends class variable 'bars'
+        '''
+        # Only needed when the database is used
+        from .marketData import MarketData
+        market_data = MarketData()
+        merged = [list(ranges[0])]
+        for start, end in ranges[1:]:
+            if start - merged[-1][1] <= np.timedelta64(self.merge_gap):
+                merged[-1][1] = end
+            else:
+                merged.append([start, end])
+        loaded = [self.bars]
+        for start, end in merged:
+            loaded.append(market_data.return_market_data_from_db(
+                self.instrument, self.resolution,
+                from_date=str(pd.Timestamp(start)), to_date=str(pd.Timestamp(end))))
+            self.queries += 1
+        self.requested.update(ranges)
+        self.bars = self.normalise(pd.concat(loaded, ignore_index=True))
+
+
+def ambiguous_exits(trades: pd.DataFrame, highs, lows, stops, profit_takes) -> np.ndarray:
+    '''
+    Description: Flags stop exits on a bar whose range also reached the profit take, the
+    simulators cannot tell which came first and give these to the stop
+
+    Args:
+        trades (pd.DataFrame): trade ledger, see RoboticFundMetrics.record_trades
+        highs (np.ndarray): highPrice per bar
+        lows (np.ndarray): lowPrice per bar
+        stops (np.ndarray): stop level per trade
+        profit_takes (np.ndarray): profit take level per trade
+
+    Returns:
+        np.ndarray of bool per trade
+    '''
+    exits = np.maximum(trades['exit_idx'].to_numpy(), 0)
+    is_long = (trades['side'] == 'LONG').to_numpy()
+    with np.errstate(invalid='ignore'):
+        stop_hit = np.where(is_long, lows[exits] < stops, highs[exits] >= stops)
+        limit_hit = np.where(
+            is_long, highs[exits] >= profit_takes, lows[exits] <= profit_takes)
+    return (trades['reason'] == 'STOP').to_numpy() & (trades['exit_idx'] >= 0).to_numpy() & stop_hit & limit_hit
+
+
+def resolve_ambiguous_exits(trades: pd.DataFrame, bar_times, bar_length: pd.Timedelta, highs, lows, stops,
+                            profit_takes, source: FineBarSource) -> tuple:
+    '''
+    Description: Replays the finer bars of every ambiguous exit bar (see ambiguous_exits) to
+    find whether the stop or the profit take was reached first. Trades whose profit take
+    came first become LIMIT exits at the profit take, on the same bar. Trades whose finer
+    bar also reaches both levels, or without finer bars, stay stopped out.
+
+    Args:
+        trades (pd.DataFrame): trade ledger, see RoboticFundMetrics.record_trades
+        bar_times (np.ndarray): start time of every coarse bar
+        bar_length (pd.Timedelta): length of a coarse bar
+        highs (np.ndarray): highPrice per bar
+        lows (np.ndarray): lowPrice per bar
+        stops (np.ndarray): stop level per trade
+        profit_takes (np.ndarray): profit take level per trade
+        source (FineBarSource): finer bars
+
+    Returns:
+        tuple of the updated ledger and a report dict with the counts 'ambiguous_trades',
+        'ambiguous_bars', 'stop_first', 'limit_first', 'unresolved' (both levels inside
+        one finer bar, or neither in any), 'missing' (no finer bars) and 'fine_bars' used
+    '''
+    trades = trades.copy()
+    rows = np.flatnonzero(ambiguous_exits(
+        trades, highs, lows, stops, profit_takes))
+    bar_times = np.asarray(bar_times, dtype='datetime64[ns]')
+    starts = bar_times[trades['exit_idx'].to_numpy()[rows]]
+    fine = source.get_bars(starts, bar_length) if len(
+        rows) else source.bars.iloc[:0]
+
+    # Every ambiguous trade against every finer bar of its exit bar
+    fine_times = fine['snapshotTimeUTC'].to_numpy()
+    first = np.searchsorted(fine_times, starts)
+    counts = np.searchsorted(
+        fine_times, starts + np.timedelta64(bar_length)) - first
+    trade_of = np.repeat(np.arange(len(rows)), counts)
+    order = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    positions = first[trade_of] + order
+    fine_highs = fine['highPrice'].to_numpy()[positions]
+    fine_lows = fine['lowPrice'].to_numpy()[positions]
+    is_long = (trades['side'] == 'LONG').to_numpy()[rows][trade_of]
+    stop = stops[rows][trade_of]
+    take = profit_takes[rows][trade_of]
+    stop_hit = np.where(is_long, fine_lows < stop, fine_highs >= stop)
+    limit_hit = np.where(is_long, fine_highs >= take, fine_lows <= take)
+    never = np.iinfo(np.int64).max
+    first_stop = np.full(len(rows), never)
+    first_limit = np.full(len(rows), never)
+    np.minimum.at(first_stop, trade_of[stop_hit], order[stop_hit])
+    np.minimum.at(first_limit, trade_of[limit_hit], order[limit_hit])
+
+    limit_first = first_limit < first_stop
+    missing = counts == 0
+    changed = rows[limit_first]
+    trades.loc[changed, 'reason'] = 'LIMIT'
+    trades.loc[changed, 'exit_price'] = profit_takes[changed]
+    report = {
+        'ambiguous_trades': len(rows),
+        'ambiguous_bars': len(np.unique(starts)),
+        'stop_first': int((first_stop < first_limit).sum()),
+        'limit_first': int(limit_first.sum()),
+        'unresolved': int((~missing & (first_stop == first_limit)).sum()),
+        'missing': int(missing.sum()),
+        'fine_bars': len(fine),
+    }
+    return trades, report
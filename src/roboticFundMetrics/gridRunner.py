@@ -0,0 +1,165 @@
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict
+from multiprocessing import shared_memory
+import itertools
+import numpy as np
+import pandas as pd
+from .roboticFundMetrics import RoboticFundMetrics
+from .riskMetrics import equity_curve, metrics_periods_per_year, risk_summary
+
+# Per worker process state, set once by _init_worker
+_worker = {}
+
+
+def _share_frame(df: pd.DataFrame) -> tuple:
+    # Numeric, boolean and datetime columns go into shared memory blocks, anything else
+    # (strings) is handed to each worker once through the pool initializer
+    blocks = []
+    shared_columns = []
+    other_columns = {}
+    for name in df.columns:
+        values = df[name].to_numpy()
+        if values.dtype.kind in 'biufM':
+            block = shared_memory.SharedMemory(
+                create=True, size=max(values.nbytes, 1))
+            np.ndarray(values.shape, dtype=values.dtype,
+                       buffer=block.buf)[:] = values
+            blocks.append(block)
+            shared_columns.append(
+                (name, block.name, values.dtype.str, len(values)))
+        else:
+            other_columns[name] = values
+    return blocks, shared_columns, other_columns
+
+
+def _init_worker(shared_columns: list, other_columns: dict, columns: list, memory_mode: str) -> None:
+    _worker['blocks'] = []
+    _worker['arrays'] = {}
+    for name, block_name, dtype, length in shared_columns:
+        block = shared_memory.SharedMemory(name=block_name)
+        array = np.ndarray(length, dtype=np.dtype(dtype), buffer=block.buf)
+        array.flags.writeable = False
+        _worker['blocks'].append(block)
+        _worker['arrays'][name] = array
+    _worker['arrays'].update(other_columns)
+    _worker['columns'] = columns
+    _worker['memory_mode'] = memory_mode
+
+
+def worker_metrics() -> RoboticFundMetrics:
+    '''
+    Description: Builds a RoboticFundMetrics from the data shared with this worker process,
+    for use inside functions run by map_shared. Every call gets its own frame, strategies
+    may modify it freely
+
+    Args:
+        None
+
+    Returns:
+        RoboticFundMetrics over the shared columns
+    '''
+    arrays = _worker['arrays']
+    df = pd.DataFrame({name: arrays[name] for name in _worker['columns']})
+    return RoboticFundMetrics.from_prepared_frame(df, memory_mode=_worker['memory_mode'])
+
+
+def _run_task(task: tuple) -> dict:
+    strategy, params, simulate, simulate_kwargs, position_size, risk_metrics = task
+    result = dict(params)
+    try:
+        metrics = worker_metrics()
+        strategy(metrics, **params)
+        getattr(metrics, simulate)(**simulate_kwargs)
+        stats = metrics.compute_stats(position_size)
+        result.update({field: value for field, value in asdict(stats).items()
+                       if np.ndim(value) == 0 and not isinstance(value, (pd.Series, pd.DataFrame))})
+        if risk_metrics:
+            result.update(risk_summary(equity_curve(metrics), stats.account_balance_needed,
+                                       metrics_periods_per_year(metrics)).to_dict())
+        result['error'] = None
+    except Exception as error:
+        result['error'] = f'{type(error).__name__}: {error}'
+    return result
+
+
+def map_shared(metrics: RoboticFundMetrics, function, tasks: list, processes: int = None, chunksize: int = 1) -> list:
+    '''
+    Description: Runs function(task) for every task in worker processes that share
+    metrics.df through shared memory. Inside function, worker_metrics() returns a copy of
+    the metrics to work on. On platforms that spawn processes call this from under
+    if __name__ == '__main__'.
+
+    Args:
+        metrics (RoboticFundMetrics): prepared metrics whose df is shared with the workers
+        function (callable): module level function taking one task
+        tasks (list): one picklable task per call
+        processes (int): number of worker processes, defaults to the number of cores
+        chunksize (int): tasks sent to a worker at once
+
+    Returns:
+        list of the function results in task order
+    '''
+    df = metrics.df.reset_index(drop=True)
+    blocks, shared_columns, other_columns = _share_frame(df)
+    try:
+        with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker,
+                                 initargs=(shared_columns, other_columns, list(df.columns), metrics.memory_mode)) as executor:
+            return list(executor.map(function, tasks, chunksize=chunksize))
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+
+def parameter_grid(grid: dict) -> list:
+    '''
+    Description: Expands a parameter grid into every combination
+
+    Args:
+        grid (dict): parameter name to list of values, e.g. {'stop_pips': [10, 20]}
+
+    Returns:
+        list of dicts, one per combination
+    '''
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*[grid[name] for name in names])]
+
+
+def run_grid(metrics: RoboticFundMetrics, strategy, grid: dict, processes: int = None, position_size: float = 1,
+             simulate: str = 'simulate_trades_intraday', simulate_kwargs: dict = None, chunksize: int = 1,
+             risk_metrics: bool = False) -> pd.DataFrame:
+    '''
+    Description: Back tests a strategy for every combination of a parameter grid across all
+    cores. The metrics DataFrame, with whatever indicators the strategy reads already
+    calculated, is put in shared memory once and every worker rebuilds its frames from
+    there, so nothing the size of the data is pickled per task.
+    On platforms that spawn processes call this from under if __name__ == '__main__'.
+
+    Args:
+        metrics (RoboticFundMetrics): prepared metrics, e.g. after require(*indicators)
+        strategy (callable): module level function strategy(metrics, **params) that sets
+            the entry/exit columns, stops and limits
+        grid (dict): parameter name to list of values passed to strategy
+        processes (int): number of worker processes, defaults to the number of cores
+        position_size (float): position size passed to compute_stats
+        simulate (str): simulator method, 'simulate_trades_intraday' or
+            'simulate_trades_intraday_trailing_stop'
+        simulate_kwargs (dict): keyword arguments for the simulator
+        chunksize (int): tasks sent to a worker at a time
+        risk_metrics (bool): True to add the riskMetrics.risk_summary columns ('sharpe',
+            'sortino', 'calmar', 'ulcer_index', ...) of every run, on the account balance needed
+
+    Returns:
+        pd.DataFrame with one row per combination: the parameters, the scalar fields of
+        BacktestStats (final_score, win_rate_score, ...) and 'error' if the run failed
+    '''
+    if simulate_kwargs is None:
+        simulate_kwargs = {}
+    tasks = [(strategy, params, simulate, simulate_kwargs, position_size, risk_metrics)
+             for params in parameter_grid(grid)]
+    results = map_shared(metrics, _run_task, tasks, processes, chunksize)
+
+    failed = sum(result['error'] is not None for result in results)
+    if failed:
+        print(f'{failed} of {len(results)} grid runs failed, see column error')
+    return pd.DataFrame(results)
@@ -0,0 +1,142 @@
+from collections import OrderedDict
+import hashlib
+import os
+import numpy as np
+
+
+class IndicatorCache:
+    '''
+    Opt-in memo of indicator arrays shared between RoboticFundMetrics instances, keyed by
+    (data fingerprint, indicator name, parameters). Least recently used entries are
+    evicted once max_bytes is exceeded and are written to spill_dir if one is given.
+    '''
+    max_bytes: int
+    spill_dir: str
+    hits: int
+    misses: int
+    spill_hits: int
+    evictions: int
+
+    def __init__(self, max_bytes: int = 512 * 1024 * 1024, spill_dir: str = None):
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.entries = OrderedDict()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.spill_hits = 0
+        self.evictions = 0
+        if spill_dir is not None:
+            os.makedirs(spill_dir, exist_ok=True)
+
+    @staticmethod
+    def fingerprint(*arrays, sample_blocks: int = 16, block_size: int = 256) -> str:
+        '''
+        Description: Cheap fingerprint of price arrays from their length plus a hash of
+        evenly spaced sample blocks (always including the first and last block)
+
+        Args:
+            arrays (np.ndarray): e.g. open, high, low and close prices
+            sample_blocks (int): number of blocks hashed per array, None hashes every value
+            block_size (int): number of values per block
+
+        Returns:
+            hex digest string
+        '''
+        digest = hashlib.blake2b(digest_size=16)
+        for values in arrays:
+            values = np.ascontiguousarray(values, dtype=np.float64)
+            n = len(values)
+            digest.update(str(n).encode())
+            if sample_blocks is None:
+                digest.update(values.tobytes())
+                continue
+            starts = np.unique(np.linspace(
+                0, max(n - block_size, 0), sample_blocks).astype(np.int64))
+            for start in starts:
+                digest.update(values[start:start + block_size].tobytes())
+        return digest.hexdigest()
+
+    def get_or_compute(self, fingerprint: str, indicator: str, params: tuple, compute) -> tuple:
+        '''
+        Description: Returns the cached arrays for the key or computes and stores them
+
+        Args:
+            fingerprint (str): data fingerprint from IndicatorCache.fingerprint
+            indicator (str): indicator name, e.g. 'sma'
+            params (tuple): indicator parameters
+            compute (callable): no argument function returning a tuple of np.ndarray
+
+        Returns:
+            tuple of np.ndarray, copies so callers can modify them freely
+        '''
+        key = (fingerprint, indicator, tuple(params))
+        arrays = self.get(key)
+        if arrays is None:
+            self.misses += 1
+            arrays = tuple(np.asarray(array) for array in compute())
+            self.put(key, arrays)
+        else:
+            self.hits += 1
+        return tuple(array.copy() for array in arrays)
+
+    def get(self, key: tuple) -> tuple:
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            return self.entries[key]
+        path = self._spill_path(key)
+        if path is not None and os.path.exists(path):
+            with np.load(path) as spilled:
+                arrays = tuple(spilled[name] for name in sorted(
+                    spilled.files, key=lambda name: int(name[len('arr_'):])))
+            self.spill_hits += 1
+            self.put(key, arrays)
+            return arrays
+        return None
+
+    def put(self, key: tuple, arrays: tuple) -> None:
+        if key in self.entries:
+            self.current_bytes -= sum(array.nbytes for array in self.entries.pop(key))
+        for array in arrays:
+            array.flags.writeable = False
+        self.entries[key] = arrays
+        self.current_bytes += sum(array.nbytes for array in arrays)
+        while self.current_bytes > self.max_bytes and len(self.entries) > 1:
+            self._evict()
+
+    def _evict(self) -> None:
+        key, arrays = self.entries.popitem(last=False)
+        self.current_bytes -= sum(array.nbytes for array in arrays)
+        self.evictions += 1
+        path = self._spill_path(key)
+        if path is not None and not os.path.exists(path):
+            np.savez(path, *arrays)
+
+    def _spill_path(self, key: tuple) -> str:
+        if self.spill_dir is None:
+            return None
+        name = hashlib.blake2b(repr(key).encode(), digest_size=16).hexdigest()
+        return os.path.join(self.spill_dir, f'{name}.npz')
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.current_bytes = 0
+
+    def get_stats(self) -> dict:
+        '''
+        Description: Hit/miss counters and memory use
+
+        Args:
+            None
+
+        Returns:
+            dict with hits, misses, spill_hits, evictions, entries and bytes
+        '''
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'spill_hits': self.spill_hits,
+            'evictions': self.evictions,
+            'entries': len(self.entries),
+            'bytes': self.current_bytes,
+        }
@@ -32,6 +32,28 @@ class MarketData:
 
         return market_data
 
+    def iterate_market_data_from_db(self, instrument: str, resolution: str, from_date: str = '2000-01-01', to_date: str = '2050-01-01', chunk_size: int = 500000):
+        '''
+        Description: streams market data from local or remote db in chunks, oldest first, so
+        histories larger than memory can be processed chunk by chunk
+
+        Args:
+            instrument (string): name of instrument, i.e, AUDUSD
+            resolution (string): MINUTE_1, MINUTE_15, MINUTE_30, DAY
+            from_date (string): '2000-01-01'
+            to_date (string): '2000-01-01'
+            chunk_size (int): number of rows per chunk
+
+        Returns:
+            iterator of pandas dataframes with market data in ascending time order
+        '''
+        # Connect to database
+        con = dbConnect()
+
+        # Load data from roboticfund DB
+        yield from pandas.read_sql(
+            f"Select * from market_data where instrument = '{instrument}' and resolution = '{resolution}' and datetime >= '{from_date}' and datetime <= '{to_date}' order by datetime asc", con, chunksize=chunk_size)
+
     def return_eod_market_data_from_EOD(self, instrument: str, exchange: str = 'AU', from_date='2000-01-01', to_date='2024-12-31') -> pandas.DataFrame:
         '''
         Description: returns end of the day market data from EOD historical API
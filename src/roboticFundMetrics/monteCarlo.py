@@ -0,0 +1,148 @@
+from dataclasses import dataclass
+import numpy as np
+import pandas as pd
+from .roboticFundMetrics import RoboticFundMetrics
+
+
+@dataclass
+class MonteCarloResult:
+    '''
+    Result of monte_carlo(): one row per simulated path and percentiles of every column
+    '''
+    paths: pd.DataFrame
+    summary: pd.DataFrame
+
+
+def trade_profits(metrics: RoboticFundMetrics) -> np.ndarray:
+    '''
+    Description: Per-trade profits in trade order, from the ledger 'trades' if it has been
+    priced (see set_trade_pnl), otherwise from column 'profit' (see add_more_stats)
+
+    Args:
+        metrics (RoboticFundMetrics): metrics after a simulation
+
+    Returns:
+        np.ndarray of the profit of every closed trade
+    '''
+    if metrics.trades is not None and metrics.trades['pnl'].notna().any():
+        profits = metrics.trades['pnl'].to_numpy(dtype=np.float64)
+    else:
+        profits = metrics.df['profit'].to_numpy(dtype=np.float64)
+    return profits[~np.isnan(profits)]
+
+
+def resample(profits: np.ndarray, n_paths: int, rng: np.random.Generator, block_size: int = None) -> np.ndarray:
+    '''
+    Description: Draws trade sequences of the same length as profits
+
+    Args:
+        profits (np.ndarray): historical per-trade profits
+        n_paths (int): number of sequences
+        rng (np.random.Generator): random generator
+        block_size (int): None for an i.i.d. bootstrap, otherwise the length of the blocks of
+            consecutive trades of a circular block bootstrap (keeps streaks together)
+
+    Returns:
+        np.ndarray of shape (n_paths, len(profits))
+    '''
+    length = len(profits)
+    if block_size is None or block_size <= 1:
+        return profits[rng.integers(0, length, size=(n_paths, length))]
+    n_blocks = -(-length // block_size)
+    starts = rng.integers(0, length, size=(n_paths, n_blocks, 1))
+    positions = (starts + np.arange(block_size)) % length
+    return profits[positions.reshape(n_paths, -1)[:, :length]]
+
+
+def path_statistics(paths: np.ndarray) -> dict:
+    '''
+    Description: Risk statistics of every path of a matrix of trade sequences
+
+    Args:
+        paths (np.ndarray): per-trade profits, shape (n_paths, n_trades)
+
+    Returns:
+        dict of np.ndarray per path: 'final_profit', 'max_drawdown' (largest fall of the
+        cumulative profit from its previous peak, <= 0) and 'max_losing_streak' (the
+        repo's drawdown, the most negative sum of consecutive losing trades, <= 0)
+    '''
+    # Two path sized buffers, every step works in place to keep memory traffic down
+    equity = np.cumsum(paths, axis=1)
+    final_profit = equity[:, -1].copy() if equity.shape[1] else np.zeros(len(paths))
+    work = np.maximum(equity, 0)
+    np.maximum.accumulate(work, axis=1, out=work)
+    np.subtract(equity, work, out=work)
+    max_drawdown = work.min(axis=1, initial=0)
+
+    # Losses since the last winning trade: the running sum of losses minus its value at the
+    # last win, which is also its running minimum over wins as the sum only ever falls
+    losses = np.minimum(paths, 0, out=equity)
+    np.cumsum(losses, axis=1, out=losses)
+    work.fill(np.inf)
+    np.copyto(work, losses, where=paths > 0)
+    np.minimum.accumulate(work, axis=1, out=work)
+    work[np.isinf(work)] = 0
+    np.subtract(losses, work, out=work)
+    max_losing_streak = work.min(axis=1, initial=0)
+
+    return {
+        'final_profit': final_profit,
+        'max_drawdown': max_drawdown,
+        'max_losing_streak': max_losing_streak,
+    }
+
+
+def monte_carlo(profits, n_paths: int = 10000, block_size: int = None, seed: int = None, max_holds: int = 1,
+                position_size: float = 125, average_margin: float = 0.005, max_bytes: int = 64 * 1024 * 1024,
+                percentiles: list = None) -> MonteCarloResult:
+    '''
+    Description: Bootstraps the per-trade profit series into many alternative trade orders
+    and reports the distribution of drawdown, final profit and the account balance
+    get_account_balance_needed would ask for on each path. Paths are simulated in chunks
+    so memory stays below max_bytes however many paths are requested.
+
+    Args:
+        profits (np.ndarray): historical per-trade profits, see trade_profits
+        n_paths (int): number of simulated paths
+        block_size (int): None for an i.i.d. bootstrap, otherwise the block length of a
+            circular block bootstrap
+        seed (int): random seed for repeatable results
+        max_holds (int): maximum concurrent positions, e.g. metrics.get_max_holds()
+        position_size (float): as in get_account_balance_needed
+        average_margin (float): as in get_account_balance_needed
+        max_bytes (int): memory budget of one chunk of paths
+        percentiles (list): percentiles in the summary, defaults to [1, 5, 25, 50, 75, 95, 99]
+
+    Returns:
+        MonteCarloResult with 'paths' (columns 'final_profit', 'max_drawdown',
+        'max_losing_streak', 'account_balance_needed' and 'return_on_capital' in %) and
+        'summary' (those columns at each percentile)
+    '''
+    if percentiles is None:
+        percentiles = [1, 5, 25, 50, 75, 95, 99]
+    profits = np.asarray(profits, dtype=np.float64)
+    profits = profits[~np.isnan(profits)]
+    if len(profits) == 0:
+        raise Exception('No trades to resample')
+    rng = np.random.default_rng(seed)
+    # A chunk holds the resampled paths, the two work buffers and the random indices
+    chunk_paths = max(1, int(max_bytes // (len(profits) * 8 * 4)))
+
+    results = {'final_profit': [], 'max_drawdown': [], 'max_losing_streak': []}
+    for start in range(0, n_paths, chunk_paths):
+        paths = resample(profits, min(chunk_paths, n_paths - start),
+                         rng, block_size)
+        for name, values in path_statistics(paths).items():
+            results[name].append(values)
+    results = pd.DataFrame({name: np.concatenate(values)
+                           for name, values in results.items()})
+
+    # Same sizing rule as get_account_balance_needed, with the path's own losing streak
+    results['account_balance_needed'] = max_holds * position_size / average_margin + \
+        np.abs(np.round(results['max_losing_streak'], 0)) * 2
+    results['return_on_capital'] = results['final_profit'] / \
+        results['account_balance_needed'] * 100
+
+    summary = pd.DataFrame(np.percentile(results.to_numpy(), percentiles, axis=0),
+                           index=pd.Index(percentiles, name='percentile'), columns=results.columns)
+    return MonteCarloResult(paths=results, summary=summary)
@@ -0,0 +1,164 @@
+import numpy as np
+import pandas as pd
+from .roboticFundMetrics import RoboticFundMetrics
+from .utils.resolution import periods_per_year
+
+
+def equity_curve(metrics: RoboticFundMetrics) -> pd.Series:
+    '''
+    Description: Cumulative realised profit per bar. Trades in the ledger are booked on their
+    exit bar, without a ledger column 'profit' is used as is (booked on the entry bar)
+
+    Args:
+        metrics (RoboticFundMetrics): metrics after add_more_stats / compute_stats
+
+    Returns:
+        pd.Series of cumulative profit with the index of metrics.df
+    '''
+    n = len(metrics.df)
+    if metrics.trades is not None and metrics.trades['pnl'].notna().any():
+        closed = metrics.trades[(metrics.trades['exit_idx'] >= 0)
+                                & metrics.trades['pnl'].notna()]
+        profit = np.zeros(n)
+        np.add.at(profit, closed['exit_idx'].to_numpy(),
+                  closed['pnl'].to_numpy(dtype=np.float64))
+    else:
+        profit = np.nan_to_num(metrics.df['profit'].to_numpy(dtype=np.float64))
+    return pd.Series(np.cumsum(profit), index=metrics.df.index, name='equity')
+
+
+def metrics_periods_per_year(metrics: RoboticFundMetrics, trading_days: int = 260, trading_hours: float = 24) -> float:
+    '''
+    Description: Bars per year from the 'resolution' (or 'RESOLUTION') column, or from the
+    number of bars per year of data if there is neither
+
+    Args:
+        metrics (RoboticFundMetrics): metrics
+        trading_days (int): trading days per year, see utils.resolution.periods_per_year
+        trading_hours (float): hours traded per day
+
+    Returns:
+        float periods per year
+    '''
+    for column in ['resolution', 'RESOLUTION']:
+        if column in metrics.df.columns:
+            return periods_per_year(metrics.df[column].iloc[0], trading_days, trading_hours)
+    timestamps = pd.DatetimeIndex(metrics.timestamps())
+    years = (timestamps[-1] - timestamps[0]) / pd.Timedelta(days=365.25)
+    if years <= 0:
+        raise Exception('Cannot derive periods per year from a single timestamp')
+    return (len(timestamps) - 1) / years
+
+
+def underwater(equity, capital: float):
+    '''
+    Description: Drawdown of the account (capital plus equity) from its running peak,
+    starting from the capital
+
+    Args:
+        equity (pd.Series | pd.DataFrame): cumulative profit, one column per curve
+        capital (float): starting account balance, e.g. account_balance_needed
+
+    Returns:
+        same shape as equity, drawdown as a fraction of the peak (<= 0)
+    '''
+    account = equity + capital
+    return account / np.maximum(account.cummax(), capital) - 1
+
+
+def _returns(equity, capital: float):
+    # Per bar return on the fixed capital, the first bar's profit is measured from 0
+    return equity.diff().fillna(equity.iloc[:1]) / capital
+
+
+def rolling_risk_metrics(equity, capital: float, periods_per_year: float, window: int = None,
+                         min_periods: int = 2, risk_free_rate: float = 0.03) -> pd.DataFrame:
+    '''
+    Description: Rolling (or expanding) annualised Sharpe, Sortino and Calmar ratios, ulcer
+    index and the underwater curve of one or many equity curves, each statistic is one
+    rolling pass over all curves at once. Returns are per bar profit on the fixed capital,
+    annualised with periods_per_year. Calmar is the annualised return over the window
+    divided by the deepest drawdown (from the running peak) inside the window.
+
+    Args:
+        equity (pd.Series | pd.DataFrame): cumulative profit per bar, one column per curve
+        capital (float): account balance the returns are measured on
+        periods_per_year (float): bars per year, see utils.resolution.periods_per_year
+        window (int): window length in bars, None for expanding statistics
+        min_periods (int): bars needed before a value is calculated
+        risk_free_rate (float): annual risk free rate
+
+    Returns:
+        pd.DataFrame with columns 'sharpe', 'sortino', 'calmar', 'ulcer_index' and
+        'underwater' (fractions) for a Series, or columns (metric, curve) for a DataFrame
+    '''
+    is_series = isinstance(equity, pd.Series)
+    curves = equity.to_frame() if is_series else equity
+    returns = _returns(curves, capital)
+    drawdown = underwater(curves, capital)
+    excess = returns - ((1 + risk_free_rate) ** (1 / periods_per_year) - 1)
+
+    def window_of(values):
+        if window is None:
+            return values.expanding(min_periods=min_periods)
+        return values.rolling(window, min_periods=min_periods)
+
+    scale = np.sqrt(periods_per_year)
+    mean_excess = window_of(excess).mean()
+    downside = np.sqrt(window_of(np.minimum(excess, 0) ** 2).mean())
+    annual_return = window_of(returns).mean() * periods_per_year
+    results = {
+        'sharpe': mean_excess / window_of(returns).std() * scale,
+        'sortino': mean_excess / downside * scale,
+        'calmar': annual_return / window_of(drawdown).min().abs(),
+        'ulcer_index': np.sqrt(window_of(drawdown ** 2).mean()),
+        'underwater': drawdown,
+    }
+    results = pd.concat(results, axis=1)
+    if is_series:
+        results.columns = results.columns.droplevel(1)
+    return results
+
+
+def risk_summary(equity, capital: float, periods_per_year: float, risk_free_rate: float = 0.03):
+    '''
+    Description: Full period risk statistics of one or many equity curves in one vectorised
+    pass, cheap enough to filter parameter sweeps on
+
+    Args:
+        equity (pd.Series | pd.DataFrame | np.ndarray): cumulative profit per bar, one column
+            per curve
+        capital (float): account balance the returns are measured on
+        periods_per_year (float): bars per year, see utils.resolution.periods_per_year
+        risk_free_rate (float): annual risk free rate
+
+    Returns:
+        pd.Series (one curve) or pd.DataFrame (one row per curve) of 'annual_return',
+        'annual_volatility', 'sharpe', 'sortino', 'max_underwater', 'calmar' and
+        'ulcer_index'
+    '''
+    is_series = isinstance(equity, pd.Series) or np.ndim(equity) == 1
+    names = equity.columns if isinstance(equity, pd.DataFrame) else None
+    values = np.asarray(equity, dtype=np.float64)
+    if values.ndim == 1:
+        values = values[:, None]
+
+    returns = np.diff(values, axis=0, prepend=0) / capital
+    account = values + capital
+    drawdown = account / np.maximum(np.maximum.accumulate(account, axis=0), capital) - 1
+    excess = returns - ((1 + risk_free_rate) ** (1 / periods_per_year) - 1)
+    mean_excess = excess.mean(axis=0)
+    annual_return = returns.mean(axis=0) * periods_per_year
+    max_underwater = drawdown.min(axis=0)
+    scale = np.sqrt(periods_per_year)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        summary = pd.DataFrame({
+            'annual_return': annual_return,
+            'annual_volatility': returns.std(axis=0, ddof=1) * scale,
+            'sharpe': mean_excess / returns.std(axis=0, ddof=1) * scale,
+            'sortino': mean_excess / np.sqrt((np.minimum(excess, 0) ** 2).mean(axis=0)) * scale,
+            'max_underwater': max_underwater,
+            'calmar': annual_return / np.abs(max_underwater),
+            'ulcer_index': np.sqrt((drawdown ** 2).mean(axis=0)),
+        }, index=names)
+    return summary.iloc[0].rename(getattr(equity, 'name', None)) if is_series else summary
@@ -1,11 +1,44 @@
 
 
+from collections import OrderedDict
 import pandas as pd
 import numpy as np
 from .utils.indicators.rsi import calculate_rsi
 from .utils.indicators.aws import calculate_awesome_oscillator
 from .utils.indicators.williamsR import calculate_williamsR
 from .utils.indicators.stochastic import calculate_stochastic_k
+from .utils.indicators.adx import calculate_adx
+from .utils.indicators.parabolicSar import calculate_parabolic_sar
+from .utils.indicators.streaming import StreamingMetrics
+from .indicatorCache import IndicatorCache
+from .backtestStats import BacktestStats
+from . import scoring
+from .utils.first_hit import FirstHitIndex, next_true
+from .utils.trade_simulation import resolve_intraday_exits, resolve_trailing_stop_exits, running_total
+from .utils.resolution import resolution_minutes
+from .drillDown import FineBarSource, resolve_ambiguous_exits
+
+
+# Price level columns are kept as float64 in low memory mode, everything else may be float32
+PRICE_COLUMNS = ['openPrice', 'highPrice', 'lowPrice', 'closePrice', 'long_stop', 'short_stop',
+                 'long_profit_take', 'short_profit_take', 'buyPrice', 'sellPrice']
+CATEGORICAL_COLUMNS = ['instrument', 'resolution', 'RESOLUTION', 'exit_reason']
+EXIT_REASONS = ['', 'STOP', 'LIMIT', 'RULE']
+# Sparse table levels of the first-hit indexes, each level is one float64 array of the frame's
+# length, fewer levels only mean a larger block table for long trades
+FIRST_HIT_LEVELS = {'default': 12, 'low': 8}
+# Intermediates kept per instance, each one a float64 array of the frame's length. Least
+# recently used ones are dropped first so parameter sweeps don't grow the memo without bound
+INTERMEDIATE_LIMITS = {'default': 32, 'low': 4}
+# Decimal places of the yearly breakdown columns when printed
+YEARLY_ROUNDING = {'Win rate (%)': 1, 'Max drawdown (%)': 1, 'Return on capital (%)': 1,
+                   'Trading capital ($)': 0, 'Profit ($)': 0}
+TRADE_COLUMNS = ['entry_idx', 'exit_idx', 'side',
+                 'entry_price', 'exit_price', 'reason', 'pnl']
+# Attributes compute_stats sets besides the returned BacktestStats
+SCORE_ATTRIBUTES = ['notional_value', 'position_size', 'win_rate', 'max_drawdown', 'max_profit_streak',
+                    'average_gain_weighted_to_1', 'profit_per_month', 'win_rate_per_month', 'win_rate_score',
+                    'drawdown_score', 'average_gain_score', 'win_rate_per_month_score', 'final_score']
 
 
 class RoboticFundMetrics():
@@ -18,49 +51,373 @@ class RoboticFundMetrics():
     win_rate_score: int
     drawdown_score: float
     final_score: int
+    trades: pd.DataFrame
 
-    def __init__(self, market_data: pd.DataFrame):
+    def __init__(self, market_data: pd.DataFrame, lazy: bool = False, cache: IndicatorCache = None, memory_mode: str = 'default'):
+        '''
+        Description: Builds the metrics DataFrame and registers the default indicator columns
+
+        Args:
+            market_data (pd.DataFrame): market data with snapshotTimeUTC and OHLC prices
+            lazy (bool): when True the default indicators are only calculated on first
+                access via column() / require(), otherwise they are all calculated now
+            cache (IndicatorCache): optional cache shared between instances for set_sma,
+                set_ema, set_atr, set_bollinger_bands and set_keltner_channel
+            memory_mode (str): 'default' or 'low'. In 'low' mode snapshotTimeUTC is stored as
+                datetime64 without the tmp_date/datetime copies, strings are categoricals,
+                indicators are float32 and trade dates are datetime64
+        '''
+        if memory_mode not in ['default', 'low']:
+            raise Exception(f'Unknown memory_mode {memory_mode}')
+        self.memory_mode = memory_mode
         # Now we want to construct a DataFrame with all metrics
         self.df = market_data
+        if memory_mode == 'low':
+            self.df = self.df.drop(columns=['datetime'], errors='ignore')
+            self.df['snapshotTimeUTC'] = pd.to_datetime(
+                self.df['snapshotTimeUTC'])
         self.df = self.df.set_index('snapshotTimeUTC', drop=False)
         self.df = self.df.sort_index()
-        self.df['tmp_date'] = pd.to_datetime(self.df['snapshotTimeUTC'])
-        self.df['weekNumber'] = self.df['tmp_date'].dt.isocalendar().week
-        self.df['dayOfYear'] = self.df['tmp_date'].dt.day_of_week
-        self.df['hour'] = self.df['tmp_date'].dt.hour
-        self.df['year'] = self.df['tmp_date'].dt.year
-        self.df['dayOfWeek'] = self.df['tmp_date'].dt.dayofweek
-        self.df['SMA_12'] = self.df['closePrice'].rolling(window=12).mean()
-        self.df['SMA_25'] = self.df['closePrice'].rolling(window=25).mean()
-        self.df['SMA_50'] = self.df['closePrice'].rolling(window=50).mean()
-        self.df['SMA_80'] = self.df['closePrice'].rolling(window=80).mean()
-        self.df['EMA_12'] = self.df['closePrice'].ewm(span=12).mean()
-        self.df['EMA_26'] = self.df['closePrice'].ewm(span=26).mean()
-        self.df['EMA_50'] = self.df['closePrice'].ewm(span=50).mean()
-        self.df['EMA_80'] = self.df['closePrice'].ewm(span=80).mean()
-        self.df['RSI'] = calculate_rsi(
-            self.df, close_col='closePrice', window=14)
-        self.df['AWS'] = calculate_awesome_oscillator(
-            self.df, high='highPrice', low='lowPrice', window1=4, window2=64)
-        self.df['MACD_12_26'] = self.df['EMA_12'] - self.df['EMA_26']
-        self.df['MACD_SIGNAL_12_26'] = self.df['MACD_12_26'].ewm(span=9).mean()
-        self.df['MACD_HIST_12_26'] = self.df['MACD_12_26'] - \
-            self.df['MACD_SIGNAL_12_26']
-        self.df['MACD_50_80'] = self.df['EMA_50'] - self.df['EMA_80']
-        self.df['MACD_SIGNAL_50_80'] = self.df['MACD_50_80'].ewm(span=9).mean()
-        self.df['MACD_HIST_50_80'] = self.df['MACD_50_80'] - \
-            self.df['MACD_SIGNAL_50_80']
-        self.df['WILLIAMS_R_14'] = calculate_williamsR(
-            self.df, close_col='closePrice', window=14)
-        self.df['STOCH_K_14'] = calculate_stochastic_k(
-            self.df, close_col='closePrice', window=14)
-        self.df['STOCH_D_14'] = self.df['STOCH_K_14'].rolling(window=3).mean()
-        self.df['lowestLowPriceStreak'] = self.df.groupby(
-            (self.df['lowPrice'] > self.df['lowPrice'].shift(1)).cumsum()).cumcount()+1
-        self.df['highestHighPriceStreak'] = self.df.groupby(
-            (self.df['highPrice'] < self.df['highPrice'].shift(1)).cumsum()).cumcount()+1
-        self.df['ATR_14'] = self.df['closePrice'].diff(
-        ).abs().rolling(window=14).mean()
+        self.cache = cache
+        self.fingerprint = None
+        self.prices_modified = False
+        self.intermediates = OrderedDict()
+        self.intermediate_stats = {}
+        self.indicators = {}
+        self.trades = None
+        self.trades_projected = False
+        self.register_default_indicators()
+        if not lazy:
+            self.require(*self.indicators)
+        if memory_mode == 'low':
+            self.compact_memory()
+
+    @classmethod
+    def from_prepared_frame(cls, df: pd.DataFrame, cache: IndicatorCache = None, memory_mode: str = 'default') -> 'RoboticFundMetrics':
+        '''
+        Description: Builds metrics around a frame that already holds its indicator columns,
+        e.g. one rebuilt from the columns of another instance's 'df'. Nothing is recalculated,
+        registered indicators missing from the frame are calculated on first access
+
+        Args:
+            df (pd.DataFrame): metrics frame with snapshotTimeUTC and OHLC prices
+            cache (IndicatorCache): optional shared indicator cache
+            memory_mode (str): 'default' or 'low'
+
+        Returns:
+            RoboticFundMetrics
+        '''
+        return cls(df, lazy=True, cache=cache, memory_mode=memory_mode)
+
+    def register_default_indicators(self) -> None:
+        '''
+        Description: Declares the default indicator columns without calculating them
+
+        Args:
+            None
+
+        Returns:
+            adds the default column builders to class variable 'indicators'
+        '''
+        close = lambda: self.df['closePrice']
+        if self.memory_mode != 'low':
+            self.register_indicator(
+                'tmp_date', lambda: pd.to_datetime(self.df['snapshotTimeUTC']))
+        self.register_indicator(
+            'weekNumber', lambda: self.timestamps().dt.isocalendar().week)
+        self.register_indicator(
+            'dayOfYear', lambda: self.timestamps().dt.day_of_week)
+        self.register_indicator(
+            'hour', lambda: self.timestamps().dt.hour)
+        self.register_indicator(
+            'year', lambda: self.timestamps().dt.year)
+        self.register_indicator(
+            'month', lambda: self.timestamps().dt.month)
+        self.register_indicator(
+            'dayOfWeek', lambda: self.timestamps().dt.dayofweek)
+        for length in [12, 25, 50, 80]:
+            self.register_indicator(
+                f'SMA_{length}', lambda length=length: close().rolling(window=length).mean())
+        for length in [12, 26, 50, 80]:
+            self.register_indicator(
+                f'EMA_{length}', lambda length=length: close().ewm(span=length).mean())
+        self.register_indicator('RSI', lambda: calculate_rsi(
+            self.df, close_col='closePrice', window=14))
+        self.register_indicator('AWS', lambda: calculate_awesome_oscillator(
+            self.df, high='highPrice', low='lowPrice', window1=4, window2=64))
+        for fast, slow in [(12, 26), (50, 80)]:
+            self.register_indicator(f'MACD_{fast}_{slow}', lambda fast=fast, slow=slow:
+                                    self.column(f'EMA_{fast}') - self.column(f'EMA_{slow}'))
+            self.register_indicator(f'MACD_SIGNAL_{fast}_{slow}', lambda fast=fast, slow=slow:
+                                    self.column(f'MACD_{fast}_{slow}').ewm(span=9).mean())
+            self.register_indicator(f'MACD_HIST_{fast}_{slow}', lambda fast=fast, slow=slow:
+                                    self.column(f'MACD_{fast}_{slow}') - self.column(f'MACD_SIGNAL_{fast}_{slow}'))
+        self.register_indicator('WILLIAMS_R_14', lambda: calculate_williamsR(
+            self.df, close_col='closePrice', window=14))
+        self.register_indicator('STOCH_K_14', lambda: calculate_stochastic_k(
+            self.df, close_col='closePrice', window=14))
+        self.register_indicator(
+            'STOCH_D_14', lambda: self.column('STOCH_K_14').rolling(window=3).mean())
+        self.register_indicator('lowestLowPriceStreak', lambda: self.df.groupby(
+            (self.df['lowPrice'] > self.df['lowPrice'].shift(1)).cumsum()).cumcount()+1)
+        self.register_indicator('highestHighPriceStreak', lambda: self.df.groupby(
+            (self.df['highPrice'] < self.df['highPrice'].shift(1)).cumsum()).cumcount()+1)
+        self.register_indicator('ATR_14', lambda: close().diff(
+        ).abs().rolling(window=14).mean())
+
+    def register_indicator(self, name: str, builder) -> None:
+        '''
+        Description: Declares an indicator column that is calculated on first access
+
+        Args:
+            name (str): column name in class variable 'df'
+            builder (callable): no argument function returning the column values
+
+        Returns:
+            adds the builder to class variable 'indicators'
+        '''
+        self.indicators[name] = builder
+
+    def column(self, name: str) -> pd.Series:
+        '''
+        Description: Returns a column of the metrics DataFrame, calculating it first if it
+        is a registered indicator that has not been materialised yet
+
+        Args:
+            name (str): column name
+
+        Returns:
+            pd.Series of the column in class variable 'df'
+        '''
+        if name not in self.df.columns and name in self.indicators:
+            self.df[name] = self.indicators[name]()
+            if self.memory_mode == 'low':
+                self.compact_column(name)
+        return self.df[name]
+
+    def require(self, *names: str) -> None:
+        '''
+        Description: Materialises the given registered indicator columns, e.g. the set a
+        strategy declares it needs
+
+        Args:
+            names (str): column names
+
+        Returns:
+            adds the columns to dataframe in class variable 'df'
+        '''
+        for name in names:
+            self.column(name)
+
+    def __getitem__(self, name: str) -> pd.Series:
+        return self.column(name)
+
+    def timestamps(self) -> pd.Series:
+        '''
+        Description: Returns snapshotTimeUTC as datetime64, from 'tmp_date' unless in low memory
+        mode where snapshotTimeUTC itself is already datetime64
+
+        Args:
+            None
+
+        Returns:
+            pd.Series of datetime64
+        '''
+        if self.memory_mode == 'low':
+            return self.df['snapshotTimeUTC']
+        return self.column('tmp_date')
+
+    def compact_column(self, name: str) -> None:
+        '''
+        Description: Stores a column in its compact dtype, float32 for indicators, the smallest
+        integer type for integer columns and categoricals for repeated strings
+
+        Args:
+            name (str): column name in class variable 'df'
+
+        Returns:
+            None
+        '''
+        values = self.df[name]
+        if name in CATEGORICAL_COLUMNS:
+            if not isinstance(values.dtype, pd.CategoricalDtype):
+                self.df[name] = values.astype('category')
+        elif name in PRICE_COLUMNS or values.dtype == bool:
+            return
+        elif values.dtype == np.float64:
+            self.df[name] = values.astype(np.float32)
+        elif pd.api.types.is_integer_dtype(values.dtype):
+            self.df[name] = pd.to_numeric(values, downcast='integer')
+
+    def compact_memory(self) -> dict:
+        '''
+        Description: Compacts every column of the metrics DataFrame (see compact_column) and
+        reports the memory used before and after, nothing is printed so workers stay quiet
+
+        Args:
+            None
+
+        Returns:
+            dict with 'before' and 'after' in bytes, also kept in class variable 'memory_report'
+        '''
+        before = int(self.df.memory_usage(deep=True).sum())
+        for name in self.df.columns:
+            self.compact_column(name)
+        after = int(self.df.memory_usage(deep=True).sum())
+        self.memory_report = {'before': before, 'after': after}
+        return self.memory_report
+
+    def reset_trade_columns(self) -> None:
+        '''
+        Description: Resets the trade result columns before a simulation
+
+        Args:
+            None
+
+        Returns:
+            adds/overwrites columns 'sellPrice', 'sellDate', 'buyDate', 'profit', 'long_exit_signal',
+            'short_exit_signal' and 'exit_reason' in class variable 'df'
+        '''
+        self.df['sellPrice'] = np.nan
+        if self.memory_mode == 'low':
+            self.df['sellDate'] = pd.Series(
+                pd.NaT, index=self.df.index, dtype='datetime64[ns]')
+            self.df['buyDate'] = pd.Series(
+                pd.NaT, index=self.df.index, dtype='datetime64[ns]')
+        else:
+            self.df['sellDate'] = None
+            self.df['buyDate'] = None
+        self.df['profit'] = np.nan
+        self.df['long_exit_signal'] = False
+        self.df['short_exit_signal'] = False
+        if self.memory_mode == 'low':
+            self.df['exit_reason'] = pd.Categorical(
+                [''] * len(self.df), categories=EXIT_REASONS)
+        else:
+            self.df['exit_reason'] = ''
+
+    def get_streaming_metrics(self) -> StreamingMetrics:
+        '''
+        Description: Seeds streaming indicator state from the full history so live bars
+        can be added one at a time with StreamingMetrics.update(high, low, close)
+
+        Args:
+            None
+
+        Returns:
+            StreamingMetrics whose values match the batch set_* columns of the last bar
+        '''
+        streaming_metrics = StreamingMetrics()
+        streaming_metrics.seed(self.df)
+        return streaming_metrics
+
+    def cached_indicator(self, indicator: str, params: tuple, compute) -> tuple:
+        '''
+        Description: Returns indicator arrays from the cache if one was given, otherwise
+        computes them. The OHLC prices are fingerprinted once per instance, and again after
+        reset_intermediates() in full so edits between the sampled blocks are seen too.
+
+        Args:
+            indicator (str): indicator name
+            params (tuple): indicator parameters
+            compute (callable): no argument function returning a tuple of arrays
+
+        Returns:
+            tuple of np.ndarray
+        '''
+        if self.cache is None:
+            return compute()
+        if self.fingerprint is None:
+            self.fingerprint = IndicatorCache.fingerprint(
+                *[self.df[price].to_numpy(dtype=np.float64) for price in ['openPrice', 'highPrice', 'lowPrice', 'closePrice']],
+                sample_blocks=None if self.prices_modified else 16)
+        return self.cache.get_or_compute(self.fingerprint, indicator, params, compute)
+
+    def intermediate(self, name: str, params: tuple, compute) -> pd.Series:
+        '''
+        Description: Returns a shared building block (true range, rolling close mean/std,
+        rolling high/low) computing it at most once per parameter set for this frame.
+        Intermediates can depend on other intermediates, forming a small dependency graph.
+        Only the INTERMEDIATE_LIMITS[memory_mode] most recently used ones are kept.
+
+        Args:
+            name (str): intermediate name, e.g. 'close_mean'
+            params (tuple): parameters, e.g. (length,)
+            compute (callable): no argument function returning a pd.Series
+
+        Returns:
+            pd.Series of the intermediate
+        '''
+        key = (name, tuple(params))
+        stats = self.intermediate_stats.setdefault(
+            key, {'computed': 0, 'reused': 0})
+        if key in self.intermediates:
+            stats['reused'] += 1
+            self.intermediates.move_to_end(key)
+            return self.intermediates[key]
+        value = compute()
+        stats['computed'] += 1
+        self.intermediates[key] = value
+        while len(self.intermediates) > INTERMEDIATE_LIMITS[self.memory_mode]:
+            self.intermediates.popitem(last=False)
+        return value
+
+    def get_intermediate_stats(self) -> pd.DataFrame:
+        '''
+        Description: Reports how often each intermediate was computed and reused, for profiling
+
+        Args:
+            None
+
+        Returns:
+            pd.DataFrame with columns 'intermediate', 'params', 'computed', 'reused'
+        '''
+        return pd.DataFrame([{'intermediate': name, 'params': params, **stats}
+                             for (name, params), stats in self.intermediate_stats.items()],
+                            columns=['intermediate', 'params', 'computed', 'reused'])
+
+    def reset_intermediates(self) -> None:
+        '''
+        Description: Forgets all intermediates and the price fingerprint used for the indicator
+        cache, needed if the price columns of 'df' are modified
+
+        Args:
+            None
+
+        Returns:
+            None
+        '''
+        self.intermediates = OrderedDict()
+        self.fingerprint = None
+        self.prices_modified = True
+
+    def true_range(self) -> pd.Series:
+        def compute():
+            prev_close = self.df['closePrice'].shift(1)
+            return pd.Series(np.maximum.reduce([self.df['highPrice'] - self.df['lowPrice'], (
+                self.df['highPrice'] - prev_close).abs(), (self.df['lowPrice'] - prev_close).abs()]), index=self.df.index)
+        return self.intermediate('true_range', (), compute)
+
+    def average_true_range(self, length: int) -> pd.Series:
+        return self.intermediate('true_range_mean', (length,), lambda: self.true_range().rolling(window=length).mean())
+
+    def close_mean(self, length: int) -> pd.Series:
+        return self.intermediate('close_mean', (length,), lambda: self.df['closePrice'].rolling(window=length).mean())
+
+    def close_std(self, length: int) -> pd.Series:
+        return self.intermediate('close_std', (length,), lambda: self.df['closePrice'].rolling(window=length).std())
+
+    def high_max(self, length: int) -> pd.Series:
+        return self.intermediate('high_max', (length,), lambda: self.df['highPrice'].rolling(window=length).max())
+
+    def low_min(self, length: int) -> pd.Series:
+        return self.intermediate('low_min', (length,), lambda: self.df['lowPrice'].rolling(window=length).min())
+
+    def first_hit_index(self, column: str, use_max: bool) -> FirstHitIndex:
+        # Not kept as an intermediate, an index is several times the size of its column and
+        # is freed when the simulation that built it returns
+        return FirstHitIndex(self.df[column].to_numpy(dtype=np.float64), use_max=use_max,
+                             max_level=FIRST_HIT_LEVELS[self.memory_mode])
 
     def set_sma(self, length: int) -> None:
         '''
@@ -72,8 +429,8 @@ class RoboticFundMetrics():
         Returns:
             adds column to dataframe 'SMA_{length}' in class variable 'df'
         '''
-        self.df[f'SMA_{length}'] = self.df['closePrice'].rolling(
-            window=length).mean()
+        self.df[f'SMA_{length}'], = self.cached_indicator('sma', (length,), lambda: (
+            self.close_mean(length).to_numpy(),))
 
     def set_ema(self, length: int) -> None:
         '''
@@ -85,8 +442,8 @@ class RoboticFundMetrics():
         Returns:
             adds column to dataframe 'EMA_{length}' in class variable 'df'
         '''
-        self.df[f'EMA_{length}'] = self.df['closePrice'].ewm(
-            span=length).mean()
+        self.df[f'EMA_{length}'], = self.cached_indicator('ema', (length,), lambda: (
+            self.df['closePrice'].ewm(span=length).mean().to_numpy(),))
 
     def set_stochastic(self, length_k: int = 14, length_d: int = 3) -> None:
         '''
@@ -101,7 +458,7 @@ class RoboticFundMetrics():
         '''
         self.df[f'STOCH_K_{length_k}'] = calculate_stochastic_k(
             self.df, close_col='closePrice', window=length_k)
-        self.df[f'STOCH_D_{length_d}'] = self.df['STOCH_K_14'].rolling(
+        self.df[f'STOCH_D_{length_d}'] = self.column('STOCH_K_14').rolling(
             window=length_d).mean()
 
     def set_true_range(self) -> None:
@@ -114,9 +471,7 @@ class RoboticFundMetrics():
         Returns:
             adds column to dataframe 'tr' in class variable 'df'
         '''
-        prev_close = self.df['closePrice'].shift(1)
-        self.df['tr'] = np.maximum.reduce([self.df['highPrice'] - self.df['lowPrice'], (
-            self.df['highPrice'] - prev_close).abs(), (self.df['lowPrice'] - prev_close).abs()])
+        self.df['tr'] = self.true_range()
 
     def set_atr(self, length: int) -> None:
         '''
@@ -128,44 +483,33 @@ class RoboticFundMetrics():
         Returns:
             adds column to dataframe 'atr' in class variable 'df'
         '''
-        self.set_true_range()
-        self.df['atr'] = self.df['tr'].rolling(window=length).mean()
+        def compute():
+            return self.true_range().to_numpy(), self.average_true_range(length).to_numpy()
+        self.df['tr'], self.df['atr'] = self.cached_indicator(
+            'atr', (length,), compute)
 
-    def set_adx(self, period=14) -> None:
+    def set_adx(self, period=14, include_di: bool = False) -> None:
         '''
         Description: Calculates the ADX
 
         Args:
             period (float):
+            include_di (bool): also keep the directional indicators
 
         Returns:
-            adds column to dataframe 'adx' in class variable 'df'
+            adds columns to dataframe 'adx' and 'tr' in class variable 'df'
+            adds columns to dataframe 'DI_plus' and 'DI_minus' in class variable 'df' if include_di
         '''
-        # Step 1: Calculate True Range (TR)
         self.set_true_range()
-
-        # Step 2: Calculate Directional Movement (DM) and Directional Index (DI)
-        self.df['DM_plus'] = self.df['highPrice'] - \
-            self.df['highPrice'].shift(1)
-
-        self.df['DM_minus'] = self.df['lowPrice'].shift(
-            1) - self.df['lowPrice']
-
-        self.df.loc[self.df['DM_plus'] < 0, 'DM_plus'] = 0
-        self.df.loc[self.df['DM_minus'] < 0, 'DM_minus'] = 0
-        self.df['DI_plus'] = 100 * (self.df['DM_plus'].rolling(
-            window=period).mean() / self.df['tr'].rolling(window=period).mean())
-        self.df['DI_minus'] = 100 * (self.df['DM_minus'].rolling(
-            window=period).mean() / self.df['tr'].rolling(window=period).mean())
-
-        # Step 3: Calculate Directional Index Difference (DX) and ADX
-        self.df['DX'] = 100 * (abs(self.df['DI_plus'] - self.df['DI_minus']
-                                   ) / (self.df['DI_plus'] + self.df['DI_minus']))
-
-        self.df['adx'] = self.df['DX'].rolling(window=period).mean()
-
-        self.df.drop(['DM_plus', 'DM_minus', 'DI_plus',
-                      'DI_minus', 'DX'], axis=1, inplace=True)
+        adx, di_plus, di_minus = calculate_adx(self.df['highPrice'].to_numpy(dtype=np.float64),
+                                               self.df['lowPrice'].to_numpy(
+                                                   dtype=np.float64),
+                                               self.df['closePrice'].to_numpy(dtype=np.float64), period,
+                                               tr=self.true_range().to_numpy(dtype=np.float64))
+        self.df['adx'] = adx
+        if include_di:
+            self.df['DI_plus'] = di_plus
+            self.df['DI_minus'] = di_minus
 
     def set_parabolic_sar(self, initial_acceleration=0.02, acceleration_factor=0.02, max_acceleration_factor=0.2) -> None:
         '''
@@ -178,48 +522,11 @@ class RoboticFundMetrics():
 
         Returns:
             adds column to dataframe 'sar' in class variable 'df'
-            adds column to dataframe 'sar_trend' in class variable 'df'
+            adds int8 column to dataframe 'sar_trend' in class variable 'df', SAR_UP (1) or SAR_DOWN (-1)
         '''
-        # Initial values
-        initial_af = initial_acceleration
-        sar = []
-        trend = []
-
-        # Initialize first SAR value
-        if self.df['highPrice'].iloc[1] > self.df['highPrice'].iloc[0]:
-            sar.append(self.df['lowPrice'].iloc[0])
-            trend.append('up')
-        else:
-            sar.append(self.df['highPrice'].iloc[0])
-            trend.append('down')
-
-        # Calculation loop
-        for i in range(1, len(self.df)):
-            if trend[-1] == 'up':
-                if self.df['lowPrice'].iloc[i] < sar[-1]:
-                    trend.append('down')
-                    sar.append(self.df['highPrice'].iloc[i])
-                    acceleration_factor = initial_af
-                else:
-                    trend.append('up')
-                    sar.append(sar[-1] + acceleration_factor *
-                               (self.df['lowPrice'].iloc[i] - sar[-1]))
-                    if self.df['highPrice'].iloc[i] > self.df['highPrice'].iloc[i - 1]:
-                        acceleration_factor = min(
-                            acceleration_factor + initial_af, max_acceleration_factor)
-            else:
-                if self.df['highPrice'].iloc[i] > sar[-1]:
-                    trend.append('up')
-                    sar.append(self.df['lowPrice'].iloc[i])
-                    acceleration_factor = initial_af
-                else:
-                    trend.append('down')
-                    sar.append(sar[-1] - acceleration_factor *
-                               (sar[-1] - self.df['highPrice'].iloc[i]))
-                    if self.df['lowPrice'].iloc[i] < self.df['lowPrice'].iloc[i - 1]:
-                        acceleration_factor = min(
-                            acceleration_factor + initial_af, max_acceleration_factor)
-
+        sar, trend = calculate_parabolic_sar(self.df['highPrice'].to_numpy(dtype=np.float64),
+                                             self.df['lowPrice'].to_numpy(dtype=np.float64),
+                                             initial_acceleration, acceleration_factor, max_acceleration_factor)
         self.df['sar'] = sar
         self.df['sar_trend'] = trend
 
@@ -233,16 +540,26 @@ class RoboticFundMetrics():
         Returns:
             adds column to dataframe 'linear_regression' in class variable 'df'
         '''
-        m_avg = self.df['closePrice'].rolling(window=length).mean()
+        m_avg = self.close_mean(length)
         # calculate bar value
-        highest = self.df['highPrice'].rolling(window=length).max()
-        lowest = self.df['lowPrice'].rolling(window=length).min()
+        highest = self.high_max(length)
+        lowest = self.low_min(length)
         m1 = (highest + lowest)/2
         value = (self.df['closePrice'] - (m1 + m_avg)/2)
-        fit_y = np.array(range(0, length))
-        self.df['linear_regression'] = round(value.rolling(window=length).apply(lambda x:
-                                                                                np.polyfit(fit_y, x, 1)[0] * (length-1) +
-                                                                                np.polyfit(fit_y, x, 1)[1], raw=True)*1000, 2)
+        # Least squares fit of each window against x = 0..length-1 using rolling sums,
+        # evaluated at the last point of the window (x = length-1)
+        x_sum = length * (length - 1) / 2
+        x_squared_sum = (length - 1) * length * (2 * length - 1) / 6
+        y_sum = value.rolling(window=length).sum()
+        # sum(x*y) for each window from a rolling sum against the global bar position
+        position = np.arange(len(value), dtype=np.float64)
+        xy_sum = (value * position).rolling(window=length).sum() - \
+            (position - (length - 1)) * y_sum
+        slope = (length * xy_sum - x_sum * y_sum) / \
+            (length * x_squared_sum - x_sum ** 2)
+        intercept = (y_sum - slope * x_sum) / length
+        self.df['linear_regression'] = round(
+            (slope * (length - 1) + intercept) * 1000, 2)
 
     def set_keltner_channel(self, length: int, mult: int) -> None:
         '''
@@ -256,15 +573,17 @@ class RoboticFundMetrics():
             adds columns to dataframe 'upper_kc' in class variable 'df'
             adds columns to dataframe 'lower_kc' in class variable 'df'
         '''
-        m_avg = self.df['closePrice'].rolling(window=length).mean()
         self.set_atr(length)
-        upper_kc = m_avg + self.df['atr'] * mult
-        lower_kc = m_avg - self.df['atr'] * mult
 
-        self.df['upper_kc'] = upper_kc
-        self.df['lower_kc'] = lower_kc
+        def compute():
+            m_avg = self.close_mean(length)
+            upper_kc = m_avg + self.df['atr'] * mult
+            lower_kc = m_avg - self.df['atr'] * mult
+            return upper_kc.to_numpy(), lower_kc.to_numpy()
+        self.df['upper_kc'], self.df['lower_kc'] = self.cached_indicator(
+            'keltner_channel', (length, mult), compute)
 
-    def set_bollinger_bands(self, length: int, mult: float, length_std: int) -> None:
+    def set_bollinger_bands(self, length: int, mult: float, length_std: int = None) -> None:
         '''
         Description: Calculates the bollinger bands
 
@@ -276,10 +595,12 @@ class RoboticFundMetrics():
             adds columns to dataframe 'upper_bb' in class variable 'df'
             adds columns to dataframe 'lower_bb' in class variable 'df'
         '''
-        m_avg = self.df['closePrice'].rolling(window=length).mean()
-        m_std = self.df['closePrice'].rolling(window=length).std()
-        self.df['upper_bb'] = m_avg + mult * m_std
-        self.df['lower_bb'] = m_avg - mult * m_std
+        def compute():
+            m_avg = self.close_mean(length)
+            m_std = self.close_std(length)
+            return (m_avg + mult * m_std).to_numpy(), (m_avg - mult * m_std).to_numpy()
+        self.df['upper_bb'], self.df['lower_bb'] = self.cached_indicator(
+            'bollinger_bands', (length, mult), compute)
 
     def set_squeeze(self, length_bb, mult_bb, length_kc, mult_kc) -> None:
         '''
@@ -367,10 +688,8 @@ class RoboticFundMetrics():
             adds float column to dataframe 'long_stop' in class variable 'df'
             adds float column to dataframe 'short_stop' in class variable 'df'
         '''
-        self.df['long_stop'] = self.df['lowPrice'].rolling(
-            window=look_back_period).min()
-        self.df['short_stop'] = self.df['highPrice'].rolling(
-            window=look_back_period).max()
+        self.df['long_stop'] = self.low_min(look_back_period)
+        self.df['short_stop'] = self.high_max(look_back_period)
 
     def set_limits(self, limit_pips_long: int, limit_pips_short: int, one_pip: float) -> None:
         '''
@@ -433,34 +752,70 @@ class RoboticFundMetrics():
             raise Exception('long or short direction not provided.')
 
     def calcualte_fibonacci_retracement(self, threshold_large_step: int) -> None:
-        reset_index = None
-        fibonacci_levels = {}
-        fib_count = 0
+        '''
+        Description: Calculates Fibonacci retracement levels from the running high and low
+        since the last large step, in a single pass
+
+        Args:
+            threshold_large_step (int): high-low range in points (x100000) that resets the levels
 
-        for index, row in self.df.iterrows():
-            rolling_high = self.df.loc[reset_index:index, 'highPrice'].max()
-            rolling_low = self.df.loc[reset_index:index, 'lowPrice'].min()
+        Returns:
+            adds float column to dataframe 'Fib_Step' in class variable 'df'
+            adds float columns to dataframe 'Fibonacci Level 0' to 'Fibonacci Level 5' in class variable 'df'
+            adds float column to dataframe 'Fib_Count' in class variable 'df'
+        '''
+        highs = self.df['highPrice'].to_numpy(dtype=np.float64).tolist()
+        lows = self.df['lowPrice'].to_numpy(dtype=np.float64).tolist()
+        n = len(highs)
+        fib_step = np.zeros(n)
+        reset_lows = np.full(n, np.nan)
+        reset_highs = np.full(n, np.nan)
+
+        # Running high/low since (and including) the last reset bar, NaN prices are skipped
+        rolling_high = np.nan
+        rolling_low = np.nan
+        for i in range(n):
+            if not rolling_high >= highs[i]:
+                rolling_high = highs[i] if highs[i] == highs[i] else rolling_high
+            if not rolling_low <= lows[i]:
+                rolling_low = lows[i] if lows[i] == lows[i] else rolling_low
             difference = abs(rolling_high - rolling_low) * 100000
 
             if difference > threshold_large_step:
-                reset_index = index
-                fib_count = 0
-                fibonacci_levels = {}
-                fibonacci_levels[0] = rolling_low
-                fibonacci_levels[1] = rolling_high
-                for i in range(2, 6):
-                    fibonacci_levels[i] = fibonacci_levels[i - 1] - (
-                        fibonacci_levels[i - 1] - fibonacci_levels[i - 2]) / 1.618
-                self.df.at[index, 'Fib_Step'] = 1
-                for level, value in fibonacci_levels.items():
-                    self.df.at[index, f'Fibonacci Level {level}'] = value
-            else:
-                self.df.at[index, 'Fib_Step'] = 0
-                for level, value in fibonacci_levels.items():
-                    self.df.at[index, f'Fibonacci Level {level}'] = value
-
-            self.df.at[index, 'Fib_Count'] = fib_count
-            fib_count += 1
+                fib_step[i] = 1
+                reset_lows[i] = rolling_low
+                reset_highs[i] = rolling_high
+                rolling_high = highs[i]
+                rolling_low = lows[i]
+
+        # Carry the levels of the last reset forward to every later bar
+        positions = np.arange(n)
+        last_reset = np.maximum.accumulate(
+            np.where(fib_step == 1, positions, -1))
+        has_levels = last_reset >= 0
+        fibonacci_levels = {0: reset_lows, 1: reset_highs}
+        for i in range(2, 6):
+            fibonacci_levels[i] = fibonacci_levels[i - 1] - (
+                fibonacci_levels[i - 1] - fibonacci_levels[i - 2]) / 1.618
+        fib_count = np.where(has_levels, positions -
+                             last_reset, positions).astype(np.float64)
+
+        level_columns = {}
+        if has_levels.any():
+            for level, value in fibonacci_levels.items():
+                level_columns[f'Fibonacci Level {level}'] = np.where(
+                    has_levels, value[np.maximum(last_reset, 0)], np.nan)
+
+        # Same column order as the levels being created on the first reset bar
+        self.df['Fib_Step'] = fib_step
+        if n and fib_step[0] == 1:
+            for name, values in level_columns.items():
+                self.df[name] = values
+            self.df['Fib_Count'] = fib_count
+        else:
+            self.df['Fib_Count'] = fib_count
+            for name, values in level_columns.items():
+                self.df[name] = values
 
     def set_stops_from_max(self, max_loss: int) -> None:
         '''
@@ -471,7 +826,7 @@ class RoboticFundMetrics():
         self.df['short_stop'] = abs(
             (max_loss / (5000 / 0.004))+1)*(self.df['closePrice'])
 
-    def simulate_trades_intraday_trailing_stop(self, trailing_step_pips=1) -> pd.DataFrame:
+    def simulate_trades_intraday_trailing_stop(self, trailing_step_pips=1, project: bool = False) -> pd.DataFrame:
         """ Run a back test for a given trading strategy
         The dataframe requires the following fields:
         - snapshotTimeUTC: date
@@ -483,7 +838,9 @@ class RoboticFundMetrics():
         - short_stop: numeric
         - exit_long: boolean
         - exit_short: boolean \n
-        It will return the original dataframe + the following new fields:
+        Every trade is recorded in the ledger 'trades', see record_trades. The stats are
+        computed from the ledger, with project=True (or project_trades_to_frame() later) it is
+        also projected onto the dataframe, which adds the following new fields:
         - buyDate: date
         - sellDate: date
         - sellPrice: numeric
@@ -492,108 +849,37 @@ class RoboticFundMetrics():
         - exit_reason: string
         """
 
+        # First-hit indexes answer "first bar from here where the price crosses x" in O(log n)
+        low_index = self.first_hit_index('lowPrice', use_max=False)
+        high_index = self.first_hit_index('highPrice', use_max=True)
+        close_prices = self.df['closePrice'].to_numpy(dtype=np.float64)
+
         # Simulate trades
-        self.df['sellPrice'] = np.nan
-        self.df['sellDate'] = None
-        self.df['buyDate'] = None
-        self.df['profit'] = np.nan
-        self.df['long_exit_signal'] = False
-        self.df['short_exit_signal'] = False
-        self.df['exit_reason'] = ''
-
-        # Create two filtered arrays of the long & short entries
-        long_entry_metrics = self.df[self.df['entry_long'] == True]
-        short_entry_metrics = self.df[self.df['entry_short'] == True]
-
-        for long_entry in long_entry_metrics.itertuples():
-            self.df.loc[long_entry[0], 'buyDate'] = long_entry.snapshotTimeUTC
-            self.df.loc[long_entry[0], 'buyPrice'] = long_entry.closePrice
-            scan_forward = self.df[long_entry[0]:]
-            # Trailing stop logic
-            new_long_stop = long_entry.long_stop
-            original_long_stop_gap = long_entry.closePrice - long_entry.long_stop
-
-            for long_exit in scan_forward.itertuples():
-                new_long_stop_gap = long_exit.closePrice - new_long_stop
-                if (long_exit.lowPrice < new_long_stop and long_exit.snapshotTimeUTC != long_entry.snapshotTimeUTC):
-                    sell_price = new_long_stop
-                    self.df.loc[long_entry[0], 'sellPrice'] = sell_price
-                    self.df.loc[long_exit[0], 'long_exit_signal'] = True
-                    self.df.loc[long_entry[0], 'exit_reason'] = 'STOP'
-                    self.df.loc[long_entry[0],
-                                'sellDate'] = long_exit.snapshotTimeUTC
-                    break
-                elif (long_exit.highPrice > long_entry.long_profit_take and long_exit.snapshotTimeUTC != long_entry.snapshotTimeUTC):
-                    sell_price = long_entry.long_profit_take
-                    self.df.loc[long_entry[0], 'sellPrice'] = sell_price
-                    self.df.loc[long_exit[0], 'long_exit_signal'] = True
-                    self.df.loc[long_entry[0], 'exit_reason'] = 'LIMIT'
-                    self.df.loc[long_entry[0],
-                                'sellDate'] = long_exit.snapshotTimeUTC
-                    break
-                elif (long_exit.exit_long == True and (long_exit.snapshotTimeUTC != long_entry.snapshotTimeUTC)):
-                    sell_price = long_exit.closePrice
-                    self.df.loc[long_entry[0], 'sellPrice'] = sell_price
-                    self.df.loc[long_exit[0], 'long_exit_signal'] = True
-                    self.df.loc[long_entry[0], 'exit_reason'] = 'RULE'
-                    self.df.loc[long_entry[0],
-                                'sellDate'] = long_exit.snapshotTimeUTC
-                    break
-                elif new_long_stop_gap - original_long_stop_gap > trailing_step_pips:
-                    new_long_stop = long_exit.closePrice - original_long_stop_gap
-
-        # Simulate short exit
-        for short_entry in short_entry_metrics.itertuples():
-            self.df.loc[short_entry[0],
-                        'buyDate'] = short_entry.snapshotTimeUTC
-            self.df.loc[short_entry[0], 'buyPrice'] = short_entry.closePrice
-            scan_forward = self.df[short_entry[0]:]
-            # Trailing stop logic
-            new_short_stop = short_entry.short_stop
-            original_short_stop_gap = short_entry.short_stop - short_entry.closePrice
-
-            for short_exit in scan_forward.itertuples():
-                new_short_stop_gap = new_short_stop - short_exit.closePrice
-
-                if (short_exit.highPrice > new_short_stop and (short_exit.snapshotTimeUTC != short_entry.snapshotTimeUTC)):
-                    sell_price = new_short_stop
-                    self.df.loc[short_entry[0], 'sellPrice'] = sell_price
-                    self.df.loc[short_exit[0], 'short_exit_signal'] = True
-                    self.df.loc[short_entry[0], 'exit_reason'] = 'STOP'
-                    self.df.loc[short_entry[0],
-                                'sellDate'] = short_exit.snapshotTimeUTC
-                    break
-                elif (short_exit.lowPrice < short_entry.short_profit_take and (short_exit.snapshotTimeUTC != short_entry.snapshotTimeUTC)):
-                    sell_price = short_entry.short_profit_take
-                    self.df.loc[short_entry[0], 'sellPrice'] = sell_price
-                    self.df.loc[short_exit[0], 'short_exit_signal'] = True
-                    self.df.loc[short_entry[0], 'exit_reason'] = 'LIMIT'
-                    self.df.loc[short_entry[0],
-                                'sellDate'] = short_exit.snapshotTimeUTC
-                    break
-                elif ((short_exit.exit_short == True) and (short_exit.snapshotTimeUTC != short_entry.snapshotTimeUTC)):
-                    sell_price = short_exit.closePrice
-                    self.df.loc[short_entry[0], 'sellPrice'] = sell_price
-                    self.df.loc[short_exit[0], 'short_exit_signal'] = True
-                    self.df.loc[short_entry[0], 'exit_reason'] = 'RULE'
-                    self.df.loc[short_entry[0],
-                                'sellDate'] = short_exit.snapshotTimeUTC
-                    break
-                elif new_short_stop_gap - original_short_stop_gap > trailing_step_pips:
-                    new_short_stop = short_exit.closePrice + original_short_stop_gap
-                    
-        return self.df
+        entries = []
+        for direction in ['LONG', 'SHORT']:
+            prefix = direction.lower()
+            entry_positions = np.flatnonzero(
+                self.df[f'entry_{prefix}'].to_numpy() == True)
+            stops = self.df[f'{prefix}_stop'].to_numpy(dtype=np.float64)
+            profit_takes = self.df[f'{prefix}_profit_take'].to_numpy(
+                dtype=np.float64)
+            next_rule_exit = next_true(
+                self.df[f'exit_{prefix}'].to_numpy() == True)
+            close_index = self.first_hit_index(
+                'closePrice', use_max=direction == 'LONG')
+            exit_positions, sell_prices, reasons = resolve_trailing_stop_exits(
+                direction, entry_positions, stops[entry_positions], profit_takes[entry_positions],
+                trailing_step_pips, low_index, high_index, close_index, next_rule_exit, close_prices)
+            entries.append((direction, entry_positions,
+                           exit_positions, sell_prices, reasons))
+
+        self.record_trades(entries)
+        if project:
+            self.project_trades_to_frame()
 
-    def set_df_values(self, buyDate, sell_price, reason, sell_date, direction):
-        self.df.loc[buyDate, 'sellPrice'] = sell_price
-        self.df.loc[buyDate, 'exit_reason'] = reason
-        self.df.loc[buyDate, 'sellDate'] = sell_date
-        if direction == 'SHORT':
-            self.df.loc[sell_date, 'short_exit_signal'] = True
-        else:
-            self.df.loc[sell_date, 'long_exit_signal'] = True
+        return self.df
 
-    def simulate_trades_intraday(self) -> None:
+    def simulate_trades_intraday(self, max_hold_bars: int = None, project: bool = False) -> None:
         """ Run a back test for a given trading strategy
         The dataframe requires the following fields:
         - snapshotTimeUTC: date
@@ -605,7 +891,12 @@ class RoboticFundMetrics():
         - short_stop: numeric
         - exit_long: boolean
         - exit_short: boolean \n
-        It will return the original dataframe + the following new fields:
+        Stops and limits are searched to the end of the data, trades that are never hit stay
+        open. max_hold_bars limits the search to that many bars after the entry and stops a
+        trade out on the last of them, max_hold_bars=499 gives the old fixed 500 row window. \n
+        Every trade is recorded in the ledger 'trades', see record_trades. The stats are
+        computed from the ledger, with project=True (or project_trades_to_frame() later) it is
+        also projected onto the dataframe, which adds the following new fields:
         - buyDate: date
         - sellDate: date
         - sellPrice: numeric
@@ -614,123 +905,252 @@ class RoboticFundMetrics():
         - exit_reason: string
         """
 
-        # Convert to numpy array for speed
-        data_2 = self.df[['snapshotTimeUTC', 'entry_long', 'entry_short', 'openPrice',
-                          'lowPrice', 'highPrice', 'closePrice', 'long_stop', 'short_stop', 'long_profit_take', 'short_profit_take', 'exit_long', 'exit_short']]
-        np_array = data_2.to_numpy()
+        # First-hit indexes answer "first bar from here where the price crosses x" in O(log n)
+        low_index = self.first_hit_index('lowPrice', use_max=False)
+        high_index = self.first_hit_index('highPrice', use_max=True)
+        close_prices = self.df['closePrice'].to_numpy(dtype=np.float64)
 
         # Simulate trades
-        self.df['sellPrice'] = np.nan
-        self.df['sellDate'] = None
-        self.df['buyDate'] = None
-        self.df['profit'] = np.nan
-        self.df['long_exit_signal'] = False
-        self.df['short_exit_signal'] = False
-        self.df['exit_reason'] = ''
-
-        for idx, x in enumerate(np_array):
-            if x[1] == True:  # Long entry
-                buyDate = x[0]
-                buyPrice = x[6]
-                long_stop = x[7]
-                long_profit_take = x[9]
-                self.df.loc[buyDate, 'buyDate'] = buyDate
-                self.df.loc[buyDate, 'buyPrice'] = buyPrice
-
-                # Check if stop is triggered
-                time_stamps = np_array[idx+1:idx+500][:, 0]
-                close_prices = np_array[idx+1:idx+500][:, 6]
-                low_prices = np_array[idx+1:idx+500][:, 4]
-                high_prices = np_array[idx+1:idx+500][:, 5]
-                long_exits = np_array[idx+1:idx+500][:, 11]
-                try:
-                    stop_triggered = np.where(low_prices < long_stop)
-                    stop_trigger_idx = stop_triggered[0][0]
-                except:
-                    stop_trigger_idx = len(long_exits) - 1
-                try:
-                    limit_triggered = np.where(high_prices >= long_profit_take)
-                    limit_trigger_idx = limit_triggered[0][0]
-                except:
-                    limit_trigger_idx = len(long_exits) - 1
-                try:
-                    rule_triggered = np.where(long_exits == True)
-                    rule_triggered_idx = rule_triggered[0][0]
-                except:
-                    rule_triggered_idx = len(long_exits) - 1
-
-                # Choose which trigger comes first
-                if stop_trigger_idx <= limit_trigger_idx and stop_trigger_idx <= rule_triggered_idx:
-                    sell_date = time_stamps[stop_trigger_idx]
-                    sell_price = long_stop
-                    reason = 'STOP'
-                    self.set_df_values(buyDate, sell_price,
-                                       reason, sell_date, 'LONG')
-                elif limit_trigger_idx <= rule_triggered_idx:
-                    sell_date = time_stamps[limit_trigger_idx]
-                    sell_price = long_profit_take
-                    reason = 'LIMIT'
-                    self.set_df_values(buyDate, sell_price,
-                                       reason, sell_date, 'LONG')
-                else:
-                    sell_date = time_stamps[rule_triggered_idx]
-                    sell_price = close_prices[rule_triggered_idx]
-                    reason = 'RULE'
-                    self.set_df_values(buyDate, sell_price,
-                                       reason, sell_date, 'LONG')
-
-            if x[2] == True:  # Short entry
-                buyDate = x[0]
-                buyPrice = x[6]
-                short_stop = x[8]
-                short_profit_take = x[10]
-                self.df.loc[buyDate, 'buyDate'] = buyDate
-                self.df.loc[buyDate, 'buyPrice'] = buyPrice
-
-                # Check if stop is triggered
-                time_stamps = np_array[idx+1:idx+500][:, 0]
-                close_prices = np_array[idx+1:idx+500][:, 6]
-                high_prices = np_array[idx+1:idx+500][:, 5]
-                low_prices = np_array[idx+1:idx+500][:, 4]
-                short_exits = np_array[idx+1:idx+500][:, 12]
-
-                try:
-                    stop_triggered = np.where(high_prices >= short_stop)
-                    stop_trigger_idx = stop_triggered[0][0]
-                except:
-                    stop_trigger_idx = len(short_exits) - 1
-                try:
-                    limit_triggered = np.where(low_prices <= short_profit_take)
-                    limit_trigger_idx = limit_triggered[0][0]
-                except:
-                    limit_trigger_idx = len(short_exits) - 1
-                try:
-                    rule_triggered = np.where(short_exits == True)
-                    rule_triggered_idx = rule_triggered[0][0]
-                except:
-                    rule_triggered_idx = len(short_exits) - 1
-
-                # Choose which trigger comes first
-                if stop_trigger_idx <= limit_trigger_idx and stop_trigger_idx <= rule_triggered_idx:
-                    sell_date = time_stamps[stop_trigger_idx]
-                    sell_price = short_stop
-                    reason = 'STOP'
-                    self.set_df_values(buyDate, sell_price,
-                                       reason, sell_date, 'SHORT')
-                elif limit_trigger_idx <= rule_triggered_idx:
-                    sell_date = time_stamps[limit_trigger_idx]
-                    sell_price = short_profit_take
-                    reason = 'LIMIT'
-                    self.set_df_values(buyDate, sell_price,
-                                       reason, sell_date, 'SHORT')
-                else:
-                    sell_date = time_stamps[rule_triggered_idx]
-                    sell_price = close_prices[rule_triggered_idx]
-                    reason = 'RULE'
-                    self.set_df_values(buyDate, sell_price,
-                                       reason, sell_date, 'SHORT')
-                        
-                    
+        entries = []
+        for direction in ['LONG', 'SHORT']:
+            prefix = direction.lower()
+            entry_positions = np.flatnonzero(
+                self.df[f'entry_{prefix}'].to_numpy() == True)
+            stops = self.df[f'{prefix}_stop'].to_numpy(dtype=np.float64)
+            profit_takes = self.df[f'{prefix}_profit_take'].to_numpy(
+                dtype=np.float64)
+            next_rule_exit = next_true(
+                self.df[f'exit_{prefix}'].to_numpy() == True)
+            exit_positions, sell_prices, reasons = resolve_intraday_exits(
+                direction, entry_positions + 1, stops[entry_positions], profit_takes[entry_positions],
+                low_index, high_index, next_rule_exit, close_prices, max_hold_bars=max_hold_bars)
+            entries.append((direction, entry_positions,
+                           exit_positions, sell_prices, reasons))
+
+        self.record_trades(entries)
+        if project:
+            self.project_trades_to_frame()
+
+    def simulate_trades_intraday_drill_down(self, source: FineBarSource, max_hold_bars: int = None, project: bool = False) -> dict:
+        '''
+        Description: simulate_trades_intraday, then every stop exit on a bar whose range also
+        reached the profit take is replayed on the finer bars of source to find which level
+        was really hit first, see drillDown.resolve_ambiguous_exits. Only the finer bars of
+        those bars are loaded
+
+        Args:
+            source (FineBarSource): finer resolution bars, e.g.
+                FineBarSource('AUDUSD', 'MINUTE_1') or FineBarSource(..., cache=bars, use_db=False)
+            max_hold_bars (int): see simulate_trades_intraday
+            project (bool): see simulate_trades_intraday
+
+        Returns:
+            dict with the drill-down counts, also stored in class variable 'drill_down_report'
+        '''
+        self.simulate_trades_intraday(
+            max_hold_bars=max_hold_bars, project=False)
+        is_long = (self.trades['side'] == 'LONG').to_numpy()
+        entries = self.trades['entry_idx'].to_numpy()
+        stops = np.where(is_long, self.df['long_stop'].to_numpy(dtype=np.float64)[entries],
+                         self.df['short_stop'].to_numpy(dtype=np.float64)[entries])
+        profit_takes = np.where(is_long, self.df['long_profit_take'].to_numpy(dtype=np.float64)[entries],
+                                self.df['short_profit_take'].to_numpy(dtype=np.float64)[entries])
+        self.trades, self.drill_down_report = resolve_ambiguous_exits(
+            self.trades, self.timestamps().to_numpy(), self.get_bar_length(),
+            self.df['highPrice'].to_numpy(dtype=np.float64), self.df['lowPrice'].to_numpy(dtype=np.float64),
+            stops, profit_takes, source)
+        report = self.drill_down_report
+        print(f"Drill-down of {report['ambiguous_bars']} ambiguous bars ({report['ambiguous_trades']} trades, "
+              f"{report['fine_bars']} finer bars): {report['limit_first']} limit first, {report['stop_first']} stop first, "
+              f"{report['unresolved']} unresolved, {report['missing']} without finer bars")
+        if project:
+            self.project_trades_to_frame()
+        return report
+
+    def get_bar_length(self) -> pd.Timedelta:
+        '''
+        Description: Length of a bar from the 'resolution' (or 'RESOLUTION') column, or the
+        smallest gap between bars if there is neither
+
+        Args:
+            None
+
+        Returns:
+            pd.Timedelta
+        '''
+        for column in ['resolution', 'RESOLUTION']:
+            if column in self.df.columns:
+                return pd.Timedelta(minutes=resolution_minutes(self.df[column].iloc[0]))
+        return pd.Series(self.timestamps().to_numpy()).diff().min()
+
+    def record_trades(self, entries: list) -> pd.DataFrame:
+        '''
+        Description: Stores simulated trades in the compact ledger 'trades', one row per trade
+        in entry order, so memory scales with the number of trades rather than bars
+
+        Args:
+            entries (list): (direction, entry_positions, exit_positions, sell_prices, reasons)
+                per direction as produced by the simulators
+
+        Returns:
+            sets class variable 'trades' to a pd.DataFrame with columns 'entry_idx', 'exit_idx'
+            (-1 if the trade never closed), 'side', 'entry_price', 'exit_price', 'reason' and
+            'pnl' (NaN until set_trade_pnl is called)
+        '''
+        close_prices = self.df['closePrice'].to_numpy(dtype=np.float64)
+        ledgers = [pd.DataFrame({
+            'entry_idx': np.asarray(entry_positions, dtype=np.int64),
+            'exit_idx': np.asarray(exit_positions, dtype=np.int64),
+            'side': direction,
+            'entry_price': close_prices[entry_positions],
+            'exit_price': np.asarray(sell_prices, dtype=np.float64),
+            'reason': np.asarray(reasons, dtype=object),
+            'pnl': np.nan,
+        }, columns=TRADE_COLUMNS) for direction, entry_positions, exit_positions, sell_prices, reasons in entries]
+        # Stable sort keeps longs ahead of shorts entered on the same bar
+        self.trades = pd.concat(ledgers, ignore_index=True).sort_values(
+            'entry_idx', kind='stable', ignore_index=True)
+        self.trades_projected = False
+        return self.trades
+
+    def project_trades_to_frame(self) -> None:
+        '''
+        Description: Writes the ledger 'trades' onto the per-bar trade columns. Longs are
+        written first so a short entered on the same bar wins the shared cells
+
+        Args:
+            None
+
+        Returns:
+            adds/overwrites columns 'buyDate', 'buyPrice', 'sellPrice', 'sellDate', 'exit_reason',
+            'profit', 'long_exit_signal' and 'short_exit_signal' in class variable 'df'
+        '''
+        self.reset_trade_columns()
+        for direction in ['LONG', 'SHORT']:
+            side = self.trades[self.trades['side'] == direction]
+            self.write_trade_results(direction, side['entry_idx'].to_numpy(), side['exit_idx'].to_numpy(),
+                                     side['exit_price'].to_numpy(), side['reason'].to_numpy())
+        self.trades_projected = True
+
+    def get_stats_metrics(self) -> 'RoboticFundMetrics':
+        '''
+        Description: Metrics over just the bars the stats depend on, with the ledger 'trades'
+        projected onto them. The entry and exit bars, the last bar, and the first bar and the
+        first bar without an entry of every month keep the yearly and monthly tables, the
+        positions carried into a period and the drawdown lows identical, so the frame is a
+        few rows per trade however long the history is
+
+        Args:
+            None
+
+        Returns:
+            RoboticFundMetrics with the trade and stats columns of add_more_stats
+        '''
+        n = len(self.df)
+        times = pd.DatetimeIndex(self.timestamps().to_numpy())
+        months = np.asarray(times.year * 12 + times.month)
+        idle = np.flatnonzero(~((self.df['entry_long'] == True) |
+                                (self.df['entry_short'] == True)).to_numpy())
+        entries = self.trades['entry_idx'].to_numpy()
+        exits = self.trades['exit_idx'].to_numpy()
+        rows = np.unique(np.concatenate([
+            entries, exits[exits >= 0], [n - 1], np.unique(months, return_index=True)[1],
+            idle[np.unique(months[idle], return_index=True)[1]]]).astype(np.int64))
+
+        # The rows are compacted already if 'df' is, only the memory mode is carried over
+        stats_metrics = RoboticFundMetrics(
+            self.df.iloc[rows].reset_index(drop=True), lazy=True)
+        stats_metrics.memory_mode = self.memory_mode
+        trades = self.trades.copy()
+        trades['entry_idx'] = np.searchsorted(rows, entries)
+        trades['exit_idx'] = np.where(exits < 0, -1, np.searchsorted(rows, exits))
+        stats_metrics.trades = trades
+        stats_metrics.project_trades_to_frame()
+        return stats_metrics
+
+    def require_trade_columns(self) -> None:
+        '''
+        Description: Projects a ledger that compute_stats() left off 'df' and adds the columns
+        of add_more_stats and get_account_balance_needed, for the per-bar breakdowns. Needs
+        'notional_value' (see set_notional_value)
+
+        Args:
+            None
+
+        Returns:
+            None
+        '''
+        if self.trades is not None and not self.trades_projected:
+            self.add_more_stats()
+            self.get_account_balance_needed()
+
+    def set_trade_pnl(self) -> None:
+        '''
+        Description: Calculates the profit of every closed trade in the ledger, same formula
+        as add_more_stats, needs 'notional_value' (see set_notional_value)
+
+        Args:
+            None
+
+        Returns:
+            sets column 'pnl' of class variable 'trades'
+        '''
+        entry_price = self.trades['entry_price']
+        exit_price = self.trades['exit_price']
+        self.trades['pnl'] = np.where(self.trades['side'] == 'LONG',
+                                      (exit_price - entry_price) * self.notional_value * (1/exit_price),
+                                      (entry_price - exit_price) * self.notional_value * (1/exit_price))
+
+    def write_trade_results(self, direction: str, entry_positions, exit_positions, sell_prices, reasons) -> None:
+        '''
+        Description: Writes simulated trades back onto the metrics DataFrame in bulk
+
+        Args:
+            direction (str): 'LONG' or 'SHORT'
+            entry_positions (np.ndarray): row positions of the entries
+            exit_positions (np.ndarray): row positions of the exits, -1 if the trade never closed
+            sell_prices (np.ndarray): exit prices, NaN if the trade never closed
+            reasons (np.ndarray): 'STOP', 'LIMIT', 'RULE' or '' if the trade never closed
+
+        Returns:
+            sets columns 'buyDate', 'buyPrice', 'sellPrice', 'sellDate' and 'exit_reason' on the
+            entry rows and 'long_exit_signal' or 'short_exit_signal' on the exit rows
+        '''
+        time_stamps = self.df['snapshotTimeUTC'].to_numpy()
+        closed = exit_positions >= 0
+        closed_entries = entry_positions[closed]
+        closed_exits = exit_positions[closed]
+
+        buy_dates = self.df['buyDate'].to_numpy().copy()
+        buy_dates[entry_positions] = time_stamps[entry_positions]
+        self.df['buyDate'] = buy_dates
+        if 'buyPrice' not in self.df.columns:
+            self.df['buyPrice'] = np.nan
+        buy_prices = self.df['buyPrice'].to_numpy(dtype=np.float64).copy()
+        buy_prices[entry_positions] = self.df['closePrice'].to_numpy(dtype=np.float64)[
+            entry_positions]
+        self.df['buyPrice'] = buy_prices
+
+        sell_price_column = self.df['sellPrice'].to_numpy(
+            dtype=np.float64).copy()
+        sell_price_column[closed_entries] = sell_prices[closed]
+        self.df['sellPrice'] = sell_price_column
+        sell_dates = self.df['sellDate'].to_numpy().copy()
+        sell_dates[closed_entries] = time_stamps[closed_exits]
+        self.df['sellDate'] = sell_dates
+        exit_reasons = self.df['exit_reason'].to_numpy(dtype=object).copy()
+        exit_reasons[closed_entries] = reasons[closed]
+        if self.memory_mode == 'low':
+            self.df['exit_reason'] = pd.Categorical(
+                exit_reasons, categories=EXIT_REASONS)
+        else:
+            self.df['exit_reason'] = exit_reasons
+
+        signal = 'short_exit_signal' if direction == 'SHORT' else 'long_exit_signal'
+        exit_signals = self.df[signal].to_numpy(dtype=bool).copy()
+        exit_signals[closed_exits] = True
+        self.df[signal] = exit_signals
+
     def add_more_stats(self) -> None:
         '''
         Description: Calculates simulation stats
@@ -747,6 +1167,11 @@ class RoboticFundMetrics():
             adds float column to dataframe 'profit_streak' in class variable 'df'
             adds float column to dataframe 'drawdown' in class variable 'df'
         '''
+        # Trades simulated with project=False are projected now
+        if self.trades is not None:
+            if not self.trades_projected:
+                self.project_trades_to_frame()
+            self.set_trade_pnl()
 
         # Calculate profit
         self.df['long_profit'] = np.where(self.df['entry_long'] == True, ((
@@ -758,48 +1183,85 @@ class RoboticFundMetrics():
         self.df['profit'] = self.df['long_profit'] + self.df['short_profit']
         self.df['profit'] = self.df['profit'].replace(0, np.nan)
 
-        # Calculate num positions opened
-        long_counter = 0
-        short_counter = 0
-        profit_streak = 0
-        drawdown = 0
-        stop_violation_counter = 0
-        limit_violation_counter = 0
-        self.df['long_counter'] = 0
-        self.df['short_counter'] = 0
-        self.df['profit_streak'] = 0
-        self.df['drawdown'] = 0
-        self.df['stop_violation'] = 0
-        self.df['limit_violation'] = 0
-        for row in self.df.itertuples():
-            if (row.profit > 0):
-                profit_streak = profit_streak + row.profit
-                self.df.loc[row[0], 'profit_streak'] = profit_streak
-                drawdown = 0
-            elif (row.profit < 0):
-                drawdown = drawdown + row.profit
-                self.df.loc[row[0], 'drawdown'] = drawdown
-                profit_streak = 0
-
-            if row.entry_long == True:
-                long_counter = long_counter + 1
-                self.df.loc[row[0], 'long_counter'] = long_counter
-            if row.entry_short == True:
-                short_counter = short_counter + 1
-                self.df.loc[row[0], 'short_counter'] = short_counter
-            if row.short_exit_signal == True:
-                short_counter = 0
-            if row.long_exit_signal == True:
-                long_counter = 0
-
-            if (row.entry_long == True and row.long_stop > row.closePrice) or (row.entry_short == True and row.short_stop < row.closePrice):
-                stop_violation_counter = stop_violation_counter+1
-                self.df.loc[row[0], 'stop_violation'] = stop_violation_counter
-
-            if (row.entry_long == True and row.long_profit_take < row.closePrice) or (row.entry_short and row.short_profit_take > row.closePrice):
-                limit_violation_counter = limit_violation_counter+1
-                self.df.loc[row[0],
-                            'limit_violation'] = limit_violation_counter
+        # Streaks restart on a trade with the opposite sign
+        profit = self.df['profit'].to_numpy(dtype=np.float64)
+        gains = profit > 0
+        losses = profit < 0
+        self.df['profit_streak'] = running_total(profit, gains, losses)
+        self.df['drawdown'] = running_total(profit, losses, gains)
+        # Columns nothing was written to stay integer zeros
+        if not gains.any():
+            self.df['profit_streak'] = self.df['profit_streak'].astype(np.int64)
+        if not losses.any():
+            self.df['drawdown'] = self.df['drawdown'].astype(np.int64)
+
+        # Calculate num positions opened, counters reset after the bar with an exit signal
+        entry_long = (self.df['entry_long'] == True).to_numpy()
+        entry_short = (self.df['entry_short'] == True).to_numpy()
+        for counter, entries, exits in [('long_counter', entry_long, self.df['long_exit_signal'] == True),
+                                        ('short_counter', entry_short, self.df['short_exit_signal'] == True)]:
+            exits = exits.to_numpy().astype(np.int64)
+            count = pd.Series(entries.astype(np.int64)).groupby(
+                np.cumsum(exits) - exits).cumsum().to_numpy()
+            self.df[counter] = np.where(entries, count, 0)
+
+        close = self.df['closePrice']
+        stop_violations = ((entry_long & (self.df['long_stop'] > close).to_numpy()) |
+                           (entry_short & (self.df['short_stop'] < close).to_numpy()))
+        self.df['stop_violation'] = np.where(
+            stop_violations, np.cumsum(stop_violations), 0)
+        limit_violations = ((entry_long & (self.df['long_profit_take'] < close).to_numpy()) |
+                            (self.df['entry_short'].astype(bool).to_numpy() & (self.df['short_profit_take'] > close).to_numpy()))
+        self.df['limit_violation'] = np.where(
+            limit_violations, np.cumsum(limit_violations), 0)
+
+        self.set_open_positions()
+
+    def set_open_positions(self) -> None:
+        '''
+        Description: Counts the positions open at the close of every bar with a sweep over
+        the entry/exit interval of each trade, from the ledger 'trades' if there is one,
+        otherwise from 'buyDate'/'sellDate'. A trade is open from its entry bar up
+        to but not including its exit bar, trades that never closed stay open to the end.
+
+        Args:
+            None
+
+        Returns:
+            adds int column to dataframe 'open_long_positions' in class variable 'df'
+            adds int column to dataframe 'open_short_positions' in class variable 'df'
+            adds int column to dataframe 'open_positions' in class variable 'df'
+            adds int column to dataframe 'net_position' in class variable 'df'
+        '''
+        n = len(self.df)
+        if self.trades is None:
+            time_stamps = pd.to_datetime(self.df['snapshotTimeUTC']).to_numpy()
+            sell_dates = pd.to_datetime(self.df['sellDate']).to_numpy()
+            traded = self.df['buyDate'].notna().to_numpy()
+
+        for direction in ['long', 'short']:
+            if self.trades is not None:
+                # The ledger keeps the exit of every trade, even with long and short entries on one bar
+                side = self.trades[self.trades['side'] == direction.upper()]
+                entry_positions = side['entry_idx'].to_numpy()
+                exit_positions = side['exit_idx'].to_numpy()
+                exit_positions = np.where(exit_positions < 0, n, exit_positions)
+            else:
+                entry_positions = np.flatnonzero(
+                    (self.df[f'entry_{direction}'] == True).to_numpy() & traded)
+                exit_dates = sell_dates[entry_positions]
+                exit_positions = np.where(pd.isna(exit_dates), n, np.searchsorted(
+                    time_stamps, exit_dates, side='left'))
+            # +1 where a trade opens, -1 where it closes, the running sum is the open count
+            changes = np.zeros(n + 1, dtype=np.int64)
+            np.add.at(changes, entry_positions, 1)
+            np.add.at(changes, exit_positions, -1)
+            self.df[f'open_{direction}_positions'] = np.cumsum(changes[:n])
+
+        self.df['open_positions'] = self.df['open_long_positions'] + \
+            self.df['open_short_positions']
+        self.df['net_position'] = self.df['open_long_positions'] - \
+            self.df['open_short_positions']
 
     def set_notional_value(self, position_size: float = 1):
         if (self.df['instrument'].iloc[0] == 'AUDUSD'):
@@ -810,87 +1272,236 @@ class RoboticFundMetrics():
         else:
             self.notional_value = 10000*position_size
 
-    def print_stats(self, position_size: float = 1, margin_per_trade: float = 0.04):
+    def compute_stats(self, position_size: float = 1, margin_per_trade: float = 0.04) -> BacktestStats:
         '''
-        Description: Print simulation back test results to screen
+        Description: Calculates the back test summary and scores without printing anything
 
         Args:
-            notional_value (float): notional value of each trade
+            position_size (float): position size of each trade
             margin_per_trade (float): margin % of each trade
 
         Returns:
-            adds float column to dataframe 'hours_held' in class variable 'df'
+            BacktestStats with the totals, hold times, risk, returns, yearly breakdown and scores.
+            Also sets the score attributes (win_rate, final_score, ...). A ledger 'trades' that
+            was not projected is priced ('pnl') and the stats come from get_stats_metrics(),
+            leaving 'df' alone. Otherwise adds columns 'hours_held', 'account_balance_need',
+            'number_of_trades' and 'number_of_profitable_trades' in class variable 'df'
         '''
         self.set_notional_value(position_size)
+        if self.trades is not None and not self.trades_projected:
+            stats_metrics = self.get_stats_metrics()
+            stats = stats_metrics.compute_stats(position_size, margin_per_trade)
+            for name in SCORE_ATTRIBUTES:
+                setattr(self, name, getattr(stats_metrics, name))
+            self.set_trade_pnl()
+            return stats
+        self.require('year')
         self.add_more_stats()
 
-        # Print trade level data
-        print(self.df[['openPrice', 'lowPrice', 'highPrice', 'closePrice', 'entry_long', 'long_stop', 'long_profit_take', 'entry_short', 'short_stop',
-                       'short_profit_take', 'sellDate', 'sellPrice', 'profit', 'drawdown', 'exit_long','exit_short','exit_reason', 'long_counter', 'short_counter']].to_string())
-
-        # Output summary stats
+        # Trades
+        profit = self.df['profit']
+        traded = profit.abs() > 0
+        number_of_trades = int(traded.sum())
+        win_rate = round((int((profit > 0).sum()) / number_of_trades)
+                         * 100, 1) if number_of_trades else np.nan
+        # observed=True as exit_reason is categorical in 'low' memory mode, both modes then
+        # list the reasons that occur in the same order
+        exit_reason_counts = self.df.groupby(
+            self.df.exit_reason, observed=True)['profit'].count()
+        exit_reason_counts.index = exit_reason_counts.index.astype(object)
+        exit_reason_counts = exit_reason_counts.reindex(
+            [reason for reason in sorted(EXIT_REASONS) if reason in exit_reason_counts.index])
+
+        # Hold times
         self.df['buyDate'] = pd.to_datetime(self.df['buyDate'])
         self.df['sellDate'] = pd.to_datetime(self.df['sellDate'])
         self.df['hours_held'] = (self.df['sellDate'] -
                                  self.df['buyDate']) / pd.Timedelta(hours=1)
+        hours_held = self.df['hours_held']
+
+        # Yearly breakdown, Trading capital is the same for every year
+        account_balance_needed = self.get_account_balance_needed()
+        self.df['number_of_trades'] = np.where(traded, 1, 0)
+        self.df['number_of_profitable_trades'] = np.where(profit > 0, 1, 0)
+        yearly = self.get_period_breakdown(['year'], account_balance_needed)
+
+        # Scoring model
+        self.position_size = position_size
+        self.win_rate = win_rate
+        self.max_drawdown = self.df['drawdown'].min()
+        self.max_profit_streak = self.df['profit_streak'].max()
+        self.average_gain_weighted_to_1 = profit.mean()/position_size
+        self.set_monthly_win_rate()
+        self.win_rate_score = scoring.win_rate_score(self.win_rate)
+        self.drawdown_score = scoring.drawdown_score(
+            self.get_profit_drawdown_ratio())
+        self.average_gain_score = scoring.average_gain_score(
+            self.average_gain_weighted_to_1)
+        self.win_rate_per_month_score = scoring.monthly_win_rate_score(
+            self.win_rate_per_month)
+        self.final_score = scoring.final_score(
+            self.win_rate_score, self.drawdown_score, self.average_gain_score, self.win_rate_per_month_score)
+
+        annualised_return, risk_free_return, std_profit, sharpe_ratio = self.get_sharpe_ratio()
+
+        return BacktestStats(
+            instrument=self.df['instrument'].iloc[0],
+            notional_value=self.notional_value,
+            position_size=position_size,
+            number_of_trades=number_of_trades,
+            total_profit=profit.sum(),
+            average_profit=profit.mean(),
+            win_rate=win_rate,
+            long_profit=profit[self.df['entry_long'] == True].sum(),
+            short_profit=profit[self.df['entry_short'] == True].sum(),
+            biggest_loss=profit.min(),
+            biggest_loss_date=self.df.at[profit.idxmin(),
+                                         'snapshotTimeUTC'] if number_of_trades else None,
+            biggest_profit=profit.max(),
+            biggest_profit_date=self.df.at[profit.idxmax(),
+                                           'snapshotTimeUTC'] if number_of_trades else None,
+            exit_reason_counts=exit_reason_counts,
+            mean_hold_hours=hours_held.mean(),
+            max_hold_hours=hours_held.max(),
+            max_hold_date=self.df.at[hours_held.idxmax(),
+                                     'snapshotTimeUTC'] if hours_held.notna().any() else None,
+            max_long_positions=self.df['open_long_positions'].max(),
+            max_short_positions=self.df['open_short_positions'].max(),
+            max_drawdown=self.max_drawdown,
+            max_profit_streak=self.max_profit_streak,
+            account_balance_needed=account_balance_needed,
+            stop_violations=self.df['stop_violation'].sum(),
+            limit_violations=self.df['limit_violation'].sum(),
+            annualised_return=annualised_return,
+            risk_free_return=risk_free_return,
+            std_profit=std_profit,
+            sharpe_ratio=sharpe_ratio,
+            yearly=yearly,
+            average_gain_weighted_to_1=self.average_gain_weighted_to_1,
+            profit_drawdown_ratio=self.get_profit_drawdown_ratio(),
+            win_rate_per_month=self.win_rate_per_month,
+            win_rate_score=self.win_rate_score,
+            drawdown_score=self.drawdown_score,
+            average_gain_score=self.average_gain_score,
+            win_rate_per_month_score=self.win_rate_per_month_score,
+            final_score=self.final_score,
+        )
+
+    def print_stats(self, position_size: float = 1, margin_per_trade: float = 0.04, show_trades: bool = False) -> BacktestStats:
+        '''
+        Description: Print simulation back test results to screen
+
+        Args:
+            position_size (float): position size of each trade
+            margin_per_trade (float): margin % of each trade
+            show_trades (bool): also print the trade level columns of every bar
+
+        Returns:
+            BacktestStats from compute_stats()
+        '''
+        if show_trades and self.trades is not None and not self.trades_projected:
+            self.project_trades_to_frame()
+        stats = self.compute_stats(position_size, margin_per_trade)
+
+        # Print trade level data
+        if show_trades:
+            print(self.df[['openPrice', 'lowPrice', 'highPrice', 'closePrice', 'entry_long', 'long_stop', 'long_profit_take', 'entry_short', 'short_stop',
+                           'short_profit_take', 'sellDate', 'sellPrice', 'profit', 'drawdown', 'exit_long', 'exit_short', 'exit_reason', 'long_counter', 'short_counter']].to_string())
+
+        # Output summary stats
         print(
-            f"Notional value per trade ${self.notional_value}. I.e. without leverage.")
+            f"Notional value per trade ${stats.notional_value}. I.e. without leverage.")
         print(f"At 0.4% margin, the margin requirement is $5,000 per trade.")
-        print(f"Instrument is {self.df['instrument'].iloc[0]}")
+        print(f"Instrument is {stats.instrument}")
         print(f"----------------------------------------------------------------------------------------------------------------------")
+        print(f"Total profit is ${round(stats.total_profit, 1)}")
+        print(f"Average profit per trade ${round(stats.average_profit, 1)}")
+        print(f"Total number of trades {stats.number_of_trades}")
+        print(f"Mean hold time is {round(stats.mean_hold_hours, 0)} hours")
         print(
-            f"Total profit is ${round(self.df['profit'].sum(), 1)}")
-        print(
-            f"Average profit per trade ${round(self.df['profit'].mean(), 1)}")
-        print(
-            f"Total number of trades {self.df[abs(self.df.profit) > 0].shape[0]}")
-        print(
-            f"Mean hold time is {round(self.df['hours_held'].mean(), 0)} hours")
-        print(
-            f"Max hold time is {round(self.df['hours_held'].max(), 0)} hours on {self.df.loc[self.df['hours_held'].idxmax()]['snapshotTimeUTC']}")
-        win_rate = round((self.df[self.df.profit > 0].shape[0] /
-                          self.df[abs(self.df.profit) > 0].shape[0]) * 100, 1)
-        print(f"Win rate is {win_rate}%")
+            f"Max hold time is {round(stats.max_hold_hours, 0)} hours on {stats.max_hold_date}")
+        print(f"Win rate is {stats.win_rate}%")
         print(f"\n----------------------------------------------------------------------------------------------------------------------")
-        print(f"Max number of long positions {self.df['long_counter'].max()}")
-        print(
-            f"Max number of short positions {self.df['short_counter'].max()}")
+        print(f"Max number of long positions {stats.max_long_positions}")
+        print(f"Max number of short positions {stats.max_short_positions}")
         print(
-            f"Biggest single loss ${round(self.df['profit'].min(),0)} on {self.df.loc[self.df['profit'].idxmin()]['snapshotTimeUTC']}")
+            f"Biggest single loss ${round(stats.biggest_loss,0)} on {stats.biggest_loss_date}")
         print(
-            f"Biggest single profit ${round(self.df['profit'].max(),0)} on {self.df.loc[self.df['profit'].idxmax()]['snapshotTimeUTC']}")
-        print(f"Max drawdown ${round(self.df['drawdown'].min(),0)}")
-        print(
-            f"Largest profit streak ${round(self.df['profit_streak'].max(),0)}")
+            f"Biggest single profit ${round(stats.biggest_profit,0)} on {stats.biggest_profit_date}")
+        print(f"Max drawdown ${round(stats.max_drawdown,0)}")
+        print(f"Largest profit streak ${round(stats.max_profit_streak,0)}")
         # Add breakdown by Long or short
+        print(f"Long profit ${round(stats.long_profit,1)}")
+        print(f"Short profit ${round(stats.short_profit,1)}")
+        print(f"{round(stats.exit_reason_counts,1)}")
         print(
-            f"Long profit ${round(self.df[self.df['entry_long']==True]['profit'].sum(),1)}")
-        print(
-            f"Short profit ${round(self.df[self.df['entry_short']==True]['profit'].sum(),1)}")
-        print(
-            f"{round(self.df.groupby(self.df.exit_reason)['profit'].count(),1)}")
-        account_balance_needed = self.get_account_balance_needed()
-        print(
-            f"Minimum account balance required ${account_balance_needed}")
+            f"Minimum account balance required ${stats.account_balance_needed}")
         print(f"\n----------------------------------------------------------------------------------------------------------------------")
-        self.df['number_of_trades'] = np.where(
-            (self.df['profit'].abs() > 0), 1, 0)
-        self.df['number_of_profitable_trades'] = np.where(
-            (self.df['profit'] > 0), 1, 0)
-        print(self.df.groupby(self.df['year']).apply(lambda s: pd.Series({
-            "Trades": s["number_of_trades"].sum(),
-            "Win rate (%)": round(s["number_of_profitable_trades"].sum()/s["number_of_trades"].sum() * 100, 1),
-            "Max drawdown (%)": round(s["drawdown"].min()/account_balance_needed * 100 * -1, 1),
-            "Max number of short held trades (#)": s['short_counter'].max(),
-            "Max number of long held trades (#)": s['long_counter'].max(),
-            "Return on capital (%)": round(s["profit"].sum()/account_balance_needed * 100, 1),
-            "Trading capital ($)": round(account_balance_needed, 0),
-            "Profit ($)": round(s["profit"].sum(), 0),
-        })))
-        self.set_model_score(position_size)
-        self.print_violations()
-        self.print_sharpe_ratio()
+        yearly = stats.yearly.copy()
+        for column, digits in YEARLY_ROUNDING.items():
+            yearly[column] = yearly[column].map(
+                lambda value: round(np.float64(value), digits))
+        print(yearly)
+
+        print("\n--- Starting scoring model ---")
+        self.print_scores(stats)
+        print("--- End scoring model ---")
+        self.print_violation_counts(stats)
+        self.print_sharpe_stats(stats)
         print("\n")
+        return stats
+
+    def get_period_breakdown(self, keys: list = None, account_balance_needed: float = None) -> pd.DataFrame:
+        '''
+        Description: Trades, win rate, drawdown, positions, profit and return on capital per
+        period in one grouped aggregation. Needs the columns added by add_more_stats
+
+        Args:
+            keys (list): period columns to group by, any combination of e.g. 'year', 'month',
+                'dayOfWeek' and 'hour', defaults to ['year']
+            account_balance_needed (float): capital the returns and drawdowns are relative to,
+                defaults to column 'account_balance_need' if set (see get_account_balance_needed)
+
+        Returns:
+            pd.DataFrame indexed by the keys with the columns of the print_stats yearly table
+        '''
+        if keys is None:
+            keys = ['year']
+        self.require_trade_columns()
+        self.require(*keys)
+        if account_balance_needed is None:
+            account_balance_needed = self.df['account_balance_need'].max(
+            ) if 'account_balance_need' in self.df.columns else np.nan
+        profit = self.df['profit']
+        periods = pd.DataFrame({
+            'trades': (profit.abs() > 0).to_numpy(dtype=np.int64),
+            'wins': (profit > 0).to_numpy(dtype=np.int64),
+            'drawdown': self.df['drawdown'].to_numpy(),
+            'open_short_positions': self.df['open_short_positions'].to_numpy(),
+            'open_long_positions': self.df['open_long_positions'].to_numpy(),
+            'profit': profit.to_numpy(),
+            **{key: self.df[key].to_numpy() for key in keys},
+        })
+        totals = periods.groupby(keys).agg(
+            trades=('trades', 'sum'),
+            wins=('wins', 'sum'),
+            drawdown=('drawdown', 'min'),
+            max_short=('open_short_positions', 'max'),
+            max_long=('open_long_positions', 'max'),
+            profit=('profit', 'sum'),
+        )
+        with np.errstate(divide='ignore', invalid='ignore'):
+            breakdown = pd.DataFrame({
+                "Trades": totals['trades'],
+                "Win rate (%)": totals['wins'] / totals['trades'] * 100,
+                "Max drawdown (%)": totals['drawdown'] / account_balance_needed * 100 * -1,
+                "Max number of short held trades (#)": totals['max_short'],
+                "Max number of long held trades (#)": totals['max_long'],
+                "Return on capital (%)": totals['profit'] / account_balance_needed * 100,
+                "Trading capital ($)": account_balance_needed,
+                "Profit ($)": totals['profit'],
+            })
+        return breakdown.astype(np.float64)
 
     def get_max_holds(self) -> int:
         '''
@@ -900,15 +1511,14 @@ class RoboticFundMetrics():
             None
 
         Returns:
-            max_holds (int): maximum number of positions held at any one time
+            max_holds (int): maximum number of long and short positions open at the same time
         '''
-        if self.df['short_counter'].max() > self.df['long_counter'].max():
-            max_holds = self.df['short_counter'].max()
-        else:
-            max_holds = self.df['long_counter'].max()
-        return max_holds
+        if 'open_positions' not in self.df.columns:
+            self.set_open_positions()
+        return int(self.df['open_positions'].max())
 
     def get_account_balance_needed(self, position_size: float = 125, average_margin=0.005):
+        self.require_trade_columns()
         max_holds = self.get_max_holds()
         account_balance_needed_max_holds = max_holds*position_size/average_margin
         account_balance_need_through_drawdown = abs(
@@ -920,15 +1530,28 @@ class RoboticFundMetrics():
         self.df['account_balance_need'] = account_balance_need
         return account_balance_need
 
-    def print_violations(self):
+    def print_violation_counts(self, stats: BacktestStats):
         print("\n--- Starting violations ---")
-        print(f"Stop price violation count {self.df['stop_violation'].sum()}")
-        print(
-            f"Limit price violation count {self.df['limit_violation'].sum()}")
+        print(f"Stop price violation count {stats.stop_violations}")
+        print(f"Limit price violation count {stats.limit_violations}")
         print("--- End scoring model ---")
 
-    def print_sharpe_ratio(self):
-        print("\n--- Starting Sharpe Ratio ---")
+    def print_violations(self, position_size: float = 1):
+        self.print_violation_counts(self.compute_stats(position_size))
+
+    def get_sharpe_ratio(self) -> tuple:
+        '''
+        Description: Annualised return and Sharpe ratio of the yearly returns on the account
+        balance needed, needs column 'account_balance_need' (see get_account_balance_needed)
+
+        Args:
+            None
+
+        Returns:
+            tuple of annualised_return, risk_free_return, std_profit and sharpe_ratio
+        '''
+        self.require_trade_columns()
+        self.require('year')
         avg_return = self.df['profit'].groupby(
             self.df['year']).sum()/self.df['account_balance_need'].max()
         total_avg_return = self.df['profit'].sum(
@@ -938,114 +1561,84 @@ class RoboticFundMetrics():
         risk_free_return = 0.03
         std_profit = avg_return.std()
         sharpe_ratio = (annualised_return - risk_free_return) / std_profit
+        return annualised_return, risk_free_return, std_profit, sharpe_ratio
+
+    def print_sharpe_values(self, annualised_return, risk_free_return, std_profit, sharpe_ratio):
         print(f"Annualised return {round(annualised_return*100,2)}%")
         print(f"Risk free return {round(risk_free_return*100,2)}%")
         print(f"Standard deviation of profit {round(std_profit*100,2)}%")
         print(f"Sharpe ratio {round(sharpe_ratio,2)}")
+
+    def print_sharpe_stats(self, stats: BacktestStats):
+        print("\n--- Starting Sharpe Ratio ---")
+        self.print_sharpe_values(
+            stats.annualised_return, stats.risk_free_return, stats.std_profit, stats.sharpe_ratio)
         print("--- End Sharpe Ratio ---")
 
+    def print_sharpe_ratio(self, position_size: float = 1):
+        self.print_sharpe_stats(self.compute_stats(position_size))
+
+    def print_scores(self, stats: BacktestStats):
+        print(
+            f"{stats.win_rate_score}: Win rate score for value {stats.win_rate}%")
+        print(
+            f"{stats.drawdown_score}: Profit/drawdown ratio score for value {round(stats.profit_drawdown_ratio,1)}")
+        print(
+            f"{stats.average_gain_score}: Average gain score for value ${round(stats.average_gain_weighted_to_1,0)}")
+        print(
+            f"{stats.win_rate_per_month_score}: Monthly win rate score value {stats.win_rate_per_month}%")
+        print(f"{stats.final_score}: Final model score")
+
     def set_model_score(self, position_size):
+        # Scores from compute_stats, which also sets the score attributes
         print("\n--- Starting scoring model ---")
-        self.position_size = position_size
-        self.win_rate = round((self.df[self.df.profit > 0].shape[0] /
-                               self.df[abs(self.df.profit) > 0].shape[0]) * 100, 1)
-        self.max_drawdown = self.df['drawdown'].min()
-        self.max_profit_streak = self.df['profit_streak'].max()
-        self.average_gain_weighted_to_1 = self.df['profit'].mean(
-        )/position_size
-        self.set_win_rate_score()
-        self.set_drawdown_score()
-        self.set_average_gain_score()
-        self.set_monthly_profit_score()
-
-        # Calculate final score
-        self.calc_final_score()
+        self.print_scores(self.compute_stats(position_size))
         print("--- End scoring model ---")
 
+    def set_monthly_win_rate(self) -> None:
+        # Profit per calendar month, months without trades have no profit and don't count either way
+        self.require_trade_columns()
+        profit = pd.DataFrame(
+            {'tmp_date': self.timestamps().to_numpy(), 'profit': self.df['profit'].to_numpy()})
+        self.profit_per_month = profit.groupby(
+            pd.Grouper(key='tmp_date', freq='ME')).sum()
+        monthly_profit = self.profit_per_month['profit']
+        months_traded = monthly_profit[abs(monthly_profit) > 0].shape[0]
+        self.win_rate_per_month = round((monthly_profit[monthly_profit > 0].shape[0] /
+                                         months_traded) * 100, 1) if months_traded else np.nan
+
     def set_monthly_profit_score(self) -> None:
-        # Profit per month
-        self.profit_per_month = self.df[['tmp_date', 'profit']].groupby(pd.Grouper(key='tmp_date', axis=0,
-                                                                                          freq='ME')).sum()
-        self.win_rate_per_month = round((self.profit_per_month[self.profit_per_month.profit > 0].shape[0] /
-                                         self.profit_per_month[abs(self.profit_per_month.profit) > 0].shape[0]) * 100, 1)
-
-        if self.win_rate_per_month > 90:
-            self.win_rate_per_month_score = 5
-        elif self.win_rate_per_month > 80:
-            self.win_rate_per_month_score = 4
-        elif self.win_rate_per_month > 70:
-            self.win_rate_per_month_score = 3
-        elif self.win_rate_per_month > 60:
-            self.win_rate_per_month_score = 2
-        elif self.win_rate_per_month > 50:
-            self.win_rate_per_month_score = 1
-        else:
-            self.win_rate_per_month_score = -1
+        self.set_monthly_win_rate()
+        self.win_rate_per_month_score = scoring.monthly_win_rate_score(
+            self.win_rate_per_month)
         print(
             f"{self.win_rate_per_month_score}: Monthly win rate score value {self.win_rate_per_month}%")
 
     def set_average_gain_score(self) -> None:
         # Average profit size weighted heaviest
-        if self.average_gain_weighted_to_1 > 10:
-            self.average_gain_score = 10
-        elif self.average_gain_weighted_to_1 > 9:
-            self.average_gain_score = 9
-        elif self.average_gain_weighted_to_1 > 8:
-            self.average_gain_score = 8
-        elif self.average_gain_weighted_to_1 > 7:
-            self.average_gain_score = 7
-        elif self.average_gain_weighted_to_1 > 6:
-            self.average_gain_score = 6
-        elif self.average_gain_weighted_to_1 > 5:
-            self.average_gain_score = 5
-        elif self.average_gain_weighted_to_1 > 4:
-            self.average_gain_score = 4
-        elif self.average_gain_weighted_to_1 > 3:
-            self.average_gain_score = 3
-        elif self.average_gain_weighted_to_1 > 2:
-            self.average_gain_score = 2
-        elif self.average_gain_weighted_to_1 > 1:
-            self.average_gain_score = 1
-        else:
-            self.average_gain_score = -1
+        self.average_gain_score = scoring.average_gain_score(
+            self.average_gain_weighted_to_1)
         print(
             f"{self.average_gain_score}: Average gain score for value ${round(self.average_gain_weighted_to_1,0)}")
 
     def set_win_rate_score(self) -> None:
         # Win rate
-        if self.win_rate > 90:
-            self.win_rate_score = 5
-        elif self.win_rate > 80:
-            self.win_rate_score = 4
-        elif self.win_rate > 70:
-            self.win_rate_score = 3
-        elif self.win_rate > 60:
-            self.win_rate_score = 2
-        elif self.win_rate > 50:
-            self.win_rate_score = 1
-        else:
-            self.win_rate_score = -1
+        self.win_rate_score = scoring.win_rate_score(self.win_rate)
         print(
             f"{self.win_rate_score}: Win rate score for value {self.win_rate}%")
 
-    def set_drawdown_score(self) -> None:
+    def get_profit_drawdown_ratio(self) -> float:
         # Largest profit streak divided by max drawdown
-        profit_drawdown_ratio = abs(
-            self.max_profit_streak)/abs(self.max_drawdown)
-        if profit_drawdown_ratio >= 3:
-            self.drawdown_score = 3
-        elif profit_drawdown_ratio >= 2:
-            self.drawdown_score = 2
-        elif profit_drawdown_ratio >= 1.5:
-            self.drawdown_score = 1.5
-        elif profit_drawdown_ratio >= 1:
-            self.drawdown_score = 1
-        else:
-            self.drawdown_score = -1
+        return abs(self.max_profit_streak)/abs(self.max_drawdown)
+
+    def set_drawdown_score(self) -> None:
+        profit_drawdown_ratio = self.get_profit_drawdown_ratio()
+        self.drawdown_score = scoring.drawdown_score(profit_drawdown_ratio)
         print(
             f"{self.drawdown_score}: Profit/drawdown ratio score for value {round(profit_drawdown_ratio,1)}")
 
     def calc_final_score(self) -> None:
-        self.final_score = self.win_rate_score + \
-            self.drawdown_score + self.average_gain_score + self.win_rate_per_month_score
+        self.final_score = scoring.final_score(
+            self.win_rate_score, self.drawdown_score, self.average_gain_score, self.win_rate_per_month_score)
         print(f"{self.final_score}: Final model score")
+
@@ -0,0 +1,173 @@
+import numpy as np
+import pandas as pd
+from .utils.trade_simulation import running_total
+
+# Scoring model of a back test. Each table lists (threshold, score) pairs from the best
+# score down, the first threshold the value beats gives the score and anything else
+# (including NaN) scores -1.
+
+WIN_RATE_SCORES = [(90, 5), (80, 4), (70, 3), (60, 2), (50, 1)]
+MONTHLY_WIN_RATE_SCORES = [(90, 5), (80, 4), (70, 3), (60, 2), (50, 1)]
+AVERAGE_GAIN_SCORES = [(10, 10), (9, 9), (8, 8), (7, 7), (6, 6),
+                       (5, 5), (4, 4), (3, 3), (2, 2), (1, 1)]
+# The profit/drawdown ratio only needs to reach the threshold
+DRAWDOWN_SCORES = [(3, 3), (2, 2), (1.5, 1.5), (1, 1)]
+NO_SCORE = -1
+
+
+def score_from_table(value: float, table: list, inclusive: bool = False):
+    """
+    Looks up the score of a value in a threshold table.
+    value: the metric to score
+    table: (threshold, score) pairs ordered from the highest threshold down
+    inclusive: True if the value only needs to equal the threshold, otherwise it must exceed it
+    """
+    for threshold, score in table:
+        if value >= threshold if inclusive else value > threshold:
+            return score
+    return NO_SCORE
+
+
+def win_rate_score(win_rate: float) -> int:
+    """
+    Scores the percentage of winning trades.
+    win_rate: win rate in %
+    """
+    return score_from_table(win_rate, WIN_RATE_SCORES)
+
+
+def monthly_win_rate_score(win_rate_per_month: float) -> int:
+    """
+    Scores the percentage of profitable months.
+    win_rate_per_month: monthly win rate in %
+    """
+    return score_from_table(win_rate_per_month, MONTHLY_WIN_RATE_SCORES)
+
+
+def average_gain_score(average_gain_weighted_to_1: float) -> int:
+    """
+    Scores the average profit per trade for a position size of 1.
+    average_gain_weighted_to_1: average profit per trade divided by the position size
+    """
+    return score_from_table(average_gain_weighted_to_1, AVERAGE_GAIN_SCORES)
+
+
+def drawdown_score(profit_drawdown_ratio: float) -> float:
+    """
+    Scores the largest profit streak divided by the max drawdown.
+    profit_drawdown_ratio: abs(max profit streak) / abs(max drawdown)
+    """
+    return score_from_table(profit_drawdown_ratio, DRAWDOWN_SCORES, inclusive=True)
+
+
+def final_score(win_rate_score: int, drawdown_score: float, average_gain_score: int, monthly_win_rate_score: int) -> float:
+    """
+    Adds up the individual scores into the final model score.
+    """
+    return win_rate_score + drawdown_score + average_gain_score + monthly_win_rate_score
+
+
+def score_column(values, table: list, inclusive: bool = False):
+    """
+    Vectorised score_from_table, bins every value with one searchsorted.
+    values: array of metric values, NaN scores NO_SCORE
+    table: (threshold, score) pairs ordered from the highest threshold down
+    inclusive: True if the value only needs to equal the threshold, otherwise it must exceed it
+    Returns np.ndarray of scores.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    thresholds = np.array([threshold for threshold, _ in table[::-1]])
+    # Index 0 is 'no threshold beaten', then the scores from the lowest threshold up
+    scores = np.array([NO_SCORE] + [score for _, score in table[::-1]])
+    beaten = np.searchsorted(
+        thresholds, values, side='right' if inclusive else 'left')
+    beaten[np.isnan(values)] = 0
+    return scores[beaten]
+
+
+def score_results(results: pd.DataFrame) -> pd.DataFrame:
+    """
+    Scores many back tests at once, e.g. the table returned by gridRunner.run_grid.
+    results: DataFrame with columns 'win_rate', 'profit_drawdown_ratio',
+        'average_gain_weighted_to_1' and 'win_rate_per_month'
+    Returns a copy with the columns 'win_rate_score', 'drawdown_score', 'average_gain_score',
+    'win_rate_per_month_score' and 'final_score' (re)calculated.
+    """
+    scored = results.copy()
+    scored['win_rate_score'] = score_column(
+        scored['win_rate'], WIN_RATE_SCORES)
+    scored['drawdown_score'] = score_column(
+        scored['profit_drawdown_ratio'], DRAWDOWN_SCORES, inclusive=True)
+    scored['average_gain_score'] = score_column(
+        scored['average_gain_weighted_to_1'], AVERAGE_GAIN_SCORES)
+    scored['win_rate_per_month_score'] = score_column(
+        scored['win_rate_per_month'], MONTHLY_WIN_RATE_SCORES)
+    scored['final_score'] = final_score(scored['win_rate_score'], scored['drawdown_score'],
+                                        scored['average_gain_score'], scored['win_rate_per_month_score'])
+    return scored
+
+
+def top_k(results: pd.DataFrame, k: int = 10, by: str = 'final_score') -> pd.DataFrame:
+    """
+    Selects the k best back tests without sorting the whole table.
+    results: scored DataFrame, see score_results
+    k: number of rows to return
+    by: column to rank on, highest first, ties keep their original order
+    """
+    return results.nlargest(k, by, keep='first')
+
+
+def trade_score_inputs(pnl, months, position_size: float = 1) -> dict:
+    """
+    Scoring model inputs from a list of trades instead of the per-bar frame, so any slice
+    of a trade ledger can be scored.
+    pnl: profit of each closed trade in entry order
+    months: period key of each trade's entry month, e.g. year * 12 + month
+    position_size: position size the average gain is weighted to
+    Returns dict with 'number_of_trades', 'total_profit', 'win_rate',
+    'average_gain_weighted_to_1', 'profit_drawdown_ratio' and 'win_rate_per_month'.
+    """
+    pnl = np.asarray(pnl, dtype=np.float64)
+    months = np.asarray(months)
+    traded = np.abs(pnl) > 0
+    pnl = pnl[traded]
+    months = months[traded]
+    number_of_trades = len(pnl)
+
+    # Streaks of winning/losing trades as in add_more_stats
+    gains = pnl > 0
+    losses = pnl < 0
+    max_profit_streak = running_total(pnl, gains, losses).max(initial=0)
+    max_drawdown = running_total(pnl, losses, gains).min(initial=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        profit_drawdown_ratio = np.float64(
+            abs(max_profit_streak)) / abs(max_drawdown)
+
+    monthly_profit = pd.Series(pnl).groupby(months).sum()
+    months_traded = int((monthly_profit.abs() > 0).sum())
+    return {
+        'number_of_trades': number_of_trades,
+        'total_profit': pnl.sum(),
+        'win_rate': round(gains.sum() / number_of_trades * 100, 1) if number_of_trades else np.nan,
+        'average_gain_weighted_to_1': pnl.mean() / position_size if number_of_trades else np.nan,
+        'profit_drawdown_ratio': profit_drawdown_ratio,
+        'win_rate_per_month': round((monthly_profit > 0).sum() / months_traded * 100, 1) if months_traded else np.nan,
+    }
+
+
+def score_trades(pnl, months, position_size: float = 1) -> dict:
+    """
+    Scores a list of trades, see trade_score_inputs.
+    Returns the trade_score_inputs dict plus 'win_rate_score', 'drawdown_score',
+    'average_gain_score', 'win_rate_per_month_score' and 'final_score'.
+    """
+    scores = trade_score_inputs(pnl, months, position_size)
+    scores['win_rate_score'] = win_rate_score(scores['win_rate'])
+    scores['drawdown_score'] = drawdown_score(scores['profit_drawdown_ratio'])
+    scores['average_gain_score'] = average_gain_score(
+        scores['average_gain_weighted_to_1'])
+    scores['win_rate_per_month_score'] = monthly_win_rate_score(
+        scores['win_rate_per_month'])
+    scores['final_score'] = final_score(scores['win_rate_score'], scores['drawdown_score'],
+                                        scores['average_gain_score'], scores['win_rate_per_month_score'])
+    return scores
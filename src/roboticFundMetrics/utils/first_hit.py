@@ -0,0 +1,123 @@
+import numpy as np
+
+
+class FirstHitIndex:
+    '''
+    Sparse table of range minima (or maxima) over a price array that answers "first bar at or
+    after start where the price crosses the threshold" in O(log n), vectorised over many
+    queries at once. Level k holds the min/max of the 2**k bars starting at each position;
+    levels stop at max_level, which keeps memory at (max_level + 1) arrays the size of the
+    input. Longer distances are searched in a second sparse table over the aligned blocks of
+    2**max_level bars, which is 2**max_level times smaller, so a query costs
+    O(max_level + log(n / 2**max_level)) whatever the level cap.
+
+    With use_max=False a hit is price < threshold (strict) or price <= threshold,
+    with use_max=True a hit is price > threshold (strict) or price >= threshold.
+    NaN prices and NaN thresholds never hit.
+    '''
+
+    def __init__(self, values, use_max: bool, max_level: int = 12):
+        values = np.asarray(values, dtype=np.float64)
+        self.n = len(values)
+        self.use_max = use_max
+        reduce = np.maximum if use_max else np.minimum
+        # Level 0 is the prices themselves unless NaN has to be replaced
+        nan = np.isnan(values)
+        level = np.where(nan, -np.inf if use_max else np.inf, values) if nan.any() else values
+        self.levels = [level]
+        k = 1
+        while k <= max_level and 2 ** k <= self.n:
+            half = 2 ** (k - 1)
+            level = reduce(level[:-half], level[half:])
+            self.levels.append(level)
+            k += 1
+        # Block level b holds the min/max of the aligned blocks starting at block b
+        block_size = 2 ** (len(self.levels) - 1)
+        level = self.levels[-1][::block_size]
+        self.n_blocks = len(level)
+        self.blocks = [level]
+        k = 1
+        while 2 ** k <= self.n_blocks:
+            half = 2 ** (k - 1)
+            level = reduce(level[:-half], level[half:])
+            self.blocks.append(level)
+            k += 1
+
+    def _no_hit(self, extreme, threshold, strict: bool):
+        # True where the block whose min/max is 'extreme' certainly contains no hit
+        if self.use_max:
+            return extreme <= threshold if strict else extreme < threshold
+        return extreme >= threshold if strict else extreme > threshold
+
+    def _hit(self, value, threshold, strict: bool):
+        if self.use_max:
+            return value > threshold if strict else value >= threshold
+        return value < threshold if strict else value <= threshold
+
+    def first_hit(self, start, threshold, strict: bool = True):
+        '''
+        Description: Finds the first hit at or after each start position
+
+        Args:
+            start (np.ndarray): int array of start positions
+            threshold (np.ndarray): float array of thresholds, one per start
+            strict (bool): strict or inclusive comparison with the threshold
+
+        Returns:
+            np.ndarray of int64 positions, n where the threshold is never crossed
+        '''
+        position = np.array(start, dtype=np.int64, copy=True)
+        threshold = np.asarray(threshold, dtype=np.float64)
+        if self.n == 0 or len(position) == 0:
+            return np.full(len(position), self.n, dtype=np.int64)
+        top = len(self.levels) - 1
+
+        # Without a hit in the top level block ahead the hit is past the next block boundary
+        size = 2 ** top
+        candidates = np.flatnonzero(position + size <= self.n)
+        active = candidates[self._no_hit(
+            self.levels[top][position[candidates]], threshold[candidates], strict)]
+        # From there binary search whole aligned blocks, leaving the block that holds the hit
+        block = position[active] // size + 1
+        block_threshold = threshold[active]
+        for k in range(len(self.blocks) - 1, -1, -1):
+            span = 2 ** k
+            candidates = np.flatnonzero(block + span <= self.n_blocks)
+            table = self.blocks[k]
+            jump = candidates[self._no_hit(
+                table[block[candidates]], block_threshold[candidates], strict)]
+            block[jump] += span
+        position[active] = block * size
+
+        # Then binary search down through the smaller levels
+        for k in range(top - 1, -1, -1):
+            size = 2 ** k
+            candidates = np.flatnonzero(position + size <= self.n)
+            table = self.levels[k]
+            jump = candidates[self._no_hit(
+                table[position[candidates]], threshold[candidates], strict)]
+            position[jump] += size
+
+        # position is now the first hit, or the end if the block left holds no hit
+        inside = position < self.n
+        missed = np.ones(len(position), dtype=bool)
+        missed[inside] = ~self._hit(
+            self.levels[0][position[inside]], threshold[inside], strict)
+        position[missed] = self.n
+        return position
+
+
+def next_true(mask):
+    '''
+    Description: For every bar the position of the first True at or after it
+
+    Args:
+        mask (np.ndarray): boolean array
+
+    Returns:
+        np.ndarray of int64 positions, len(mask) where there is no later True
+    '''
+    mask = np.asarray(mask, dtype=bool)
+    n = len(mask)
+    positions = np.where(mask, np.arange(n), n)
+    return np.minimum.accumulate(positions[::-1])[::-1].astype(np.int64)
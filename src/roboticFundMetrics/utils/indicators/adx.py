@@ -0,0 +1,53 @@
+import numpy as np
+from .rolling import rolling_mean
+
+
+def calculate_adx(high, low, close, period=14, tr=None):
+    """
+    Calculates the Average Directional Index (ADX) and the directional indicators on raw price arrays.
+    high: float64 array of high prices, oldest first
+    low: float64 array of low prices, oldest first
+    close: float64 array of close prices, oldest first
+    period: the length of the rolling means (default 14)
+    tr: optional precomputed true range array, it is not modified
+    Returns float64 arrays adx, di_plus and di_minus.
+    """
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    close = np.asarray(close, dtype=np.float64)
+    n = len(close)
+
+    # True Range (TR), NaN on the first bar as there is no previous close
+    if tr is None:
+        prev_close = np.empty(n)
+        prev_close[:1] = np.nan
+        prev_close[1:] = close[:-1]
+        tr = high - low
+        np.maximum(tr, np.abs(high - prev_close), out=tr)
+        np.maximum(tr, np.abs(low - prev_close), out=tr)
+        tr_mean = rolling_mean(tr, period, out=tr)
+    else:
+        tr_mean = rolling_mean(tr, period)
+
+    # Directional Movement (DM), negative moves are floored at zero
+    dm = np.empty(n)
+    dm[:1] = np.nan
+    np.subtract(high[1:], high[:-1], out=dm[1:])
+    np.maximum(dm, 0, out=dm)
+    di_plus = rolling_mean(dm, period)
+    np.subtract(low[:-1], low[1:], out=dm[1:])
+    np.maximum(dm, 0, out=dm)
+    di_minus = rolling_mean(dm, period)
+
+    # Directional Index (DI), Directional Index Difference (DX) and ADX
+    with np.errstate(divide='ignore', invalid='ignore'):
+        np.divide(di_plus, tr_mean, out=di_plus)
+        di_plus *= 100
+        np.divide(di_minus, tr_mean, out=di_minus)
+        di_minus *= 100
+        dx = np.abs(di_plus - di_minus)
+        np.divide(dx, di_plus + di_minus, out=dx)
+        dx *= 100
+    adx = rolling_mean(dx, period, out=dx)
+
+    return adx, di_plus, di_minus
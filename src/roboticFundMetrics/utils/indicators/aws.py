@@ -1,3 +1,8 @@
+import numpy as np
+import pandas as pd
+from .rolling import rolling_mean
+
+
 def calculate_awesome_oscillator(df, high='highPrice', low='lowPrice', window1=4, window2=64):
         """
         Calculates the Awesome Oscillator for a given DataFrame of high and low prices.
@@ -7,14 +12,30 @@ def calculate_awesome_oscillator(df, high='highPrice', low='lowPrice', window1=4
         window1: the length of the first moving average (default 5)
         window2: the length of the second moving average (default 34)
         """
+        return pd.Series(calculate_awesome_oscillator_array(df[high].to_numpy(dtype=np.float64),
+                                                            df[low].to_numpy(dtype=np.float64),
+                                                            window1=window1, window2=window2), index=df.index)
+
+
+def calculate_awesome_oscillator_array(high, low, window1=4, window2=64, out=None):
+        """
+        Calculates the Awesome Oscillator for arrays of high and low prices.
+        high: float64 array of high prices, oldest first
+        low: float64 array of low prices, oldest first
+        window1: the length of the first moving average (default 4)
+        window2: the length of the second moving average (default 64)
+        out: optional preallocated float64 array of the same length for the result
+        """
         # Calculate the midpoint price
-        mid = (df[high] + df[low]) / 2
+        mid = np.add(high, low, dtype=np.float64)
+        mid /= 2
 
         # Calculate the moving averages
-        sma1 = mid.rolling(window=window1).mean()
-        sma2 = mid.rolling(window=window2).mean()
+        sma1 = rolling_mean(mid, window1, out=out)
+        sma2 = rolling_mean(mid, window2, out=mid)
 
         # Calculate the Awesome Oscillator
-        awesome_oscillator = sma1 - sma2
+        awesome_oscillator = np.subtract(sma1, sma2, out=sma1)
+        awesome_oscillator *= 10000
 
-        return round(awesome_oscillator*10000, 2)
\ No newline at end of file
+        return np.round(awesome_oscillator, 2, out=awesome_oscillator)
@@ -0,0 +1,63 @@
+import numpy as np
+
+# Trend values stored in the int8 'sar_trend' column
+SAR_UP = 1
+SAR_DOWN = -1
+
+
+def calculate_parabolic_sar(high, low, initial_acceleration=0.02, acceleration_factor=0.02, max_acceleration_factor=0.2):
+    """
+    Calculates the Parabolic Stop and Reverse (SAR) on raw price arrays.
+    high: float64 array of high prices, oldest first
+    low: float64 array of low prices, oldest first
+    initial_acceleration: the acceleration factor after a reversal and its step size (default 0.02)
+    acceleration_factor: the starting acceleration factor (default 0.02)
+    max_acceleration_factor: the cap on the acceleration factor (default 0.2)
+    Returns a float64 array of SAR values and an int8 array of SAR_UP/SAR_DOWN trends.
+    """
+    n = len(high)
+    sar = np.full(n, np.nan)
+    trend = np.zeros(n, dtype=np.int8)
+    if n < 2:
+        return sar, trend
+
+    # Plain floats are much faster to index than numpy scalars inside the loop
+    highs = np.asarray(high, dtype=np.float64).tolist()
+    lows = np.asarray(low, dtype=np.float64).tolist()
+    initial_af = initial_acceleration
+    af = acceleration_factor
+
+    # Initialize first SAR value
+    if highs[1] > highs[0]:
+        current_sar = lows[0]
+        up = True
+    else:
+        current_sar = highs[0]
+        up = False
+    sar[0] = current_sar
+    trend[0] = SAR_UP if up else SAR_DOWN
+
+    # Calculation loop
+    for i in range(1, n):
+        if up:
+            if lows[i] < current_sar:
+                up = False
+                current_sar = highs[i]
+                af = initial_af
+            else:
+                current_sar = current_sar + af * (lows[i] - current_sar)
+                if highs[i] > highs[i - 1]:
+                    af = min(af + initial_af, max_acceleration_factor)
+        else:
+            if highs[i] > current_sar:
+                up = True
+                current_sar = lows[i]
+                af = initial_af
+            else:
+                current_sar = current_sar - af * (current_sar - highs[i])
+                if lows[i] < lows[i - 1]:
+                    af = min(af + initial_af, max_acceleration_factor)
+        sar[i] = current_sar
+        trend[i] = SAR_UP if up else SAR_DOWN
+
+    return sar, trend
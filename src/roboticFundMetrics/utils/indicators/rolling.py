@@ -0,0 +1,105 @@
+import numpy as np
+
+# Array versions of the pandas rolling(window) aggregations used by the indicators.
+# Results are NaN until the window is full and for any window containing a NaN,
+# matching pandas' default min_periods=window.
+
+# Running sums restart every block so rounding error stays bounded by the block
+# rather than growing with the length of the history
+_BLOCK_SIZE = 4096
+
+
+def rolling_sum(values, window: int, out=None):
+    """
+    Calculates the rolling sum of a float64 array with running sums.
+    values: array of values, oldest first
+    window: the length of the rolling window
+    out: optional preallocated float64 array of the same length for the result, may be values itself
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    is_nan = np.isnan(values)
+    filled = np.where(is_nan, 0.0, values)
+    nan_count = np.cumsum(is_nan)
+    if out is None:
+        out = np.empty(n)
+    out[:min(window - 1, n)] = np.nan
+    if n < window:
+        return out
+
+    # Cumulative sums restarting at every block start
+    block = max(_BLOCK_SIZE, window)
+    n_blocks = -(-n // block)
+    padded = np.zeros(n_blocks * block)
+    padded[:n] = filled
+    block_cumsum = padded.reshape(n_blocks, block).cumsum(axis=1)
+    block_totals = block_cumsum[:, -1]
+    block_cumsum = block_cumsum.ravel()[:n]
+
+    end = np.arange(window - 1, n)
+    before_start = end - window
+    # Windows never span more than two blocks since block >= window
+    same_block = (before_start // block) == (end // block)
+    start_is_block_start = (before_start + 1) % block == 0
+    previous = np.where(start_is_block_start | (before_start < 0), 0.0,
+                        block_cumsum[np.maximum(before_start, 0)])
+    out[window - 1:] = np.where(same_block | start_is_block_start,
+                                block_cumsum[end] - previous,
+                                block_totals[np.maximum(before_start, 0) // block] - previous + block_cumsum[end])
+
+    nans_in_window = nan_count[end] - \
+        np.where(before_start >= 0, nan_count[np.maximum(before_start, 0)], 0)
+    out[window - 1:][nans_in_window > 0] = np.nan
+    return out
+
+
+def rolling_mean(values, window: int, out=None):
+    """
+    Calculates the rolling mean of a float64 array with running sums.
+    values: array of values, oldest first
+    window: the length of the rolling window
+    out: optional preallocated float64 array of the same length for the result, may be values itself
+    """
+    out = rolling_sum(values, window, out=out)
+    out /= window
+    return out
+
+
+def _rolling_extreme(values, window: int, ufunc, identity: float, out=None):
+    # van Herk/Gil-Werman: split into blocks of 'window', every window is then one
+    # block suffix combined with the next block prefix, O(n) regardless of window
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    n_blocks = -(-n // window) if n else 0
+    padded = np.full(n_blocks * window, identity)
+    padded[:n] = values
+    blocks = padded.reshape(n_blocks, window)
+    prefix = ufunc.accumulate(blocks, axis=1).ravel()
+    suffix = ufunc.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].ravel()
+    if out is None:
+        out = np.empty(n)
+    out[:min(window - 1, n)] = np.nan
+    if n < window:
+        return out
+    ufunc(suffix[:n - window + 1], prefix[window - 1:n], out=out[window - 1:])
+    return out
+
+
+def rolling_max(values, window: int, out=None):
+    """
+    Calculates the rolling maximum of a float64 array in O(n).
+    values: array of values, oldest first
+    window: the length of the rolling window
+    out: optional preallocated float64 array of the same length for the result, may be values itself
+    """
+    return _rolling_extreme(values, window, np.maximum, -np.inf, out=out)
+
+
+def rolling_min(values, window: int, out=None):
+    """
+    Calculates the rolling minimum of a float64 array in O(n).
+    values: array of values, oldest first
+    window: the length of the rolling window
+    out: optional preallocated float64 array of the same length for the result, may be values itself
+    """
+    return _rolling_extreme(values, window, np.minimum, np.inf, out=out)
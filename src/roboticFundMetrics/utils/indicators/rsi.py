@@ -1,3 +1,8 @@
+import numpy as np
+import pandas as pd
+from .rolling import rolling_mean
+
+
 def calculate_rsi(df, close_col='closePrice', window=14):
     """
     Calculates the Relative Strength Index (RSI) for a given DataFrame of prices.
@@ -5,21 +10,39 @@ def calculate_rsi(df, close_col='closePrice', window=14):
     close_col: the name of the column containing the closing prices (default 'close')
     window: the length of the RSI window (default 14)
     """
+    return pd.Series(calculate_rsi_array(df[close_col].to_numpy(dtype=np.float64), window=window),
+                     index=df.index, name=close_col)
+
+
+def calculate_rsi_array(close, window=14, out=None):
+    """
+    Calculates the Relative Strength Index (RSI) for an array of prices.
+    close: float64 array of closing prices, oldest first
+    window: the length of the RSI window (default 14)
+    out: optional preallocated float64 array of the same length for the result
+    """
+    close = np.asarray(close, dtype=np.float64)
+
     # Calculate the price change
-    price_change = df[close_col].diff()
-    
+    price_change = np.empty(len(close))
+    price_change[:1] = np.nan
+    np.subtract(close[1:], close[:-1], out=price_change[1:])
+
     # Get the positive and negative price changes
-    positive_change = price_change.where(price_change > 0, 0)
-    negative_change = -price_change.where(price_change < 0, 0)
-    
+    positive_change = np.where(price_change > 0, price_change, 0.0)
+    negative_change = np.where(price_change < 0, -price_change, 0.0)
+
     # Calculate the average gain and average loss
-    average_gain = positive_change.rolling(window).mean()
-    average_loss = negative_change.rolling(window).mean()
-    
-    # Calculate the relative strength (RS)
-    rs = average_gain / average_loss
-    
-    # Calculate the RSI
-    rsi = 100 - (100 / (1 + rs))
-    
-    return rsi
\ No newline at end of file
+    average_gain = rolling_mean(positive_change, window, out=positive_change)
+    average_loss = rolling_mean(negative_change, window, out=negative_change)
+
+    # Calculate the relative strength (RS) and the RSI
+    if out is None:
+        out = np.empty(len(close))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        np.divide(average_gain, average_loss, out=out)
+        out += 1
+        np.divide(100, out, out=out)
+    np.subtract(100, out, out=out)
+
+    return out
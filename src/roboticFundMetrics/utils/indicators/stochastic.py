@@ -1,3 +1,7 @@
+import numpy as np
+import pandas as pd
+from .rolling import rolling_max, rolling_min
+
 # %k = ( (C-L14)/(H14-L14) ) X 100
 # C = The most recent closing price
 # L14 = The lowest price traded of the 14 previous
@@ -7,8 +11,20 @@
 # %K = The current value of the stochastic indicator
 def calculate_stochastic_k(df, close_col='closePrice', window=14):
 
-    L_PERIOD = df['lowPrice'].rolling(window).min()
-    H_PERIOD = df['highPrice'].rolling(window).max()
+    return pd.Series(calculate_stochastic_k_array(df['highPrice'].to_numpy(dtype=np.float64),
+                                                  df['lowPrice'].to_numpy(
+                                                      dtype=np.float64),
+                                                  df[close_col].to_numpy(dtype=np.float64), window=window), index=df.index)
+
+
+def calculate_stochastic_k_array(high, low, close, window=14, out=None):
+
+    L_PERIOD = rolling_min(low, window)
+    H_PERIOD = rolling_max(high, window, out=out)
 
-    return ((df[close_col] - L_PERIOD) /
-            (H_PERIOD - L_PERIOD)) * 100
+    with np.errstate(divide='ignore', invalid='ignore'):
+        np.subtract(H_PERIOD, L_PERIOD, out=H_PERIOD)
+        np.subtract(close, L_PERIOD, out=L_PERIOD)
+        np.divide(L_PERIOD, H_PERIOD, out=H_PERIOD)
+    H_PERIOD *= 100
+    return H_PERIOD
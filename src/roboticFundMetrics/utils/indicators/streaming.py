@@ -0,0 +1,511 @@
+from collections import deque
+import math
+import numpy as np
+import pandas as pd
+from .parabolicSar import SAR_UP, SAR_DOWN, calculate_parabolic_sar
+
+# Incremental versions of the RoboticFundMetrics indicators. Each state object is
+# seeded once from history and then updated with one bar at a time, returning the
+# same values as the matching batch set_* method for that bar. Windowed states only
+# depend on their last 'warmup' bars, which is all StreamingMetrics.seed replays,
+# states that depend on the whole history (EWM, SAR) have a seed() working on the
+# history arrays.
+
+NAN = float('nan')
+
+
+def _is_nan(value) -> bool:
+    return value != value
+
+
+def _divide(numerator, denominator):
+    # Mirrors numpy/pandas float division, i.e. x/0 is +-inf and 0/0 is NaN
+    if denominator == 0:
+        if numerator == 0 or _is_nan(numerator):
+            return NAN
+        return math.copysign(math.inf, numerator) * math.copysign(1, denominator)
+    return numerator / denominator
+
+
+class RollingMean:
+    '''
+    Rolling mean over the last 'window' values, NaN until the window is full or
+    while it contains a NaN (pandas rolling(window).mean() semantics)
+    '''
+
+    def __init__(self, window: int):
+        self.window = window
+        self.values = deque(maxlen=window)
+        self.nan_count = 0
+        self.value = NAN
+
+    def update(self, x: float) -> float:
+        if len(self.values) == self.window and _is_nan(self.values[0]):
+            self.nan_count -= 1
+        self.values.append(x)
+        if _is_nan(x):
+            self.nan_count += 1
+        if len(self.values) < self.window or self.nan_count > 0:
+            self.value = NAN
+        else:
+            self.value = sum(self.values) / self.window
+        return self.value
+
+
+class RollingExtreme:
+    '''
+    Rolling min or max over the last 'window' values (pandas rolling(window).min()/max())
+    using a monotonic deque, O(1) amortised per update
+    '''
+
+    def __init__(self, window: int, use_max: bool):
+        self.window = window
+        self.use_max = use_max
+        # (position, value) pairs with values decreasing (max) or increasing (min)
+        self.candidates = deque()
+        self.nan_positions = deque()
+        self.position = -1
+        self.value = NAN
+
+    def update(self, x: float) -> float:
+        self.position += 1
+        oldest = self.position - self.window + 1
+        if _is_nan(x):
+            self.nan_positions.append(self.position)
+        else:
+            while self.candidates and (self.candidates[-1][1] <= x if self.use_max else self.candidates[-1][1] >= x):
+                self.candidates.pop()
+            self.candidates.append((self.position, x))
+        while self.candidates and self.candidates[0][0] < oldest:
+            self.candidates.popleft()
+        while self.nan_positions and self.nan_positions[0] < oldest:
+            self.nan_positions.popleft()
+
+        if oldest < 0 or self.nan_positions:
+            self.value = NAN
+        else:
+            self.value = self.candidates[0][1]
+        return self.value
+
+
+class EWMMean:
+    '''
+    Exponentially weighted mean with adjust=True, as pandas ewm(span=span).mean()
+    '''
+
+    def __init__(self, span: int):
+        self.span = span
+        self.alpha = 2 / (span + 1)
+        self.weighted = NAN
+        self.old_wt = 1.0
+        self.started = False
+        self.value = NAN
+
+    def update(self, x: float) -> float:
+        if not self.started:
+            self.started = True
+            self.weighted = x
+        elif not _is_nan(self.weighted):
+            self.old_wt *= 1 - self.alpha
+            if not _is_nan(x):
+                if self.weighted != x:
+                    self.weighted = (self.old_wt * self.weighted + x) / \
+                        (self.old_wt + 1)
+                self.old_wt += 1
+        elif not _is_nan(x):
+            self.weighted = x
+        self.value = self.weighted
+        return self.value
+
+    def seed(self, values) -> np.ndarray:
+        '''
+        Description: Sets the state after the given history on a fresh instance. The mean
+        comes from the batch calculation, the weight of the past is replayed over a tail
+        long enough for its start to have decayed below float precision
+
+        Args:
+            values (np.ndarray): history, oldest first
+
+        Returns:
+            np.ndarray of the mean after every value, as pandas ewm(span).mean()
+        '''
+        values = np.asarray(values, dtype=np.float64)
+        means = pd.Series(values).ewm(span=self.span).mean().to_numpy()
+        if len(values) == 0:
+            return means
+        self.started = True
+        self.weighted = self.value = float(means[-1])
+        observed = np.flatnonzero(~np.isnan(values))
+        if len(observed) == 0:
+            return means
+        # The weight starts at 1 on the first value and tends to 1/alpha
+        tail = int(math.ceil(50 / self.alpha))
+        start = observed[0] + 1
+        old_wt = 1.0
+        if len(values) - start > tail:
+            start = len(values) - tail
+            old_wt = 1 / self.alpha
+        for is_nan in np.isnan(values[start:]).tolist():
+            old_wt *= 1 - self.alpha
+            if not is_nan:
+                old_wt += 1
+        self.old_wt = old_wt
+        return means
+
+
+class StreamingSMA:
+    '''
+    Simple moving average of closePrice, matches set_sma(length)
+    '''
+
+    def __init__(self, length: int):
+        self.mean = RollingMean(length)
+        self.warmup = length
+
+    def update(self, high: float, low: float, close: float) -> float:
+        return self.mean.update(close)
+
+
+class StreamingEMA:
+    '''
+    Exponential moving average of closePrice, matches set_ema(length)
+    '''
+
+    def __init__(self, length: int):
+        self.mean = EWMMean(length)
+
+    def update(self, high: float, low: float, close: float) -> float:
+        return self.mean.update(close)
+
+    def seed(self, high, low, close) -> float:
+        return self.mean.seed(close)[-1]
+
+
+class StreamingRSI:
+    '''
+    Relative strength index of closePrice, matches calculate_rsi(df, window=window)
+    '''
+
+    def __init__(self, window: int = 14):
+        self.average_gain = RollingMean(window)
+        self.average_loss = RollingMean(window)
+        self.prev_close = NAN
+        self.warmup = window + 1
+
+    def update(self, high: float, low: float, close: float) -> float:
+        price_change = close - self.prev_close
+        self.prev_close = close
+        gain = self.average_gain.update(
+            price_change if price_change > 0 else 0.0)
+        loss = self.average_loss.update(
+            -price_change if price_change < 0 else 0.0)
+        rs = _divide(gain, loss)
+        return 100 - _divide(100, 1 + rs)
+
+
+class StreamingMACD:
+    '''
+    MACD line, signal and histogram, matches the MACD_{fast}_{slow} columns
+    '''
+
+    def __init__(self, fast: int = 12, slow: int = 26, signal: int = 9):
+        self.fast = EWMMean(fast)
+        self.slow = EWMMean(slow)
+        self.signal = EWMMean(signal)
+
+    def update(self, high: float, low: float, close: float) -> tuple:
+        macd = self.fast.update(close) - self.slow.update(close)
+        signal = self.signal.update(macd)
+        return macd, signal, macd - signal
+
+    def seed(self, high, low, close) -> tuple:
+        macd = self.fast.seed(close) - self.slow.seed(close)
+        signal = self.signal.seed(macd)
+        return macd[-1], signal[-1], macd[-1] - signal[-1]
+
+
+class StreamingTrueRange:
+    '''
+    True range, matches set_true_range (NaN on the first bar)
+    '''
+
+    def __init__(self):
+        self.prev_close = NAN
+        self.warmup = 2
+
+    def update(self, high: float, low: float, close: float) -> float:
+        prev_close = self.prev_close
+        self.prev_close = close
+        if _is_nan(prev_close):
+            return NAN
+        return max(high - low, abs(high - prev_close), abs(low - prev_close))
+
+
+class StreamingATR:
+    '''
+    Average true range, matches set_atr(length)
+    '''
+
+    def __init__(self, length: int = 14):
+        self.true_range = StreamingTrueRange()
+        self.mean = RollingMean(length)
+        self.warmup = length + 1
+
+    def update(self, high: float, low: float, close: float) -> float:
+        return self.mean.update(self.true_range.update(high, low, close))
+
+
+class StreamingStochastic:
+    '''
+    Stochastic %K and %D, matches calculate_stochastic_k and STOCH_D_{length_k}
+    '''
+
+    def __init__(self, length_k: int = 14, length_d: int = 3):
+        self.lowest = RollingExtreme(length_k, use_max=False)
+        self.highest = RollingExtreme(length_k, use_max=True)
+        self.d = RollingMean(length_d)
+        self.warmup = length_k + length_d - 1
+
+    def update(self, high: float, low: float, close: float) -> tuple:
+        lowest = self.lowest.update(low)
+        highest = self.highest.update(high)
+        k = _divide(close - lowest, highest - lowest) * 100
+        return k, self.d.update(k)
+
+
+class StreamingWilliamsR:
+    '''
+    Williams %R, matches calculate_williamsR(df, window=window)
+    '''
+
+    def __init__(self, window: int = 14):
+        self.lowest = RollingExtreme(window, use_max=False)
+        self.highest = RollingExtreme(window, use_max=True)
+        self.warmup = window
+
+    def update(self, high: float, low: float, close: float) -> float:
+        lowest = self.lowest.update(low)
+        highest = self.highest.update(high)
+        return _divide(highest - close, highest - lowest) * 100 * -1
+
+
+class StreamingADX:
+    '''
+    Average directional index, matches set_adx(period)
+    '''
+
+    def __init__(self, period: int = 14):
+        self.true_range = StreamingTrueRange()
+        self.tr_mean = RollingMean(period)
+        self.dm_plus_mean = RollingMean(period)
+        self.dm_minus_mean = RollingMean(period)
+        self.dx_mean = RollingMean(period)
+        self.prev_high = NAN
+        self.prev_low = NAN
+        # The last dx average needs 'period' dx values of 'period' + 1 bars each
+        self.warmup = 2 * period
+
+    def update(self, high: float, low: float, close: float) -> float:
+        tr = self.tr_mean.update(self.true_range.update(high, low, close))
+        dm_plus = high - self.prev_high
+        dm_minus = self.prev_low - low
+        self.prev_high = high
+        self.prev_low = low
+        if dm_plus < 0:
+            dm_plus = 0.0
+        if dm_minus < 0:
+            dm_minus = 0.0
+        di_plus = 100 * _divide(self.dm_plus_mean.update(dm_plus), tr)
+        di_minus = 100 * _divide(self.dm_minus_mean.update(dm_minus), tr)
+        dx = 100 * _divide(abs(di_plus - di_minus), di_plus + di_minus)
+        return self.dx_mean.update(dx)
+
+
+class StreamingParabolicSAR:
+    '''
+    Parabolic SAR and trend, matches set_parabolic_sar. The trend needs two bars to
+    initialise so the first update returns (NaN, 0)
+    '''
+
+    def __init__(self, initial_acceleration=0.02, acceleration_factor=0.02, max_acceleration_factor=0.2):
+        self.initial_af = initial_acceleration
+        self.acceleration_factor = acceleration_factor
+        self.max_acceleration_factor = max_acceleration_factor
+        self.sar = NAN
+        self.trend = 0
+        self.prev_high = NAN
+        self.prev_low = NAN
+        self.bars = 0
+
+    def update(self, high: float, low: float, close: float) -> tuple:
+        self.bars += 1
+        if self.bars == 1:
+            self.prev_high = high
+            self.prev_low = low
+            return NAN, 0
+        if self.bars == 2:
+            # Initialise from the first bar as the batch calculation does
+            if high > self.prev_high:
+                self.sar, self.trend = self.prev_low, SAR_UP
+            else:
+                self.sar, self.trend = self.prev_high, SAR_DOWN
+
+        if self.trend == SAR_UP:
+            if low < self.sar:
+                self.trend = SAR_DOWN
+                self.sar = high
+                self.acceleration_factor = self.initial_af
+            else:
+                self.sar = self.sar + self.acceleration_factor * \
+                    (low - self.sar)
+                if high > self.prev_high:
+                    self.acceleration_factor = min(
+                        self.acceleration_factor + self.initial_af, self.max_acceleration_factor)
+        else:
+            if high > self.sar:
+                self.trend = SAR_UP
+                self.sar = low
+                self.acceleration_factor = self.initial_af
+            else:
+                self.sar = self.sar - self.acceleration_factor * \
+                    (self.sar - high)
+                if low < self.prev_low:
+                    self.acceleration_factor = min(
+                        self.acceleration_factor + self.initial_af, self.max_acceleration_factor)
+
+        self.prev_high = high
+        self.prev_low = low
+        return self.sar, self.trend
+
+    def seed(self, high, low, close) -> tuple:
+        '''
+        Description: Sets the state after the given history on a fresh instance from the
+        batch calculation. The acceleration factor restarts on the last reversal and steps
+        up on every new extreme since, as the batch loop does
+
+        Args:
+            high (np.ndarray): highPrice history, oldest first
+            low (np.ndarray): lowPrice history, oldest first
+            close (np.ndarray): closePrice history (unused)
+
+        Returns:
+            tuple of the last sar and trend
+        '''
+        high = np.asarray(high, dtype=np.float64)
+        low = np.asarray(low, dtype=np.float64)
+        if len(high) < 2:
+            result = None
+            for h, l in zip(high.tolist(), low.tolist()):
+                result = self.update(h, l, NAN)
+            return result
+        sar, trend = calculate_parabolic_sar(
+            high, low, self.initial_af, self.acceleration_factor, self.max_acceleration_factor)
+        reversals = np.flatnonzero(trend[1:] != trend[:-1]) + 1
+        if len(reversals):
+            start = reversals[-1]
+            self.acceleration_factor = self.initial_af
+        else:
+            start = 0
+        up = trend[-1] == SAR_UP
+        extremes = high if up else -low
+        steps = int((extremes[start + 1:] > extremes[start:-1]).sum())
+        for _ in range(steps):
+            if self.acceleration_factor >= self.max_acceleration_factor:
+                break
+            self.acceleration_factor = min(
+                self.acceleration_factor + self.initial_af, self.max_acceleration_factor)
+        self.sar = float(sar[-1])
+        self.trend = int(trend[-1])
+        self.prev_high = float(high[-1])
+        self.prev_low = float(low[-1])
+        self.bars = len(high)
+        return self.sar, self.trend
+
+
+class StreamingMetrics:
+    '''
+    Collection of streaming indicators keyed by the column names used by
+    RoboticFundMetrics, seeded from history and then updated bar by bar
+    '''
+
+    def __init__(self, indicators: dict = None):
+        if indicators is None:
+            indicators = {
+                'SMA_12': StreamingSMA(12),
+                'SMA_25': StreamingSMA(25),
+                'SMA_50': StreamingSMA(50),
+                'SMA_80': StreamingSMA(80),
+                'EMA_12': StreamingEMA(12),
+                'EMA_26': StreamingEMA(26),
+                'EMA_50': StreamingEMA(50),
+                'EMA_80': StreamingEMA(80),
+                'RSI': StreamingRSI(14),
+                'MACD_12_26': StreamingMACD(12, 26),
+                'MACD_50_80': StreamingMACD(50, 80),
+                'atr': StreamingATR(14),
+                'STOCH_14': StreamingStochastic(14, 3),
+                'WILLIAMS_R_14': StreamingWilliamsR(14),
+                'adx': StreamingADX(14),
+                'sar': StreamingParabolicSAR(),
+            }
+        self.indicators = indicators
+        self.latest = {}
+
+    def seed(self, market_data) -> dict:
+        '''
+        Description: Sets every indicator to its state after the history, on fresh
+        indicators. Windowed indicators replay only their last 'warmup' bars, the others
+        are seeded from the history arrays, so seeding costs about as much as the batch
+        calculation. The seeded object can be pickled to keep the state between runs.
+
+        Args:
+            market_data (pd.DataFrame): OHLC history sorted oldest first
+
+        Returns:
+            dict of the latest values by column name
+        '''
+        high = market_data['highPrice'].to_numpy(dtype=np.float64)
+        low = market_data['lowPrice'].to_numpy(dtype=np.float64)
+        close = market_data['closePrice'].to_numpy(dtype=np.float64)
+        if len(close) == 0:
+            return self.latest
+        for name, indicator in self.indicators.items():
+            if hasattr(indicator, 'seed'):
+                value = indicator.seed(high, low, close)
+            else:
+                bars = indicator.warmup
+                for bar in zip(high[-bars:].tolist(), low[-bars:].tolist(), close[-bars:].tolist()):
+                    value = indicator.update(*bar)
+            self.store(name, indicator, value)
+        return self.latest
+
+    def update(self, high: float, low: float, close: float) -> dict:
+        '''
+        Description: Adds one new bar to every indicator
+
+        Args:
+            high (float): bar highPrice
+            low (float): bar lowPrice
+            close (float): bar closePrice
+
+        Returns:
+            dict of the latest values by column name, multi-output indicators are
+            expanded to the batch column names, e.g. MACD_SIGNAL_12_26 or sar_trend
+        '''
+        for name, indicator in self.indicators.items():
+            self.store(name, indicator, indicator.update(high, low, close))
+        return self.latest
+
+    def store(self, name: str, indicator, value) -> None:
+        # Multi-output indicators are expanded to the batch column names
+        if isinstance(indicator, StreamingMACD):
+            lengths = name[len('MACD_'):]
+            self.latest[name], self.latest[f'MACD_SIGNAL_{lengths}'], self.latest[
+                f'MACD_HIST_{lengths}'] = value
+        elif isinstance(indicator, StreamingStochastic):
+            length = name[len('STOCH_'):]
+            self.latest[f'STOCH_K_{length}'], self.latest[f'STOCH_D_{length}'] = value
+        elif isinstance(indicator, StreamingParabolicSAR):
+            self.latest[name], self.latest[f'{name}_trend'] = value
+        else:
+            self.latest[name] = value
@@ -1,3 +1,7 @@
+import numpy as np
+import pandas as pd
+from .rolling import rolling_max, rolling_min
+
 # Wiliams %R= Highest High− Close / Highest High − Lowest Low
 # ​
 # where
@@ -5,6 +9,20 @@
 # Close=Most recent closing price.
 # Lowest Low=Lowest price in the lookback period, typically 14 days.
 def calculate_williamsR(df, close_col='closePrice', window=14):
-    L_PERIOD = df['lowPrice'].rolling(window).min()
-    H_PERIOD = df['highPrice'].rolling(window).max()
-    return ((H_PERIOD - df[close_col]) / (H_PERIOD - L_PERIOD)) * 100 * -1
+    return pd.Series(calculate_williamsR_array(df['highPrice'].to_numpy(dtype=np.float64),
+                                               df['lowPrice'].to_numpy(
+                                                   dtype=np.float64),
+                                               df[close_col].to_numpy(dtype=np.float64), window=window), index=df.index)
+
+
+def calculate_williamsR_array(high, low, close, window=14, out=None):
+    L_PERIOD = rolling_min(low, window)
+    H_PERIOD = rolling_max(high, window)
+    if out is None:
+        out = np.empty(len(L_PERIOD))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        np.subtract(H_PERIOD, close, out=out)
+        np.subtract(H_PERIOD, L_PERIOD, out=H_PERIOD)
+        np.divide(out, H_PERIOD, out=out)
+    out *= -100
+    return out
@@ -0,0 +1,38 @@
+import re
+
+# Bar lengths in minutes of the fixed resolution names used by the brokers and the database
+RESOLUTION_MINUTES = {'DAY': 1440, 'D': 1440, '1D': 1440,
+                      'WEEK': 10080, 'W': 10080, '1W': 10080, 'HOUR': 60}
+
+
+def resolution_minutes(resolution: str) -> float:
+    """
+    Length of a bar in minutes.
+    resolution: e.g. 'MINUTE_10', 'MINUTE_30', 'HOUR_4', 'DAY' (database/IG/CI) or
+        '15M', '1H', 'D' (EOD, upper case)
+    """
+    name = str(resolution).strip().upper()
+    if name in RESOLUTION_MINUTES:
+        return RESOLUTION_MINUTES[name]
+    match = re.fullmatch(r'(MINUTE|HOUR)_(\d+)', name)
+    if match:
+        return int(match.group(2)) * (60 if match.group(1) == 'HOUR' else 1)
+    match = re.fullmatch(r'(\d+)\s*(M|MIN|H)', name)
+    if match:
+        return int(match.group(1)) * (60 if match.group(2) == 'H' else 1)
+    raise Exception(f'Unknown resolution {resolution}')
+
+
+def periods_per_year(resolution: str, trading_days: int = 260, trading_hours: float = 24) -> float:
+    """
+    Number of bars in a year, used to annualise per bar statistics.
+    resolution: bar resolution, see resolution_minutes
+    trading_days: trading days per year, 260 for FX (24/5), 252 for exchange traded markets
+    trading_hours: hours traded per day, 24 for FX, e.g. 6 for the ASX
+    """
+    minutes = resolution_minutes(resolution)
+    if minutes >= 10080:
+        return 52 * 10080 / minutes
+    if minutes >= 1440:
+        return trading_days * 1440 / minutes
+    return trading_days * trading_hours * 60 / minutes
@@ -0,0 +1,210 @@
+import numpy as np
+from .first_hit import FirstHitIndex
+
+
+def resolve_intraday_exits(direction: str, start_positions, stops, profit_takes, low_index: FirstHitIndex,
+                           high_index: FirstHitIndex, next_rule_exit, close_prices, max_hold_bars: int = None) -> tuple:
+    '''
+    Description: Finds the exit of every trade of one direction with first-hit queries,
+    vectorised over all trades. A long stops out when low < stop and takes profit when
+    high >= take, a short stops out when high >= stop and takes profit when low <= take,
+    rule exits close at closePrice. Ties go STOP, then LIMIT, then RULE.
+
+    Args:
+        direction (str): 'LONG' or 'SHORT'
+        start_positions (np.ndarray): first bar each trade is checked on, i.e. the bar after the entry
+        stops (np.ndarray): stop level per trade
+        profit_takes (np.ndarray): profit take level per trade
+        low_index (FirstHitIndex): min index over lowPrice
+        high_index (FirstHitIndex): max index over highPrice
+        next_rule_exit (np.ndarray): next_true() of the exit_long/exit_short column
+        close_prices (np.ndarray): closePrice
+        max_hold_bars (int): optional number of bars checked per trade, a trade still open at
+            the end of that window is stopped out on its last bar. None searches to the end
+            of the data and leaves trades that are never hit open
+
+    Returns:
+        tuple of exit positions (-1 if the trade never closed), sell prices (NaN if never
+        closed) and reasons ('STOP', 'LIMIT', 'RULE' or '')
+    '''
+    n = len(close_prices)
+    start_positions = np.asarray(start_positions, dtype=np.int64)
+    stops = np.asarray(stops, dtype=np.float64)
+    profit_takes = np.asarray(profit_takes, dtype=np.float64)
+
+    if direction == 'LONG':
+        stop_hits = low_index.first_hit(start_positions, stops, strict=True)
+        limit_hits = high_index.first_hit(
+            start_positions, profit_takes, strict=False)
+    else:
+        stop_hits = high_index.first_hit(
+            start_positions, stops, strict=False)
+        limit_hits = low_index.first_hit(
+            start_positions, profit_takes, strict=False)
+    rule_hits = np.full(len(start_positions), n, dtype=np.int64)
+    in_range = start_positions < n
+    rule_hits[in_range] = next_rule_exit[start_positions[in_range]]
+
+    if max_hold_bars is None:
+        end = np.full(len(start_positions), n, dtype=np.int64)
+    else:
+        # Anything not hit inside the window counts as hit on its last bar
+        end = np.minimum(start_positions + max_hold_bars, n)
+        last = end - 1
+        stop_hits = np.where(stop_hits >= end, last, stop_hits)
+        limit_hits = np.where(limit_hits >= end, last, limit_hits)
+        rule_hits = np.where(rule_hits >= end, last, rule_hits)
+
+    is_stop = (stop_hits <= limit_hits) & (stop_hits <= rule_hits)
+    is_limit = ~is_stop & (limit_hits <= rule_hits)
+    exit_positions = np.where(is_stop, stop_hits, np.where(
+        is_limit, limit_hits, rule_hits))
+    closed = (exit_positions < end) & (start_positions < end)
+
+    exit_positions = np.where(closed, exit_positions, -1)
+    sell_prices = np.full(len(start_positions), np.nan)
+    sell_prices[closed & is_stop] = stops[closed & is_stop]
+    sell_prices[closed & is_limit] = profit_takes[closed & is_limit]
+    is_rule = closed & ~is_stop & ~is_limit
+    sell_prices[is_rule] = close_prices[exit_positions[is_rule]]
+
+    reasons = np.full(len(start_positions), '', dtype=object)
+    reasons[closed & is_stop] = 'STOP'
+    reasons[closed & is_limit] = 'LIMIT'
+    reasons[is_rule] = 'RULE'
+    return exit_positions, sell_prices, reasons
+
+
+def resolve_trailing_stop_exits(direction: str, entry_positions, stops, profit_takes, trailing_step: float,
+                                low_index: FirstHitIndex, high_index: FirstHitIndex, close_index: FirstHitIndex,
+                                next_rule_exit, close_prices) -> tuple:
+    '''
+    Description: Finds the exit of every trade of one direction with a trailing stop. The stop
+    keeps its original distance from the close and moves up (long) or down (short) whenever
+    that distance grows by more than trailing_step. Trades are advanced in rounds from one
+    stop move to the next with first-hit queries, vectorised over all open trades.
+    A long stops out when low < stop and takes profit when high > take, a short stops out
+    when high > stop and takes profit when low < take, rule exits close at closePrice.
+    The entry bar itself is never an exit.
+
+    Args:
+        direction (str): 'LONG' or 'SHORT'
+        entry_positions (np.ndarray): row positions of the entries
+        stops (np.ndarray): initial stop level per trade
+        profit_takes (np.ndarray): profit take level per trade
+        trailing_step (float): price move needed before the stop is trailed
+        low_index (FirstHitIndex): min index over lowPrice
+        high_index (FirstHitIndex): max index over highPrice
+        close_index (FirstHitIndex): max index over closePrice for longs, min index for shorts
+        next_rule_exit (np.ndarray): next_true() of the exit_long/exit_short column
+        close_prices (np.ndarray): closePrice
+
+    Returns:
+        tuple of exit positions (-1 if the trade never closed), sell prices (NaN if never
+        closed) and reasons ('STOP', 'LIMIT', 'RULE' or '')
+    '''
+    n = len(close_prices)
+    is_long = direction == 'LONG'
+    entry_positions = np.asarray(entry_positions, dtype=np.int64)
+    stop = np.array(stops, dtype=np.float64, copy=True)
+    profit_takes = np.asarray(profit_takes, dtype=np.float64)
+    entry_closes = close_prices[entry_positions]
+    gap = entry_closes - stop if is_long else stop - entry_closes
+    if trailing_step < 0:
+        # A negative step also trails the stop on the entry bar
+        if is_long:
+            moved = (entry_closes - stop) - gap > trailing_step
+            stop[moved] = entry_closes[moved] - gap[moved]
+        else:
+            moved = (stop - entry_closes) - gap > trailing_step
+            stop[moved] = entry_closes[moved] + gap[moved]
+
+    exit_positions = np.full(len(entry_positions), -1, dtype=np.int64)
+    sell_prices = np.full(len(entry_positions), np.nan)
+    reasons = np.full(len(entry_positions), '', dtype=object)
+    position = entry_positions + 1
+    active = np.flatnonzero(position < n)
+
+    while len(active):
+        start = position[active]
+        current_stop = stop[active]
+        if is_long:
+            stop_hits = low_index.first_hit(start, current_stop, strict=True)
+            limit_hits = high_index.first_hit(
+                start, profit_takes[active], strict=True)
+            # The trail condition is checked exactly below, the search threshold is
+            # widened slightly so rounding can only add candidates, never lose them
+            threshold = current_stop + gap[active] + trailing_step
+            threshold -= 1e-9 * (np.abs(threshold) + 1)
+        else:
+            stop_hits = high_index.first_hit(start, current_stop, strict=True)
+            limit_hits = low_index.first_hit(
+                start, profit_takes[active], strict=True)
+            threshold = current_stop - gap[active] - trailing_step
+            threshold += 1e-9 * (np.abs(threshold) + 1)
+        rule_hits = next_rule_exit[start]
+        trail_hits = close_index.first_hit(start, threshold, strict=True)
+
+        exit_hits = np.minimum(np.minimum(stop_hits, limit_hits), rule_hits)
+        trailing = trail_hits < exit_hits
+        closing = ~trailing & (exit_hits < n)
+
+        # Close trades whose next event is an exit, ties go STOP, then LIMIT, then RULE
+        trades = active[closing]
+        hits = exit_hits[closing]
+        is_stop = stop_hits[closing] == hits
+        is_limit = ~is_stop & (limit_hits[closing] == hits)
+        is_rule = ~is_stop & ~is_limit
+        exit_positions[trades] = hits
+        sell_prices[trades] = np.where(is_stop, current_stop[closing], np.where(
+            is_limit, profit_takes[trades], close_prices[hits]))
+        reasons[trades[is_stop]] = 'STOP'
+        reasons[trades[is_limit]] = 'LIMIT'
+        reasons[trades[is_rule]] = 'RULE'
+
+        # Move the stop of trades whose next event is a trail candidate
+        trades = active[trailing]
+        hits = trail_hits[trailing]
+        closes = close_prices[hits]
+        if is_long:
+            moved = (closes - stop[trades]) - gap[trades] > trailing_step
+            stop[trades[moved]] = closes[moved] - gap[trades[moved]]
+        else:
+            moved = (stop[trades] - closes) - gap[trades] > trailing_step
+            stop[trades[moved]] = closes[moved] + gap[trades[moved]]
+        position[trades] = hits + 1
+
+        active = trades[position[trades] < n]
+
+    return exit_positions, sell_prices, reasons
+
+
+def running_total(values, include, reset) -> np.ndarray:
+    '''
+    Description: Running sum of values on the included bars that restarts after every reset
+    bar, added up one value at a time like a plain loop so the floats match exactly
+
+    Args:
+        values (np.ndarray): float values
+        include (np.ndarray): boolean array of the bars added to the total
+        reset (np.ndarray): boolean array of the bars that set the total back to zero
+
+    Returns:
+        np.ndarray of the running total on the included bars and 0 elsewhere
+    '''
+    values = np.asarray(values, dtype=np.float64)
+    positions = np.flatnonzero(include)
+    totals = values[positions].copy()
+    # Rank of each included bar within its run, runs are advanced in lock step
+    group = np.cumsum(reset)[positions]
+    run_start = np.ones(len(positions), dtype=bool)
+    run_start[1:] = group[1:] != group[:-1]
+    starts = np.flatnonzero(run_start)
+    rank = np.arange(len(positions)) - starts[np.cumsum(run_start) - 1]
+    order = np.argsort(rank, kind='stable')
+    boundaries = np.searchsorted(rank[order], np.arange(1, rank.max() + 1)) if len(rank) else []
+    for step in np.split(order, boundaries)[1:]:
+        totals[step] = totals[step - 1] + totals[step]
+    out = np.zeros(len(values))
+    out[positions] = totals
+    return out
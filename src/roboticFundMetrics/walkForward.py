@@ -0,0 +1,172 @@
+from dataclasses import dataclass
+import numpy as np
+import pandas as pd
+from .roboticFundMetrics import RoboticFundMetrics
+from .gridRunner import map_shared, parameter_grid, worker_metrics
+from . import scoring
+
+
+@dataclass
+class WalkForwardResult:
+    '''
+    Result of walk_forward(): one row per fold, the out-of-sample trades of the parameters
+    chosen in each fold and the stitched out-of-sample equity curve
+    '''
+    folds: pd.DataFrame
+    trades: pd.DataFrame
+    equity: pd.Series
+
+
+def make_folds(n: int, train_bars: int, test_bars: int, step_bars: int = None, anchored: bool = False) -> list:
+    '''
+    Description: Splits n bars into walk-forward folds of consecutive train and test windows
+
+    Args:
+        n (int): number of bars
+        train_bars (int): length of the in-sample window
+        test_bars (int): length of the out-of-sample window, the last one may be shorter
+        step_bars (int): bars between fold starts, defaults to test_bars so test windows tile
+        anchored (bool): True to always train from the first bar (expanding window)
+
+    Returns:
+        list of (train_start, train_end, test_start, test_end) bar positions, ends exclusive
+    '''
+    if step_bars is None:
+        step_bars = test_bars
+    folds = []
+    start = 0
+    while start + train_bars < n:
+        train_end = start + train_bars
+        folds.append((0 if anchored else start, train_end,
+                     train_end, min(train_end + test_bars, n)))
+        start += step_bars
+    return folds
+
+
+def _run_fold_task(task: tuple) -> dict:
+    strategy, params, folds, simulate, simulate_kwargs, position_size = task
+    result = {'params': params, 'error': None}
+    try:
+        # Signals and trades are calculated once over the full history, folds are index
+        # ranges into the ledger and only the per fold results go back to the parent
+        metrics = worker_metrics()
+        strategy(metrics, **params)
+        getattr(metrics, simulate)(project=False, **simulate_kwargs)
+        metrics.set_notional_value(position_size)
+        metrics.set_trade_pnl()
+        trades = metrics.trades
+        timestamps = pd.DatetimeIndex(metrics.timestamps())
+        months = (timestamps.year * 12 + timestamps.month).to_numpy()
+
+        entries = trades['entry_idx'].to_numpy()
+        exits = trades['exit_idx'].to_numpy()
+        pnl = trades['pnl'].to_numpy()
+        in_sample = []
+        out_of_sample = []
+        test_trades = []
+        for fold, (train_start, train_end, test_start, test_end) in enumerate(folds):
+            first, last = np.searchsorted(entries, [train_start, train_end])
+            # Only trades closed inside the training window count in-sample
+            closed = (exits[first:last] >= 0) & (exits[first:last] < train_end)
+            in_sample.append(scoring.score_trades(
+                pnl[first:last][closed], months[entries[first:last][closed]], position_size))
+            # Out-of-sample trades are those entered in the test window, wherever they close
+            first, last = np.searchsorted(entries, [test_start, test_end])
+            closed = exits[first:last] >= 0
+            out_of_sample.append(scoring.score_trades(
+                pnl[first:last][closed], months[entries[first:last][closed]], position_size))
+            test_trades.append(trades.iloc[first:last].assign(fold=fold))
+        result['in_sample'] = in_sample
+        result['out_of_sample'] = out_of_sample
+        result['test_trades'] = test_trades
+    except Exception as error:
+        result['error'] = f'{type(error).__name__}: {error}'
+    return result
+
+
+def walk_forward(metrics: RoboticFundMetrics, strategy, grid: dict, train_bars: int, test_bars: int,
+                 step_bars: int = None, anchored: bool = False, score: str = 'final_score', processes: int = None,
+                 position_size: float = 1, simulate: str = 'simulate_trades_intraday', simulate_kwargs: dict = None) -> WalkForwardResult:
+    '''
+    Description: Walk-forward optimisation. The indicators in metrics are calculated once over
+    the full history. Every parameter combination is run once over the full history in a
+    worker process sharing the data (see gridRunner), its trade ledger is then cut into the
+    folds with index ranges. Per fold the combination with the best in-sample score is
+    chosen and its trades entered in the following test window make up the out-of-sample
+    result. Out-of-sample trades may close after their test window, in-sample trades
+    only count when they close inside the training window. When step_bars is shorter than
+    test_bars the test windows overlap, the fold scores use the whole test window but the
+    stitched trades and equity only take each fold up to the start of the next test
+    window so no bar is counted twice.
+    On platforms that spawn processes call this from under if __name__ == '__main__'.
+
+    Args:
+        metrics (RoboticFundMetrics): prepared metrics, e.g. after require(*indicators)
+        strategy (callable): module level function strategy(metrics, **params)
+        grid (dict): parameter name to list of values passed to strategy
+        train_bars (int): length of the in-sample window in bars
+        test_bars (int): length of the out-of-sample window in bars
+        step_bars (int): bars between fold starts, defaults to test_bars
+        anchored (bool): True to always train from the first bar
+        score (str): in-sample score to maximise, e.g. 'final_score' or 'total_profit'
+        processes (int): number of worker processes, defaults to the number of cores
+        position_size (float): position size of each trade
+        simulate (str): simulator method
+        simulate_kwargs (dict): keyword arguments for the simulator
+
+    Returns:
+        WalkForwardResult with 'folds' (windows, chosen parameters, in-sample and
+        out-of-sample scores), 'trades' (out-of-sample ledger with a 'fold' column) and
+        'equity' (cumulative out-of-sample profit per bar from the first test window)
+    '''
+    if simulate_kwargs is None:
+        simulate_kwargs = {}
+    n = len(metrics.df)
+    folds = make_folds(n, train_bars, test_bars, step_bars, anchored)
+    if not folds:
+        raise Exception(
+            f'Not enough data for a {train_bars} bar training window, only {n} bars')
+    tasks = [(strategy, params, folds, simulate, simulate_kwargs, position_size)
+             for params in parameter_grid(grid)]
+    runs = map_shared(metrics, _run_fold_task, tasks, processes)
+    failed = [run for run in runs if run['error'] is not None]
+    for run in failed:
+        print(f"Walk-forward run {run['params']} failed: {run['error']}")
+    runs = [run for run in runs if run['error'] is None]
+    if not runs:
+        raise Exception('Every walk-forward run failed')
+
+    time_stamps = metrics.df['snapshotTimeUTC'].to_numpy()
+    fold_rows = []
+    fold_trades = []
+    for fold, (train_start, train_end, test_start, test_end) in enumerate(folds):
+        # NaN scores never win, ties go to the first combination in the grid
+        in_sample_scores = np.array(
+            [run['in_sample'][fold][score] for run in runs], dtype=np.float64)
+        best = int(np.argmax(np.nan_to_num(in_sample_scores, nan=-np.inf)))
+        run = runs[best]
+        test_trades = run['test_trades'][fold]
+        if fold + 1 < len(folds) and folds[fold + 1][2] < test_end:
+            test_trades = test_trades[test_trades['entry_idx']
+                                      < folds[fold + 1][2]]
+        fold_trades.append(test_trades)
+        fold_rows.append({
+            'fold': fold,
+            'train_start': time_stamps[train_start],
+            'train_end': time_stamps[train_end - 1],
+            'test_start': time_stamps[test_start],
+            'test_end': time_stamps[test_end - 1],
+            **run['params'],
+            **{f'in_sample_{name}': value for name, value in run['in_sample'][fold].items()},
+            **{f'out_of_sample_{name}': value for name, value in run['out_of_sample'][fold].items()},
+        })
+
+    # Realised out-of-sample profit booked on each trade's exit bar
+    trades = pd.concat(fold_trades, ignore_index=True)
+    closed = trades[trades['exit_idx'] >= 0]
+    profit = np.zeros(n)
+    np.add.at(profit, closed['exit_idx'].to_numpy(), closed['pnl'].to_numpy())
+    first_test = folds[0][2]
+    equity = pd.Series(np.cumsum(profit)[first_test:], index=metrics.df.index[first_test:],
+                       name='out_of_sample_equity')
+    return WalkForwardResult(folds=pd.DataFrame(fold_rows), trades=trades, equity=equity)
@@ -0,0 +1,36 @@
+'''
+Times the Parabolic SAR kernel against the previous per-bar pandas loop and checks both
+give the same values, e.g. python tests/benchmark_parabolic_sar.py 200000
+'''
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__))), 'src'))
+from roboticFundMetrics.utils.indicators.parabolicSar import SAR_DOWN, SAR_UP, calculate_parabolic_sar  # noqa: E402
+from test_parabolic_sar import legacy_parabolic_sar, synthetic_bars  # noqa: E402
+
+
+def main(n: int) -> None:
+    df = synthetic_bars(n)
+    start = time.perf_counter()
+    expected_sar, expected_trend = legacy_parabolic_sar(df)
+    legacy_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    sar, trend = calculate_parabolic_sar(df['highPrice'].to_numpy(dtype=np.float64),
+                                         df['lowPrice'].to_numpy(dtype=np.float64))
+    kernel_seconds = time.perf_counter() - start
+
+    identical = np.array_equal(sar, expected_sar) and np.array_equal(
+        trend, np.where(expected_trend == 'up', SAR_UP, SAR_DOWN))
+    print(f'{n} bars: legacy {legacy_seconds:.3f}s, kernel {kernel_seconds:.3f}s, '
+          f'{legacy_seconds / kernel_seconds:.0f}x faster, identical {identical}')
+    if not identical:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200000)
@@ -0,0 +1,37 @@
+import os
+import sys
+import pandas as pd
+import pytest
+
+# Run against the source tree without installing the package
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+sys.path.insert(0, SRC)
+
+AUDUSD_CSV = os.path.join(SRC, 'data', 'AUDUSD_10MIN.csv')
+
+
+@pytest.fixture
+def audusd() -> pd.DataFrame:
+    # Bundled 10 minute AUDUSD bars, stored newest first
+    return pd.read_csv(AUDUSD_CSV)
+
+
+def sma_cross_strategy(metrics, stop: float = 10, limit: float = 20) -> None:
+    # Long on a close above its 25 bar SMA, short below, with stops and limits in pips
+    df = metrics.df
+    sma = df['closePrice'].rolling(25).mean()
+    df['entry_long'] = (df['closePrice'] > sma) & (
+        df['closePrice'].shift(1) <= sma.shift(1))
+    df['entry_short'] = (df['closePrice'] < sma) & (
+        df['closePrice'].shift(1) >= sma.shift(1))
+    df.iloc[-1, df.columns.get_loc('entry_long')] = False
+    df.iloc[-1, df.columns.get_loc('entry_short')] = False
+    df['exit_long'] = df['entry_short']
+    df['exit_short'] = df['entry_long']
+    metrics.set_stops_from_pips(stop, stop, 0.0001)
+    metrics.set_limits(limit, limit, 0.0001)
+
+
+@pytest.fixture
+def sma_cross():
+    return sma_cross_strategy
@@ -0,0 +1,82 @@
+import warnings
+from dataclasses import asdict
+import numpy as np
+import pandas as pd
+import pytest
+from roboticFundMetrics.roboticFundMetrics import RoboticFundMetrics
+
+
+def backtest_stats(audusd, sma_cross, memory_mode):
+    audusd['instrument'] = 'AUDUSD'
+    metrics = RoboticFundMetrics(audusd, lazy=True, memory_mode=memory_mode)
+    sma_cross(metrics)
+    metrics.simulate_trades_intraday()
+    return metrics.compute_stats()
+
+
+def test_exit_reason_counts_match_across_memory_modes(audusd, sma_cross):
+    default = backtest_stats(audusd.copy(), sma_cross, 'default')
+    with warnings.catch_warnings():
+        warnings.simplefilter('error', FutureWarning)
+        low = backtest_stats(audusd.copy(), sma_cross, 'low')
+    assert default.exit_reason_counts.sum() > 0
+    pd.testing.assert_series_equal(low.exit_reason_counts, default.exit_reason_counts)
+
+
+@pytest.mark.parametrize('memory_mode', ['default', 'low'])
+def test_ledger_stats_match_projected_stats(audusd, sma_cross, memory_mode):
+    audusd['instrument'] = 'AUDUSD'
+    results = []
+    for project in [True, False]:
+        metrics = RoboticFundMetrics(audusd.copy(), lazy=True, memory_mode=memory_mode)
+        sma_cross(metrics)
+        metrics.simulate_trades_intraday(max_hold_bars=50, project=project)
+        results.append((metrics, asdict(metrics.compute_stats())))
+    (projected, expected), (ledger, stats) = results
+
+    assert 'sellDate' not in ledger.df.columns and 'profit' not in ledger.df.columns
+    for field, value in expected.items():
+        if isinstance(value, pd.DataFrame):
+            pd.testing.assert_frame_equal(stats[field], value, rtol=1e-12)
+        elif isinstance(value, pd.Series):
+            pd.testing.assert_series_equal(stats[field], value)
+        elif isinstance(value, float):
+            assert stats[field] == pytest.approx(value, rel=1e-12, nan_ok=True), field
+        else:
+            assert stats[field] == value, field
+    assert ledger.final_score == projected.final_score
+    np.testing.assert_array_equal(ledger.trades['pnl'], projected.trades['pnl'])
+
+    # Per-bar breakdowns project the ledger on demand
+    pd.testing.assert_frame_equal(ledger.get_period_breakdown(['hour']),
+                                  projected.get_period_breakdown(['hour']))
+
+
+@pytest.mark.parametrize('memory_mode', ['default', 'low'])
+def test_scoring_wrappers_match_compute_stats(audusd, sma_cross, memory_mode, capsys):
+    audusd['instrument'] = 'AUDUSD'
+    metrics = RoboticFundMetrics(audusd, lazy=True, memory_mode=memory_mode)
+    sma_cross(metrics)
+    metrics.simulate_trades_intraday()
+    stats = metrics.compute_stats()
+    metrics.set_model_score(1)
+    metrics.print_sharpe_ratio()
+    metrics.print_violations()
+    assert 'Starting scoring model' in capsys.readouterr().out
+    assert metrics.final_score == stats.final_score
+
+    metrics.set_monthly_profit_score()
+    metrics.set_win_rate_score()
+    metrics.set_average_gain_score()
+    metrics.set_drawdown_score()
+    metrics.calc_final_score()
+    assert metrics.final_score == stats.final_score
+    assert list(metrics.profit_per_month.columns) == ['profit']
+    assert metrics.profit_per_month.index.name == 'tmp_date'
+    assert metrics.win_rate_per_month == stats.win_rate_per_month
+
+
+def test_low_memory_mode_is_quiet(audusd, capsys):
+    metrics = RoboticFundMetrics(audusd, lazy=True, memory_mode='low')
+    assert capsys.readouterr().out == ''
+    assert metrics.memory_report['after'] < metrics.memory_report['before']
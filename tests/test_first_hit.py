@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+import pytest
+from roboticFundMetrics.roboticFundMetrics import RoboticFundMetrics
+from roboticFundMetrics.utils.first_hit import FirstHitIndex
+
+
+def brute_force_first_hit(values, start, threshold, use_max, strict):
+    for position in range(start, len(values)):
+        if use_max:
+            hit = values[position] > threshold if strict else values[position] >= threshold
+        else:
+            hit = values[position] < threshold if strict else values[position] <= threshold
+        if hit:
+            return position
+    return len(values)
+
+
+@pytest.mark.parametrize('n', [700, 1024])
+@pytest.mark.parametrize('max_level', [0, 1, 3, 8, 12])
+@pytest.mark.parametrize('use_max', [False, True])
+@pytest.mark.parametrize('strict', [False, True])
+def test_first_hit_matches_brute_force(n, max_level, use_max, strict):
+    rng = np.random.default_rng(max_level)
+    values = np.round(np.cumsum(rng.normal(0, 1, n)), 1)
+    values[rng.integers(0, len(values), 20)] = np.nan
+    start = rng.integers(0, len(values) + 1, 300)
+    threshold = np.nanpercentile(values, rng.random(300) * 100)
+    threshold[:10] = np.nan
+
+    found = FirstHitIndex(values, use_max=use_max, max_level=max_level).first_hit(
+        start, threshold, strict)
+    expected = [brute_force_first_hit(values, s, t, use_max, strict)
+                for s, t in zip(start, threshold)]
+    np.testing.assert_array_equal(found, expected)
+
+
+def test_simulation_releases_first_hit_indexes(audusd, sma_cross):
+    ledgers = []
+    for memory_mode in ['default', 'low']:
+        metrics = RoboticFundMetrics(audusd.copy(), lazy=True, memory_mode=memory_mode)
+        sma_cross(metrics)
+        metrics.simulate_trades_intraday()
+        assert not any(name == 'first_hit_index' for name, _ in metrics.intermediates)
+        ledgers.append(metrics.trades.drop(columns='reason'))
+    pd.testing.assert_frame_equal(ledgers[0], ledgers[1])
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+from roboticFundMetrics.indicatorCache import IndicatorCache
+from roboticFundMetrics.roboticFundMetrics import INTERMEDIATE_LIMITS, RoboticFundMetrics
+
+
+@pytest.mark.parametrize('edit', ['scale', 'single'])
+def test_reset_intermediates_refreshes_cached_indicators(audusd, edit):
+    metrics = RoboticFundMetrics(audusd, lazy=True, cache=IndicatorCache())
+    metrics.set_sma(30)
+    if edit == 'scale':
+        metrics.df['closePrice'] = metrics.df['closePrice'] * 1.01
+    else:
+        # One bar only
+        metrics.df.iloc[300, metrics.df.columns.get_loc('closePrice')] += 0.01
+    metrics.reset_intermediates()
+    metrics.set_sma(30)
+
+    uncached = RoboticFundMetrics(metrics.df.reset_index(drop=True), lazy=True)
+    uncached.set_sma(30)
+    np.testing.assert_array_equal(
+        metrics.df['SMA_30'].to_numpy(), uncached.df['SMA_30'].to_numpy())
+
+
+def test_set_adx_keeps_true_range_column(audusd):
+    metrics = RoboticFundMetrics(audusd, lazy=True)
+    metrics.set_adx(14)
+    expected = RoboticFundMetrics(audusd, lazy=True)
+    expected.set_true_range()
+    np.testing.assert_array_equal(metrics.df['tr'].to_numpy(), expected.df['tr'].to_numpy())
+
+
+@pytest.mark.parametrize('memory_mode', ['default', 'low'])
+def test_intermediates_stay_bounded_in_parameter_sweeps(audusd, memory_mode):
+    metrics = RoboticFundMetrics(audusd, lazy=True, memory_mode=memory_mode)
+    for length in range(5, 105):
+        metrics.set_atr(length)
+    assert len(metrics.intermediates) <= INTERMEDIATE_LIMITS[memory_mode]
+    # The true range shared by every ATR stays memoised while it is in use
+    stats = metrics.get_intermediate_stats().set_index('intermediate')
+    assert stats.loc['true_range', 'computed'] == 1
+    assert stats.loc['true_range', 'reused'] > 0
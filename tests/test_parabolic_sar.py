@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+import pytest
+from roboticFundMetrics.roboticFundMetrics import RoboticFundMetrics
+from roboticFundMetrics.utils.indicators.parabolicSar import SAR_DOWN, SAR_UP, calculate_parabolic_sar
+
+
+def legacy_parabolic_sar(df: pd.DataFrame, initial_acceleration=0.02, acceleration_factor=0.02, max_acceleration_factor=0.2):
+    # set_parabolic_sar before the array kernel, kept as the reference implementation
+    initial_af = initial_acceleration
+    sar = []
+    trend = []
+    if df['highPrice'].iloc[1] > df['highPrice'].iloc[0]:
+        sar.append(df['lowPrice'].iloc[0])
+        trend.append('up')
+    else:
+        sar.append(df['highPrice'].iloc[0])
+        trend.append('down')
+    for i in range(1, len(df)):
+        if trend[-1] == 'up':
+            if df['lowPrice'].iloc[i] < sar[-1]:
+                trend.append('down')
+                sar.append(df['highPrice'].iloc[i])
+                acceleration_factor = initial_af
+            else:
+                trend.append('up')
+                sar.append(sar[-1] + acceleration_factor *
+                           (df['lowPrice'].iloc[i] - sar[-1]))
+                if df['highPrice'].iloc[i] > df['highPrice'].iloc[i - 1]:
+                    acceleration_factor = min(
+                        acceleration_factor + initial_af, max_acceleration_factor)
+        else:
+            if df['highPrice'].iloc[i] > sar[-1]:
+                trend.append('up')
+                sar.append(df['lowPrice'].iloc[i])
+                acceleration_factor = initial_af
+            else:
+                trend.append('down')
+                sar.append(sar[-1] - acceleration_factor *
+                           (sar[-1] - df['highPrice'].iloc[i]))
+                if df['lowPrice'].iloc[i] < df['lowPrice'].iloc[i - 1]:
+                    acceleration_factor = min(
+                        acceleration_factor + initial_af, max_acceleration_factor)
+    return np.array(sar, dtype=np.float64), np.array(trend, dtype=object)
+
+
+def synthetic_bars(n: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    close = 0.65 + np.cumsum(rng.normal(0, 0.0002, n))
+    open_price = np.r_[close[0], close[:-1]]
+    return pd.DataFrame({'highPrice': np.maximum(open_price, close) + rng.random(n) * 0.0003,
+                         'lowPrice': np.minimum(open_price, close) - rng.random(n) * 0.0003})
+
+
+def assert_matches_legacy(df: pd.DataFrame, **params) -> None:
+    expected_sar, expected_trend = legacy_parabolic_sar(df, **params)
+    sar, trend = calculate_parabolic_sar(df['highPrice'].to_numpy(dtype=np.float64),
+                                         df['lowPrice'].to_numpy(dtype=np.float64), **params)
+    np.testing.assert_array_equal(sar, expected_sar)
+    np.testing.assert_array_equal(trend, np.where(
+        expected_trend == 'up', SAR_UP, SAR_DOWN))
+    assert trend.dtype == np.int8
+
+
+def test_matches_legacy_on_audusd(audusd):
+    metrics = RoboticFundMetrics(audusd, lazy=True)
+    assert_matches_legacy(metrics.df)
+
+
+@pytest.mark.parametrize('params', [{}, {'initial_acceleration': 0.01, 'acceleration_factor': 0.03, 'max_acceleration_factor': 0.1}])
+@pytest.mark.parametrize('seed', [0, 1])
+def test_matches_legacy_on_synthetic_bars(seed, params):
+    assert_matches_legacy(synthetic_bars(3000, seed), **params)
+
+
+def test_set_parabolic_sar_columns(audusd):
+    metrics = RoboticFundMetrics(audusd, lazy=True)
+    metrics.set_parabolic_sar()
+    expected_sar, _ = legacy_parabolic_sar(metrics.df)
+    np.testing.assert_array_equal(
+        metrics.df['sar'].to_numpy(), expected_sar)
+    assert metrics.df['sar_trend'].dtype == np.int8
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+from roboticFundMetrics.roboticFundMetrics import RoboticFundMetrics
+from roboticFundMetrics.utils.indicators.streaming import StreamingMetrics
+
+
+def synthetic_bars(n: int, seed: int) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    close = 0.65 + np.cumsum(rng.normal(0, 0.0002, n))
+    open_price = np.r_[close[0], close[:-1]]
+    return pd.DataFrame({
+        'snapshotTimeUTC': pd.date_range('2020-01-01', periods=n, freq='10min').strftime('%Y-%m-%d %H:%M:%S'),
+        'openPrice': open_price, 'closePrice': close,
+        'highPrice': np.maximum(open_price, close) + rng.random(n) * 0.0003,
+        'lowPrice': np.minimum(open_price, close) - rng.random(n) * 0.0003})
+
+
+def assert_streaming_matches_batch(metrics: RoboticFundMetrics, seed_bars: int):
+    df = metrics.df
+    streaming = StreamingMetrics()
+    latest = streaming.seed(df.iloc[:seed_bars])
+    columns = list(latest)
+    metrics.set_atr(14)
+    metrics.set_adx(14)
+    metrics.set_parabolic_sar()
+    metrics.require(*[column for column in columns if column not in df.columns])
+    rows = [dict(latest)]
+    for high, low, close in zip(df['highPrice'].tolist()[seed_bars:], df['lowPrice'].tolist()[seed_bars:],
+                                df['closePrice'].tolist()[seed_bars:]):
+        rows.append(dict(streaming.update(high, low, close)))
+    live = pd.DataFrame(rows, columns=columns)
+    for column in columns:
+        np.testing.assert_allclose(live[column].to_numpy(dtype=np.float64),
+                                   df[column].to_numpy(dtype=np.float64)[seed_bars - 1:],
+                                   rtol=1e-9, atol=1e-12, err_msg=column)
+
+
+@pytest.mark.parametrize('seed_bars', [2, 30, 200, 399])
+def test_seeded_updates_match_batch_columns(audusd, seed_bars):
+    assert_streaming_matches_batch(RoboticFundMetrics(audusd, lazy=True), seed_bars)
+
+
+@pytest.mark.parametrize('seed', [0, 1])
+def test_seeded_updates_match_batch_columns_on_long_history(seed):
+    # Longer than the EWM weight tail, with many SAR reversals before the seed point
+    assert_streaming_matches_batch(RoboticFundMetrics(synthetic_bars(12000, seed), lazy=True), 11000)
+
+
+def test_seed_matches_replaying_every_bar(audusd):
+    df = RoboticFundMetrics(audusd, lazy=True).df
+    replayed = StreamingMetrics()
+    for high, low, close in zip(df['highPrice'].tolist(), df['lowPrice'].tolist(), df['closePrice'].tolist()):
+        replayed.update(high, low, close)
+    seeded = StreamingMetrics()
+    seeded.seed(df)
+    for name, indicator in replayed.indicators.items():
+        for attribute in ['sar', 'trend', 'acceleration_factor', 'prev_high', 'prev_low', 'bars']:
+            if hasattr(indicator, attribute):
+                assert getattr(seeded.indicators[name], attribute) == getattr(indicator, attribute)
+    np.testing.assert_allclose(pd.Series(seeded.latest), pd.Series(replayed.latest), rtol=1e-12)
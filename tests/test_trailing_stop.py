@@ -0,0 +1,44 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from roboticFundMetrics.roboticFundMetrics import RoboticFundMetrics
+
+# Trades of the row by row simulate_trades_intraday_trailing_stop loop the vectorised
+# resolve_trailing_stop_exits replaced, run on the bundled AUDUSD bars followed by
+# set_notional_value(1) and add_more_stats(), one row per entry
+GOLDEN_CSV = os.path.join(os.path.dirname(__file__), 'data', 'trailing_stop_golden.csv')
+GOLDEN = pd.read_csv(GOLDEN_CSV, keep_default_na=False, na_values={
+    'sellDate': [''], 'sellPrice': [''], 'profit': ['']})
+CASES = list(GOLDEN.groupby(
+    ['stop_pips', 'limit_pips', 'rule_exits', 'trailing_step'], sort=False).groups)
+
+
+@pytest.mark.parametrize('stop_pips, limit_pips, rule_exits, trailing_step', CASES)
+def test_trailing_stop_matches_legacy_loop(audusd, sma_cross, stop_pips, limit_pips, rule_exits, trailing_step):
+    golden = GOLDEN[(GOLDEN['stop_pips'] == stop_pips) & (GOLDEN['limit_pips'] == limit_pips) & (
+        GOLDEN['rule_exits'] == rule_exits) & (GOLDEN['trailing_step'] == trailing_step)]
+    metrics = RoboticFundMetrics(audusd, lazy=True)
+    sma_cross(metrics, stop_pips, limit_pips)
+    if not rule_exits:
+        metrics.df['exit_long'] = False
+        metrics.df['exit_short'] = False
+    metrics.simulate_trades_intraday_trailing_stop(trailing_step)
+    metrics.set_notional_value(1)
+    metrics.add_more_stats()
+
+    df = metrics.df
+    trades = df[(df['entry_long'] == True) | (df['entry_short'] == True)]
+    np.testing.assert_array_equal(
+        trades['snapshotTimeUTC'].astype(str), golden['buyDate'])
+    np.testing.assert_array_equal(
+        np.where(trades['entry_long'] == True, 'LONG', 'SHORT'), golden['side'])
+    np.testing.assert_array_equal(
+        pd.to_datetime(trades['sellDate']), pd.to_datetime(golden['sellDate']))
+    np.testing.assert_array_equal(
+        trades['sellPrice'].to_numpy(dtype=np.float64), golden['sellPrice'])
+    np.testing.assert_array_equal(
+        trades['exit_reason'].astype(str), golden['exit_reason'])
+    # A few profits of the legacy frame differ in the last bit
+    np.testing.assert_allclose(
+        trades['profit'].to_numpy(dtype=np.float64), golden['profit'], rtol=1e-12)
@@ -0,0 +1,15 @@
+import numpy as np
+from conftest import sma_cross_strategy
+from roboticFundMetrics.roboticFundMetrics import RoboticFundMetrics
+from roboticFundMetrics.walkForward import walk_forward
+
+
+def test_overlapping_test_windows_count_each_trade_once(audusd):
+    metrics = RoboticFundMetrics(audusd, lazy=True)
+    result = walk_forward(metrics, sma_cross_strategy, {'stop': [10, 20], 'limit': [20, 40]},
+                          train_bars=100, test_bars=80, step_bars=40, processes=1)
+    assert len(result.folds) > 1
+    assert result.trades['entry_idx'].is_unique
+    assert result.trades['entry_idx'].is_monotonic_increasing
+    closed = result.trades[result.trades['exit_idx'] >= 0]
+    np.testing.assert_allclose(result.equity.iloc[-1], closed['pnl'].sum())